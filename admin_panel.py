@@ -9,19 +9,71 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from typing import Dict, List
 import json
+import re
+import sqlite3
 
 from config import ADMIN_ID, CATEGORIES
+from database import POST_BRIEF_FIELDS
+from post_formatter import CompiledTemplate
+from product_search import specs_cache
+from rate_limiter import telegram_rate_limiter
 import globals as globals_module
 
 router = Router()
 
+# Количество постов на одной странице очереди модерации
+QUEUE_PAGE_SIZE = 8
+# Ключ новой категории (как android, laptop)
+CATEGORY_KEY_PATTERN = re.compile(r"[a-z][a-z0-9_]{1,31}")
+# Лимит длины текста сообщения Telegram
+MESSAGE_LIMIT = 4096
+# Токены HTML-разметки: тег, сущность или обычный текст
+HTML_TOKEN_PATTERN = re.compile(r"<(/?)([a-zA-Z-]+)[^>]*>|&#?\w+;|[^<&]+|[<&]")
+
 def is_admin(user_id: int) -> bool:
     """Проверка, является ли пользователь администратором"""
     return user_id == ADMIN_ID
 
+def truncate_html(text: str, limit: int = MESSAGE_LIMIT) -> str:
+    """
+    Обрезка HTML-текста до limit символов без разрыва тегов и сущностей:
+    текст режется по границе токена, открытые теги закрываются
+    """
+    if len(text) <= limit:
+        return text
+    suffix = "…"
+    result = []
+    open_tags = []
+    length = 0
+    for match in HTML_TOKEN_PATTERN.finditer(text):
+        token = match.group(0)
+        closing, tag = match.group(1), (match.group(2) or "").lower()
+        if tag and closing and tag in open_tags:
+            # Место под закрывающий тег уже было в запасе
+            result.append(token)
+            length += len(token)
+            del open_tags[len(open_tags) - 1 - open_tags[::-1].index(tag)]
+            continue
+        # Место под многоточие и закрывающие теги (в том числе для этого тега)
+        reserve = len(suffix) + sum(len(t) + 3 for t in open_tags) + (len(tag) + 3 if tag else 0)
+        if length + len(token) + reserve > limit:
+            if not tag and not token.startswith("&"):
+                # Обычный текст можно обрезать посимвольно
+                token = token[:max(0, limit - length - reserve)]
+                result.append(token)
+            break
+        result.append(token)
+        length += len(token)
+        if tag and not closing:
+            open_tags.append(tag)
+    result.append(suffix)
+    result.extend(f"</{tag}>" for tag in reversed(open_tags))
+    return "".join(result)
+
 class AdminPanel(StatesGroup):
     waiting_category_name = State()
     waiting_category_emoji = State()
+    waiting_category_key = State()
     waiting_spec_name = State()
     waiting_spec_value = State()
     editing_category = State()
@@ -33,6 +85,7 @@ class AdminPanel(StatesGroup):
     editing_template = State()
     waiting_step_name = State()
     waiting_step_config = State()
+    waiting_spec_emoji = State()
 
 @router.message(Command("admin"))
 async def cmd_admin(message: Message):
@@ -50,7 +103,9 @@ async def show_admin_menu(message: Message):
     keyboard.button(text="⚙️ Управление характеристиками", callback_data="admin_specs")
     keyboard.button(text="📍 Управление адресами магазинов", callback_data="admin_shop_addresses")
     keyboard.button(text="📝 Управление шаблонами постов", callback_data="admin_templates")
+    keyboard.button(text="😀 Эмодзи характеристик", callback_data="admin_emojis")
     keyboard.button(text="🔨 Конструктор шагов", callback_data="admin_steps_builder")
+    keyboard.button(text="⏳ Очередь модерации", callback_data="admin_queue")
     keyboard.button(text="📊 Статистика", callback_data="admin_stats")
     keyboard.adjust(1)
     
@@ -127,15 +182,42 @@ async def process_category_name(message: Message, state: FSMContext):
 async def process_category_emoji(message: Message, state: FSMContext):
     """Обработка эмодзи категории"""
     emoji = message.text.strip()
+    await state.update_data(category_emoji=emoji)
+    
+    await message.answer(
+        "Введите ключ категории латиницей (например: tablet).\n"
+        "По ключу бот и веб-приложение связывают посты с категорией, изменить его потом нельзя."
+    )
+    await state.set_state(AdminPanel.waiting_category_key)
+
+@router.message(AdminPanel.waiting_category_key)
+async def process_category_key(message: Message, state: FSMContext):
+    """Обработка ключа категории"""
+    category_key = (message.text or "").strip().lower()
+    if not CATEGORY_KEY_PATTERN.fullmatch(category_key):
+        await message.answer(
+            "⚠️ Ключ - от 2 до 32 символов: латинские буквы, цифры и _, начинается с буквы.\n"
+            "Введите ключ еще раз:"
+        )
+        return
+    if await globals_module.db.get_category_id(category_key) is not None:
+        await message.answer(f"⚠️ Ключ «{category_key}» уже занят другой категорией. Введите другой ключ:")
+        return
+    
     data = await state.get_data()
     category_name = data.get("category_name")
+    emoji = data.get("category_emoji")
     
-    # Сохраняем категорию в БД
-    category_id = await globals_module.db.add_category(category_name, emoji)
+    # Сохраняем категорию в БД (ключ уникален и на уровне базы)
+    try:
+        category_id = await globals_module.db.add_category(category_name, emoji, category_key)
+    except sqlite3.IntegrityError:
+        await message.answer(f"⚠️ Ключ «{category_key}» уже занят другой категорией. Введите другой ключ:")
+        return
     
     await message.answer(
         f"✅ Категория добавлена!\n\n"
-        f"{emoji} {category_name}"
+        f"{emoji} {category_name} ({category_key})"
     )
     
     await state.clear()
@@ -537,6 +619,116 @@ async def admin_specs(callback: CallbackQuery):
     )
     await callback.answer()
 
+@router.callback_query(F.data == "admin_emojis")
+async def admin_emojis(callback: CallbackQuery):
+    """Эмодзи характеристик: выбор категории"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет прав!", show_alert=True)
+        return
+    
+    categories = await globals_module.db.get_categories()
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="🌐 Для всех категорий", callback_data="admin_emojis_cat_0")
+    for cat_id, cat_name, cat_emoji in categories:
+        keyboard.button(text=f"{cat_emoji} {cat_name}", callback_data=f"admin_emojis_cat_{cat_id}")
+    keyboard.button(text="🔙 Назад", callback_data="admin_menu")
+    keyboard.adjust(1)
+    
+    await callback.message.edit_text(
+        "😀 <b>Эмодзи характеристик</b>\n\n"
+        "Эмодзи выбирается по первому правилу, слово которого входит в название характеристики. "
+        "Сначала проверяются правила категории, затем общие.\n\n"
+        "Выберите категорию:",
+        reply_markup=keyboard.as_markup(),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+async def show_spec_emojis(callback: CallbackQuery, category_id: int):
+    """Список правил эмодзи категории (0 - общие правила)"""
+    rules = await globals_module.db.get_spec_emojis(category_id or None)
+    if category_id:
+        category = await globals_module.db.get_category(category_id)
+        title = category[1] if category else "Неизвестная категория"
+    else:
+        title = "Для всех категорий"
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="➕ Добавить правило", callback_data=f"admin_emojis_add_{category_id}")
+    for emoji_id, keyword, emoji in rules:
+        keyboard.button(text=f"🗑️ {emoji} {keyword}", callback_data=f"admin_emojis_del_{category_id}_{emoji_id}")
+    keyboard.button(text="🔙 Назад", callback_data="admin_emojis")
+    keyboard.adjust(1)
+    
+    rules_text = "\n".join(f"{index}. {emoji} {keyword}" for index, (_, keyword, emoji) in enumerate(rules, 1))
+    await callback.message.edit_text(
+        f"😀 <b>Эмодзи характеристик: {title}</b>\n\n"
+        f"{rules_text or 'Нет правил'}\n\n"
+        f"Нажмите на правило, чтобы удалить его:",
+        reply_markup=keyboard.as_markup(),
+        parse_mode="HTML"
+    )
+
+@router.callback_query(F.data.startswith("admin_emojis_cat_"))
+async def admin_emojis_category(callback: CallbackQuery):
+    """Правила эмодзи категории"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет прав!", show_alert=True)
+        return
+    
+    await show_spec_emojis(callback, int(callback.data.split("_")[-1]))
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("admin_emojis_del_"))
+async def admin_emojis_delete(callback: CallbackQuery):
+    """Удаление правила эмодзи"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет прав!", show_alert=True)
+        return
+    
+    parts = callback.data.split("_")
+    category_id, emoji_id = int(parts[-2]), int(parts[-1])
+    await globals_module.db.delete_spec_emoji(emoji_id)
+    await show_spec_emojis(callback, category_id)
+    await callback.answer("✅ Правило удалено")
+
+@router.callback_query(F.data.startswith("admin_emojis_add_"))
+async def admin_emojis_add(callback: CallbackQuery, state: FSMContext):
+    """Добавление правила эмодзи"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет прав!", show_alert=True)
+        return
+    
+    await state.update_data(emoji_category_id=int(callback.data.split("_")[-1]))
+    await callback.message.edit_text(
+        "➕ <b>Добавление правила</b>\n\n"
+        "Отправьте слово из названия характеристики и эмодзи через пробел.\n"
+        "Например: <code>память 💾</code>\n\n"
+        "Новое правило проверяется после существующих.",
+        parse_mode="HTML"
+    )
+    await state.set_state(AdminPanel.waiting_spec_emoji)
+    await callback.answer()
+
+@router.message(AdminPanel.waiting_spec_emoji)
+async def process_spec_emoji(message: Message, state: FSMContext):
+    """Обработка правила эмодзи"""
+    parts = (message.text or "").strip().rsplit(maxsplit=1)
+    if len(parts) != 2:
+        await message.answer("❌ Нужно слово и эмодзи через пробел, например: <code>память 💾</code>", parse_mode="HTML")
+        return
+    
+    keyword, emoji = parts
+    data = await state.get_data()
+    category_id = data.get("emoji_category_id", 0)
+    await globals_module.db.add_spec_emoji(keyword, emoji, category_id or None)
+    await state.clear()
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="🔙 К правилам", callback_data=f"admin_emojis_cat_{category_id}")
+    await message.answer(f"✅ Правило добавлено: {emoji} {keyword}", reply_markup=keyboard.as_markup())
+
 @router.callback_query(F.data == "admin_templates")
 async def admin_templates(callback: CallbackQuery):
     """Управление шаблонами постов"""
@@ -631,15 +823,20 @@ async def process_template_name(message: Message, state: FSMContext):
         "{product_name} - название товара\n"
         "{category} - категория\n"
         "{price} - цена\n"
+        "{price_formatted} - цена со знаком ₽\n"
         "{product_id} - ID товара\n"
         "{shop_address} - адрес магазина\n"
         "{shop_profile_link} - ссылка на профиль магазина\n"
         "{avito_link} - ссылка на Авито\n"
         "{specifications} - характеристики (будут вставлены автоматически)\n\n"
+        "{#поле}...{/поле} - фрагмент только для заполненного поля\n"
+        "{#specifications}...{/specifications} - повторяется для каждой характеристики: "
+        "{emoji}, {name}, {value}\n\n"
         "Пример:\n"
-        "🔥 <b>{product_name} - {price} ₽</b>\n\n"
-        "{specifications}\n\n"
-        "📍 <b>Адрес:</b> {shop_address}"
+        "🔥 <b>{product_name}{#price} - {price_formatted}{/price}</b>\n\n"
+        "{#specifications}{emoji} <b>{name}:</b> {value}\n{/specifications}"
+        "{#shop_address}\n📍 <b>Адрес:</b> {shop_address}{/shop_address}",
+        parse_mode=None
     )
     await state.set_state(AdminPanel.waiting_template_text)
 
@@ -651,6 +848,13 @@ async def process_template_text(message: Message, state: FSMContext):
     category_id = data.get("category_id")
     template_name = data.get("template_name")
     
+    # Проверяем разметку шаблона до сохранения
+    try:
+        CompiledTemplate(template_text)
+    except ValueError as e:
+        await message.answer(f"❌ Ошибка в шаблоне: {e}\n\nИсправьте и отправьте текст еще раз:", parse_mode=None)
+        return
+    
     # Сохраняем шаблон
     template_id = await globals_module.db.add_post_template(category_id, template_name, template_text, is_default=0)
     
@@ -746,6 +950,12 @@ async def process_template_edit(message: Message, state: FSMContext):
     data = await state.get_data()
     template_id = data.get("template_id")
     
+    try:
+        CompiledTemplate(template_text)
+    except ValueError as e:
+        await message.answer(f"❌ Ошибка в шаблоне: {e}\n\nИсправьте и отправьте текст еще раз:", parse_mode=None)
+        return
+    
     await globals_module.db.update_post_template(template_id, template_text=template_text)
     
     await message.answer("✅ Текст шаблона обновлен!")
@@ -840,6 +1050,8 @@ async def admin_stats(callback: CallbackQuery):
         return
     
     stats = await globals_module.db.get_stats()
+    cache_stats = specs_cache.stats()
+    queue_depth = telegram_rate_limiter.queue_depth()
     
     keyboard = InlineKeyboardBuilder()
     keyboard.button(text="🔙 Назад", callback_data="admin_menu")
@@ -851,9 +1063,117 @@ async def admin_stats(callback: CallbackQuery):
         f"⏳ На модерации: {stats.get('pending', 0)}\n"
         f"✅ Одобрено: {stats.get('approved', 0)}\n"
         f"📢 Опубликовано: {stats.get('published', 0)}\n"
-        f"❌ Отклонено: {stats.get('rejected', 0)}",
+        f"❌ Отклонено: {stats.get('rejected', 0)}\n\n"
+        f"🔎 <b>Кэш поиска характеристик</b>\n"
+        f"Попаданий: {cache_stats['hits']}, промахов: {cache_stats['misses']}, "
+        f"объединено запросов: {cache_stats['coalesced']}\n"
+        f"Записей: {cache_stats['size']} из {cache_stats['max_size']}, вытеснено: {cache_stats['evictions']}, "
+        f"прогрето заранее: {cache_stats['prewarmed']}\n\n"
+        f"📤 <b>Отправка в Telegram</b>\n"
+        f"В очереди: {queue_depth['global']}, повторов после ограничения: {telegram_rate_limiter.retries}",
         reply_markup=keyboard.as_markup(),
         parse_mode="HTML"
     )
     await callback.answer()
 
+async def show_moderation_queue(callback: CallbackQuery, after_created_at: str = None, after_id: int = None):
+    """Показать страницу очереди модерации (курсор - created_at и post_id последнего поста)"""
+    # Запрашиваем на один пост больше, чтобы понять, есть ли следующая страница
+    posts = await globals_module.db.get_pending_posts(
+        after_created_at=after_created_at,
+        after_id=after_id,
+        limit=QUEUE_PAGE_SIZE + 1,
+        fields=POST_BRIEF_FIELDS + ("created_at",)
+    )
+    has_next = len(posts) > QUEUE_PAGE_SIZE
+    posts = posts[:QUEUE_PAGE_SIZE]
+    total = await globals_module.db.pending_count()
+    
+    keyboard = InlineKeyboardBuilder()
+    for post in posts:
+        keyboard.button(
+            text=f"#{post.post_id} {(post.product_name or '')[:40]}",
+            callback_data=f"admin_queue_post_{post.post_id}"
+        )
+    
+    navigation = []
+    if after_id is not None:
+        navigation.append(("⏮ В начало", "admin_queue"))
+    if has_next:
+        last = posts[-1]
+        navigation.append(("Далее ▶️", f"admin_queue_next_{last.post_id}_{last.created_at}"))
+    for text, data in navigation:
+        keyboard.button(text=text, callback_data=data)
+    keyboard.button(text="🔙 Назад", callback_data="admin_menu")
+    keyboard.adjust(*([1] * len(posts)), *([len(navigation)] if navigation else []), 1)
+    
+    if posts:
+        text = (
+            f"⏳ <b>Очередь модерации</b>\n\n"
+            f"Всего на модерации: {total}\n"
+            f"Выберите пост для просмотра:"
+        )
+    else:
+        text = "⏳ <b>Очередь модерации</b>\n\nНет постов на модерации."
+    
+    await callback.message.edit_text(text, reply_markup=keyboard.as_markup(), parse_mode="HTML")
+    await callback.answer()
+
+@router.callback_query(F.data == "admin_queue")
+async def admin_queue(callback: CallbackQuery):
+    """Очередь модерации: первая страница"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет прав!", show_alert=True)
+        return
+    
+    await show_moderation_queue(callback)
+
+@router.callback_query(F.data.startswith("admin_queue_next_"))
+async def admin_queue_next(callback: CallbackQuery):
+    """Очередь модерации: следующая страница"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет прав!", show_alert=True)
+        return
+    
+    try:
+        # Формат: "admin_queue_next_<post_id>_<created_at>"
+        post_id, created_at = callback.data[len("admin_queue_next_"):].split("_", 1)
+        post_id = int(post_id)
+    except ValueError:
+        await callback.answer("❌ Ошибка: неверный формат данных!", show_alert=True)
+        return
+    
+    await show_moderation_queue(callback, after_created_at=created_at, after_id=post_id)
+
+@router.callback_query(F.data.startswith("admin_queue_post_"))
+async def admin_queue_post(callback: CallbackQuery):
+    """Просмотр поста из очереди модерации"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Нет прав!", show_alert=True)
+        return
+    
+    post_id = int(callback.data.split("_")[-1])
+    post = await globals_module.db.get_post(post_id)
+    
+    if not post or post.status != "pending":
+        await callback.answer("❌ Пост уже обработан или не найден!", show_alert=True)
+        return
+    
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="✅ Одобрить", callback_data=f"approve_{post_id}")
+    keyboard.button(text="❌ Отклонить", callback_data=f"reject_{post_id}")
+    keyboard.button(text="🔙 К очереди", callback_data="admin_queue")
+    keyboard.adjust(2, 1)
+    
+    header = (
+        f"📝 <b>Пост #{post_id}</b>\n"
+        f"Автор: {post.user_id}\n"
+        f"Фото: {len(post.photos)}\n\n"
+    )
+    body = post.post_text or post.product_name or ""
+    await callback.message.edit_text(
+        header + truncate_html(body, MESSAGE_LIMIT - len(header)),
+        reply_markup=keyboard.as_markup(),
+        parse_mode="HTML"
+    )
+    await callback.answer()
@@ -0,0 +1,115 @@
+"""
+Локальный Bot API для проверки ограничителя частоты без Telegram: отвечает на методы
+отправки как Telegram и возвращает 429 (retry_after) при превышении лимитов
+
+Примеры:
+    python benchmarks/fake_bot_api.py --port 8082
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict, deque
+
+from aiohttp import web
+
+# Методы, которые возвращают True, а не сообщение
+TRUE_METHODS = {"deletemessage", "answercallbackquery", "sendchataction"}
+
+def create_app(global_rate: float = 30, chat_limit: int = 20, chat_period: float = 60,
+               latency: float = 0.0) -> web.Application:
+    """
+    Лимиты как у Telegram: global_rate сообщений в секунду на бота и chat_limit сообщений
+    за chat_period секунд в группу или канал. Альбом считается по сообщению на фото
+    """
+    sent = deque()
+    chats = defaultdict(deque)
+    stats = {"requests": 0, "limited": 0, "messages": 0}
+    message_ids = defaultdict(int)
+
+    def retry_after(window: deque, limit: float, period: float, now: float, cost: int) -> float:
+        while window and window[0] <= now - period:
+            window.popleft()
+        if window and len(window) + cost > limit:
+            # Ждать, пока из окна уйдет столько отправок, сколько не хватает
+            return window[min(len(window) - 1, len(window) + cost - int(limit) - 1)] + period - now
+        return 0
+
+    def message(chat_id: str) -> dict:
+        message_ids[chat_id] += 1
+        chat_type = "channel" if chat_id.startswith(("-100", "@")) else \
+            "group" if chat_id.startswith("-") else "private"
+        return {"message_id": message_ids[chat_id], "date": int(time.time()),
+                "chat": {"id": int(chat_id) if chat_id.lstrip("-").isdigit() else -1, "type": chat_type}}
+
+    async def method(request: web.Request) -> web.Response:
+        if request.content_type.startswith("multipart/") or request.content_type.endswith("urlencoded"):
+            data = dict(await request.post())
+        else:
+            data = await request.json() if request.can_read_body else {}
+        name = request.match_info["method"].lower()
+        chat_id = str(data.get("chat_id", ""))
+        stats["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+
+        if name in TRUE_METHODS or not chat_id:
+            return web.json_response({"ok": True, "result": True})
+
+        media = data.get("media")
+        cost = len(json.loads(media) if isinstance(media, str) else media) if name == "sendmediagroup" and media else 1
+        now = time.monotonic()
+        wait = retry_after(sent, global_rate, 1.0, now, cost)
+        if chat_id.startswith(("-", "@")):
+            wait = max(wait, retry_after(chats[chat_id], chat_limit, chat_period, now, cost))
+        if wait > 0:
+            stats["limited"] += 1
+            seconds = max(1, int(wait + 0.999))
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {seconds}",
+                "parameters": {"retry_after": seconds},
+            }, status=429)
+
+        for _ in range(cost):
+            sent.append(now)
+            if chat_id.startswith(("-", "@")):
+                chats[chat_id].append(now)
+        stats["messages"] += cost
+
+        if name == "sendmediagroup":
+            return web.json_response({"ok": True, "result": [message(chat_id) for _ in range(cost)]})
+        if name == "editmessagereplymarkup" and "inline_message_id" in data:
+            return web.json_response({"ok": True, "result": True})
+        return web.json_response({"ok": True, "result": message(chat_id)})
+
+    app = web.Application()
+    app["stats"] = stats
+    app.router.add_post("/bot{token}/{method}", method)
+    return app
+
+async def start_fake_bot_api(port: int = 0, **options) -> tuple:
+    """Запустить Bot API в текущем цикле событий, вернуть (runner, url)"""
+    runner = web.AppRunner(create_app(**options))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный Bot API с лимитами Telegram")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--global-rate", type=float, default=30)
+    parser.add_argument("--chat-limit", type=int, default=20)
+    parser.add_argument("--chat-period", type=float, default=60)
+    args = parser.parse_args()
+    web.run_app(
+        create_app(global_rate=args.global_rate, chat_limit=args.chat_limit, chat_period=args.chat_period),
+        host="127.0.0.1",
+        port=args.port
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Локальный каталог характеристик для проверки и бенчмарков HttpCatalogProvider без сети
+
+Примеры:
+    python benchmarks/fake_catalog.py --port 8081
+    SPEC_PROVIDER_URL=http://127.0.0.1:8081 python main.py
+"""
+import argparse
+import asyncio
+import hashlib
+import html
+import random
+
+from aiohttp import web
+
+# Характеристики, которые "знает" каталог, по категориям
+CATALOG_SPECS = {
+    "android": {"Память": ["64 GB", "128 GB", "256 GB"], "Оперативная память": ["4 GB", "8 GB", "12 GB"],
+                "Экран": ["6.1 дюйм", "6.5 дюйм", "6.7 дюйм"], "Батарея": ["4000 мАч", "5000 мАч"]},
+    "apple": {"Память": ["128 GB", "256 GB", "512 GB"], "Экран": ["6.1 дюйм", "6.7 дюйм"],
+              "Процессор": ["A15 Bionic", "A16 Bionic", "A17 Pro"]},
+    "laptop": {"Процессор": ["Intel Core i5", "Intel Core i7", "AMD Ryzen 7"],
+               "Оперативная память": ["8 GB", "16 GB", "32 GB"], "Накопитель": ["512 GB", "1 ТБ"]},
+    "pc": {"Процессор": ["Intel Core i5", "AMD Ryzen 5"], "Видеокарта": ["RTX 3060", "RTX 4070"]},
+}
+
+def catalog_specs(product_name: str, category: str) -> dict:
+    """Детерминированные характеристики товара (одинаковые для одного названия)"""
+    seed = int(hashlib.md5(f"{category}:{product_name.lower()}".encode()).hexdigest(), 16)
+    rng = random.Random(seed)
+    return {name: rng.choice(values) for name, values in CATALOG_SPECS.get(category, {}).items()}
+
+def create_app(latency: float = 0.02, jitter: float = 0.01, slow_rate: float = 0.05,
+               slow_delay: float = 0.5) -> web.Application:
+    """
+    latency и jitter - обычная задержка ответа; с вероятностью slow_rate ответ
+    задерживается на slow_delay (медленный "хвост", на котором видна польза повторных запросов)
+    """
+    async def search(request: web.Request) -> web.Response:
+        product_name = request.query.get("q", "")
+        category = request.query.get("category", "")
+        delay = latency + random.uniform(0, jitter)
+        if random.random() < slow_rate:
+            delay += slow_delay
+        await asyncio.sleep(delay)
+        
+        specs = catalog_specs(product_name, category)
+        if not product_name or not specs:
+            raise web.HTTPNotFound()
+        rows = "".join(
+            f"<tr><th>{html.escape(name)}</th><td>{html.escape(value)}</td></tr>"
+            for name, value in specs.items()
+        )
+        return web.Response(
+            text=f"<html><body><h1>{html.escape(product_name)}</h1>"
+                 f"<table class=\"specs\">{rows}</table></body></html>",
+            content_type="text/html"
+        )
+    
+    app = web.Application()
+    app.router.add_get("/search", search)
+    return app
+
+async def start_fake_catalog(port: int = 0, **options) -> tuple:
+    """Запустить каталог в текущем цикле событий, вернуть (runner, url)"""
+    runner = web.AppRunner(create_app(**options))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный каталог характеристик")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-delay", type=float, default=0.5)
+    args = parser.parse_args()
+    web.run_app(
+        create_app(latency=args.latency, slow_rate=args.slow_rate, slow_delay=args.slow_delay),
+        host="127.0.0.1",
+        port=args.port
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Сравнение отрисовки поста: format_post и разобранный шаблон из базы
+
+Шаблон повторяет стандартный вид format_post, поэтому результаты должны совпадать.
+
+Примеры:
+    python benchmarks/post_render.py
+    python benchmarks/post_render.py --posts 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import globals as globals_module
+from database import Database
+from post_formatter import CompiledTemplate, format_post, render_post, template_values
+
+# Стандартный вид format_post в виде шаблона
+DEFAULT_LAYOUT = (
+    "🔥 <b>{product_name}{#price} - {price_formatted}{/price}</b>\n\n"
+    "{#specifications}{emoji} <b>{name}:</b> {value}\n{/specifications}"
+    "{#shop_address}\n📍 <b>Адрес:</b> {shop_address}\n{/shop_address}"
+    "{#product_id}\n<b>{product_id}</b>{/product_id}"
+)
+
+SPEC_VALUES = {
+    "Состояние": ["Отличное", "Хорошее", "Не указано"],
+    "Память": ["128 GB", "256 GB", "512 GB"],
+    "Оперативная память": ["8 GB", "12 GB", ""],
+    "Процессор": ["Snapdragon 8 Gen 2", "A16 Bionic", "Не указано"],
+    "Экран": ["6.1 дюйм", "6.7 дюйм"],
+    "Камера": ["48 MP", "200 MP", ""],
+    "Батарея": ["4500 мАч", "5000 мАч"],
+    "Цвет": ["Черный", "Синий", "Не указано"],
+    "Комплект": ["Полный", "Только телефон"],
+    "Гарантия": ["Нет", "До 2025 года"],
+}
+
+def make_posts(count: int, rng: random.Random) -> list:
+    posts = []
+    for i in range(count):
+        specs = {name: rng.choice(values) for name, values in SPEC_VALUES.items()}
+        posts.append(dict(
+            product_name=f"iPhone {rng.randint(8, 15)} Pro",
+            category="apple",
+            specifications=specs,
+            avito_link="https://www.avito.ru/item",
+            price=rng.choice([None, "45000", "52 000 ₽"]),
+            product_id=rng.choice([None, f"ID{i}"]),
+            shop_address=rng.choice([None, "ул. Ленина, 1"]),
+            shop_profile_link=None,
+        ))
+    return posts
+
+def timings(render, posts: list) -> list:
+    samples = []
+    for post in posts:
+        started = time.perf_counter()
+        render(post)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def report(title: str, samples: list):
+    samples = sorted(samples)
+    p99 = samples[max(0, int(len(samples) * 0.99) - 1)]
+    print(f"  {title:<28} p50 {statistics.median(samples) * 1e6:.2f} мкс, "
+          f"p99 {p99 * 1e6:.2f} мкс, всего {sum(samples) * 1000:.1f} мс")
+
+async def run(count: int, seed: int):
+    posts = make_posts(count, random.Random(seed))
+
+    started = time.perf_counter()
+    compiled = CompiledTemplate(DEFAULT_LAYOUT)
+    print(f"Постов: {count}, разбор шаблона: {(time.perf_counter() - started) * 1e6:.1f} мкс")
+
+    def render(post):
+        return compiled.render(template_values(
+            **post, specs_text=compiled.uses_specs_text, specs_items=compiled.uses_specs_loop
+        ))
+
+    mismatches = sum(format_post(**post) != render(post) for post in posts)
+    print(f"  Расхождений с format_post: {mismatches}")
+
+    report("format_post", timings(lambda post: format_post(**post), posts))
+    report("разобранный шаблон", timings(render, posts))
+    # Без кэша: разбор шаблона для каждого поста
+    report("разбор на каждый пост", timings(
+        lambda post: CompiledTemplate(DEFAULT_LAYOUT).render(template_values(**post)), posts[:1000]
+    ))
+
+    # Полный путь: шаблон категории из базы (кэш справочников и разобранных шаблонов)
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "bench.db"))
+        await db.init_db()
+        globals_module.db = db
+        try:
+            category_id = await db.get_category_id("apple")
+            await db.add_post_template(category_id, "Стандартный", DEFAULT_LAYOUT, is_default=1)
+            samples = []
+            for post in posts:
+                started = time.perf_counter()
+                await render_post(**post)
+                samples.append(time.perf_counter() - started)
+            report("render_post (шаблон из базы)", samples)
+        finally:
+            globals_module.db = None
+            await db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк отрисовки постов по шаблонам")
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args.posts, args.seed))
+
+if __name__ == "__main__":
+    main()
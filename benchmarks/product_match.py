@@ -0,0 +1,106 @@
+"""
+Сравнение нечеткого поиска названий (TrigramIndex) с прежним поиском подстроки
+
+Примеры:
+    python benchmarks/product_match.py
+    python benchmarks/product_match.py --sizes 10000 100000 --queries 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from product_names import TrigramIndex, normalize_product_name
+
+BRANDS = {
+    "iphone": "айфон", "samsung galaxy": "самсунг галакси", "xiaomi redmi": "сяоми редми",
+    "honor": "хонор", "huawei": "хуавей", "pixel": "пиксель", "poco": "поко",
+    "macbook": "макбук", "lenovo": "леново", "asus": "асус",
+}
+SUFFIXES = ["", " pro", " max", " pro max", " mini", " plus", " ultra", " lite", " note", " s", " fe", " se"]
+SUFFIXES_RU = {" pro": " про", " max": " макс", " pro max": " про макс", " mini": " мини",
+               " plus": " плюс", " ultra": " ультра", " note": " нот"}
+
+def make_products(count: int, rng: random.Random) -> list:
+    """Синтетические названия товаров: бренд, номер модели, серия, суффикс"""
+    products = set()
+    while len(products) < count:
+        brand = rng.choice(list(BRANDS))
+        name = f"{brand} {rng.choice('abcxyz')}{rng.randint(1, 999)}{rng.choice(SUFFIXES)}"
+        products.add(name)
+    return sorted(products)
+
+def make_query(product: str, rng: random.Random) -> str:
+    """Как продавец может написать название товара"""
+    variant = rng.randint(0, 3)
+    if variant == 0:
+        # Лишние слова: память, цвет
+        return f"{product} {rng.choice(['128', '256gb', 'black', '8/256'])}"
+    if variant == 1:
+        # Без пробелов, в другом регистре
+        return product.replace(" ", "").upper()
+    if variant == 2:
+        # По-русски
+        for brand, brand_ru in BRANDS.items():
+            if product.startswith(brand):
+                product = brand_ru + product[len(brand):]
+        for suffix, suffix_ru in SUFFIXES_RU.items():
+            if product.endswith(suffix):
+                product = product[:-len(suffix)] + suffix_ru
+        return product
+    return product.title()
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    return f"p50 {p50 * 1000:.3f} мс, p95 {p95 * 1000:.3f} мс"
+
+def run(size: int, query_count: int, seed: int):
+    rng = random.Random(seed)
+    products = make_products(size, rng)
+    targets = [rng.choice(products) for _ in range(query_count)]
+    queries = [make_query(product, rng) for product in targets]
+    
+    started = time.perf_counter()
+    index = TrigramIndex()
+    for product in products:
+        index.add(normalize_product_name(product), "phone")
+    build_time = time.perf_counter() - started
+    
+    trigram_times, trigram_hits = [], 0
+    for query, target in zip(queries, targets):
+        started = time.perf_counter()
+        matches = index.search(query, "phone", limit=5)
+        trigram_times.append(time.perf_counter() - started)
+        trigram_hits += bool(matches) and matches[0][0] == target
+    
+    # Прежний подход: название товара должно входить в текст как подстрока
+    substring_times, substring_hits = [], 0
+    for query, target in zip(queries, targets):
+        started = time.perf_counter()
+        needle = query.lower()
+        found = [product for product in products if needle in product.lower()]
+        substring_times.append(time.perf_counter() - started)
+        substring_hits += target in found
+    
+    print(f"Товаров: {size}, запросов: {query_count}")
+    print(f"  Построение индекса: {build_time:.2f} сек")
+    print(f"  Триграммы: {percentiles(trigram_times)}, найдено верно: {trigram_hits * 100 / query_count:.1f}%")
+    print(f"  Подстрока: {percentiles(substring_times)}, найдено верно: {substring_hits * 100 / query_count:.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк нечеткого поиска названий товаров")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.queries, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+Бенчмарк поиска и извлечения характеристик на синтетических опубликованных постах
+
+Для каждого размера создается временная база SQLite с опубликованными постами всех
+категорий (тексты с русскими и английскими названиями характеристик), затем
+замеряются задержки (p50/p95/p99) и выделения памяти (tracemalloc):
+    extract          - extract_specs по тексту поста
+    search_known     - _search_product_specs для товара из справочника
+    search_fuzzy     - то же для названия, написанного иначе (нечеткий поиск)
+    search_posts     - полнотекстовый поиск по постам и извлечение из найденных текстов
+    search_cached    - search_product_specs при попадании в кэш
+Результаты пишутся в JSON, чтобы сравнивать прогоны на разных коммитах.
+Перед замерами extract_specs сверяется с прежними извлекателями на корпусе из
+benchmarks/spec_corpus.py; при любом расхождении бенчмарк завершается с кодом 1.
+
+Примеры:
+    python benchmarks/search_specs.py
+    python benchmarks/search_specs.py --sizes 1000 10000 100000 1000000 --output results.json
+    python benchmarks/search_specs.py --compare before.json --output after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Бенчмарк работает без сети: внешний каталог характеристик не подключается
+os.environ["SPEC_PROVIDER_URL"] = ""
+
+import globals as globals_module
+from config import CATEGORIES
+from database import Database
+from product_search import extract_specs, search_product_specs, specs_cache, _search_product_specs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from spec_corpus import run_check
+
+# Товары по категориям: бренды и линейки
+PRODUCTS = {
+    "android": ["Samsung Galaxy S", "Samsung Galaxy A", "Xiaomi Redmi Note ", "Xiaomi ",
+                "Google Pixel ", "Honor ", "Realme ", "POCO X"],
+    "apple": ["iPhone ", "iPhone {} Pro", "iPhone {} Pro Max", "iPhone {} mini"],
+    "laptop": ["Lenovo ThinkPad T", "ASUS ZenBook ", "MacBook Air M", "HP Pavilion ",
+               "Acer Aspire ", "Huawei MateBook D"],
+    "pc": ["Игровой ПК Ryzen ", "Системный блок Intel i", "HyperPC M", "DEXP Aquilon O"],
+    "other": ["Apple Watch Series ", "iPad Air ", "Sony PlayStation ", "Яндекс Станция "],
+}
+PROCESSORS = ["Snapdragon 8 Gen 2", "Dimensity 9200", "A16 Bionic", "Intel Core i5 12400F",
+              "AMD Ryzen 7 5800X", "Apple M2", "Exynos 2200", "Intel Core i7 13700H"]
+GPUS = ["RTX 3060", "RTX 4070", "RX 6700 XT", "Intel Iris Xe", "GTX 1650"]
+BOARDS = ["B550M", "Z690 Gaming", "H610M", "X570 Aorus"]
+CONDITIONS = ["Состояние отличное, без царапин", "Used, good condition", "Полный комплект, чек",
+              "Небольшие потертости на корпусе", "Battery health 89%"]
+
+def product_names(category: str, count: int, rng: random.Random) -> list:
+    """Синтетические названия товаров категории"""
+    names = set()
+    templates = PRODUCTS[category]
+    # Номеров моделей меньше, чем вариантов: на больших размерах товары повторяются чаще
+    count = min(count, len(templates) * 5000)
+    while len(names) < count:
+        template = rng.choice(templates)
+        model = str(rng.randint(1, 9999))
+        names.add(template.format(model) if "{}" in template else template + model)
+    return sorted(names)
+
+def label(rng: random.Random, russian: str, english: str) -> str:
+    """Название характеристики по-русски или по-английски, с двоеточием или без"""
+    return (russian if rng.random() < 0.6 else english) + rng.choice([": ", " ", ":"])
+
+def spec_lines(category: str, rng: random.Random) -> dict:
+    """Характеристики товара: {название: (строка в тексте, значение)}"""
+    storage = f"{rng.choice([64, 128, 256, 512])} GB"
+    ram = f"{rng.choice([4, 8, 12, 16, 32])} GB"
+    processor = rng.choice(PROCESSORS)
+    specs = {}
+    if category in ("android", "apple"):
+        screen = f"{rng.choice(['6.1', '6.4', '6.7', '6.8'])} дюйм"
+        camera = f"{rng.choice([12, 48, 50, 108, 200])} MP"
+        battery = f"{rng.randint(30, 60) * 100} мАч"
+        specs["Память"] = (label(rng, "Память", "Storage") + storage, storage)
+        specs["Оперативная память"] = (label(rng, "ОЗУ", "RAM") + ram, ram)
+        specs["Процессор"] = (label(rng, "Процессор", "Chipset") + processor, processor)
+        specs["Экран"] = (label(rng, "Экран", "Display") + screen, screen)
+        specs["Камера"] = (label(rng, "Камера", "Camera") + camera, camera)
+        specs["Батарея"] = (label(rng, "Батарея", "Battery") + battery, battery)
+    elif category in ("laptop", "pc"):
+        gpu = rng.choice(GPUS)
+        specs["Процессор"] = (label(rng, "Процессор", "CPU") + processor, processor)
+        specs["Оперативная память"] = (label(rng, "Оперативная память", "RAM") + ram, ram)
+        specs["Накопитель"] = (label(rng, "Накопитель", "SSD") + storage, storage)
+        if category == "laptop":
+            screen = f"{rng.choice(['13.3', '14', '15.6', '16'])} inch"
+            specs["Экран"] = (label(rng, "Экран", "Screen") + screen, screen)
+        specs["Видеокарта"] = (label(rng, "Видеокарта", "GPU") + gpu, gpu)
+        if category == "pc":
+            board = rng.choice(BOARDS)
+            specs["Материнская плата"] = (label(rng, "Материнская плата", "Motherboard") + board, board)
+    else:
+        specs["Процессор"] = (label(rng, "Процессор", "Processor") + processor, processor)
+        specs["Память"] = (label(rng, "Память", "ROM") + storage, storage)
+    return specs
+
+def make_post(category: str, product_name: str, rng: random.Random) -> tuple:
+    """Текст поста и характеристики (как их заполнил продавец)"""
+    specs = spec_lines(category, rng)
+    lines = [line for line, _ in specs.values()]
+    rng.shuffle(lines)
+    text = "\n".join([
+        f"{CATEGORIES[category].split(' ', 1)[0]} <b>{product_name}</b>",
+        "",
+        *lines,
+        "",
+        rng.choice(CONDITIONS),
+        f"💰 Цена: {rng.randint(5, 250) * 1000} ₽",
+    ])
+    # Часть характеристик продавцы оставляют незаполненными
+    specifications = {
+        name: (value if rng.random() < 0.8 else "Не указано")
+        for name, (_, value) in specs.items()
+    }
+    return text, specifications
+
+def misspell(product_name: str, rng: random.Random) -> str:
+    """Как продавец может написать название иначе"""
+    variant = rng.randint(0, 2)
+    if variant == 0:
+        return product_name.replace(" ", "").upper()
+    if variant == 1:
+        return f"{product_name} {rng.choice(['128gb', 'black', '8/256', 'б/у'])}"
+    return product_name.lower().replace("iphone", "айфон").replace("samsung", "самсунг")
+
+def populate(path: str, size: int, rng: random.Random) -> dict:
+    """Заполнить базу опубликованными постами, вернуть названия товаров и тексты по категориям"""
+    categories = list(CATEGORIES)
+    # В среднем по 5 публикаций на товар
+    catalog = {category: product_names(category, max(1, size // 5 // len(categories)), rng)
+               for category in categories}
+    texts = {category: [] for category in categories}
+    started = datetime.now() - timedelta(days=365)
+
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO users (user_id, username, full_name, created_at) VALUES (1, 'bench', 'Bench', ?)",
+                 (started.isoformat(),))
+    batch = []
+    for i in range(size):
+        category = categories[i % len(categories)]
+        product_name = rng.choice(catalog[category])
+        text, specifications = make_post(category, product_name, rng)
+        if len(texts[category]) < 2000:
+            texts[category].append(text)
+        created_at = (started + timedelta(seconds=i * 30)).isoformat()
+        batch.append((category, product_name, json.dumps(specifications, ensure_ascii=False), text, created_at))
+        if len(batch) == 10000 or i == size - 1:
+            conn.executemany("""
+                INSERT INTO posts (user_id, category, product_name, specifications, photos,
+                                   avito_link, post_text, status, created_at)
+                VALUES (1, ?, ?, ?, '[]', '', ?, 'published', ?)
+            """, batch)
+            conn.commit()
+            batch = []
+    conn.close()
+    return {"catalog": catalog, "texts": texts}
+
+def summary(samples: list) -> dict:
+    """p50/p95/p99 и среднее в миллисекундах"""
+    samples = sorted(samples)
+    def percentile(fraction: float) -> float:
+        return samples[max(0, int(len(samples) * fraction) - 1)] * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 4),
+        "p50_ms": round(percentile(0.50), 4),
+        "p95_ms": round(percentile(0.95), 4),
+        "p99_ms": round(percentile(0.99), 4),
+    }
+
+async def measure(operations: list) -> dict:
+    """
+    Задержки и выделения памяти для списка корутин-фабрик.
+    Память меряется отдельным проходом: tracemalloc сильно замедляет выполнение
+    """
+    # Прогрев: компиляция выражений, первые чтения страниц базы
+    for operation in operations[:20]:
+        await operation()
+
+    latencies = []
+    for operation in operations:
+        started = time.perf_counter()
+        await operation()
+        latencies.append(time.perf_counter() - started)
+    result = summary(latencies)
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for operation in operations[:200]:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            await operation()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+    result["alloc_peak_mean_bytes"] = int(sum(peaks) / len(peaks))
+    result["alloc_peak_max_bytes"] = max(peaks)
+    return result
+
+async def run(size: int, query_count: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        db = Database(path)
+        await db.open()
+        try:
+            await db.init_db()
+            started = time.perf_counter()
+            data = await asyncio.to_thread(populate, path, size, rng)
+            await db.rebuild_product_specs()
+            setup_time = time.perf_counter() - started
+            globals_module.db = db
+
+            categories = list(CATEGORIES)
+            queries = []
+            for _ in range(query_count):
+                category = rng.choice(categories)
+                queries.append((rng.choice(data["catalog"][category]), category))
+
+            async def extract(text, category):
+                extract_specs(text, category)
+
+            async def search_posts(name, category):
+                posts = await db.search_published_posts(name, category)
+                extract_specs("\n".join(post.post_text for post in posts if post.post_text), category)
+
+            texts = [(rng.choice(data["texts"][category]), category)
+                     for category in (rng.choice(categories) for _ in range(query_count))]
+            scenarios = {
+                "extract": [lambda t=t, c=c: extract(t, c) for t, c in texts],
+                "search_known": [lambda n=n, c=c: _search_product_specs(n, c) for n, c in queries],
+                "search_fuzzy": [lambda n=misspell(n, rng), c=c: _search_product_specs(n, c) for n, c in queries],
+                "search_posts": [lambda n=n, c=c: search_posts(n, c) for n, c in queries],
+                "search_cached": [lambda n=n, c=c: search_product_specs(n, c) for n, c in queries],
+            }
+            # Кэш заполняется заранее: замеряются только попадания
+            for name, category in queries:
+                await search_product_specs(name, category)
+
+            results = {"size": size, "setup_s": round(setup_time, 2), "scenarios": {}}
+            for name, operations in scenarios.items():
+                results["scenarios"][name] = await measure(operations)
+            return results
+        finally:
+            globals_module.db = None
+            for category in CATEGORIES:
+                specs_cache.invalidate_category(category)
+            await db.close()
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def compare(previous: dict, current: dict):
+    """Изменение p50/p95/p99 относительно прошлого прогона"""
+    before = {run["size"]: run for run in previous.get("runs", [])}
+    print(f"\nСравнение с {previous.get('commit') or 'предыдущим прогоном'}:")
+    for run in current["runs"]:
+        if run["size"] not in before:
+            continue
+        for name, result in run["scenarios"].items():
+            old = before[run["size"]]["scenarios"].get(name)
+            if not old:
+                continue
+            changes = []
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                change = (result[key] - old[key]) * 100 / old[key] if old[key] else 0.0
+                changes.append(f"{key[:3]} {change:+.1f}%")
+            print(f"  {run['size']:>8} {name:<14} " + ", ".join(changes))
+
+def print_run(result: dict):
+    print(f"Постов: {result['size']}, подготовка: {result['setup_s']} сек")
+    for name, stats in result["scenarios"].items():
+        print(f"  {name:<14} p50 {stats['p50_ms']:.3f} мс, p95 {stats['p95_ms']:.3f} мс, "
+              f"p99 {stats['p99_ms']:.3f} мс, память {stats['alloc_peak_mean_bytes'] / 1024:.1f} КБ")
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска и извлечения характеристик")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Количество опубликованных постов (например, 1000 10000 100000 1000000)")
+    parser.add_argument("--queries", type=int, default=500, help="Запросов на сценарий")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Файл для результатов в JSON")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+    parser.add_argument("--corpus", type=int, default=20000,
+                        help="Текстов в регрессионном корпусе извлечения характеристик")
+    args = parser.parse_args()
+
+    if not run_check(args.corpus, args.seed):
+        sys.exit(1)
+
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "queries": args.queries,
+        "seed": args.seed,
+        "runs": [],
+    }
+    for size in args.sizes:
+        result = asyncio.run(run(size, args.queries, args.seed))
+        print_run(result)
+        report["runs"].append(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
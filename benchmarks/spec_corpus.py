@@ -0,0 +1,142 @@
+"""
+Регрессионный корпус извлечения характеристик: extract_specs сравнивается с прежними
+извлекателями (отдельный re.search на каждую характеристику, как до реестра SpecExtractor)
+
+Корпус - фиксированные граничные случаи и тексты, собранные генератором с заданным seed.
+Любое расхождение - ошибка (код возврата 1); эту же проверку выполняет benchmarks/search_specs.py.
+
+Примеры:
+    python benchmarks/spec_corpus.py
+    python benchmarks/spec_corpus.py --cases 50000 --seed 7
+"""
+import argparse
+import os
+import random
+import re
+import sys
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from product_search import extract_specs
+
+# Прежние шаблоны по категориям (порядок характеристик важен)
+_PHONE = {
+    "Память": r"(?:Память|Storage|ROM)[:\s]+(\d+\s*GB|\d+\s*ТБ)",
+    "Оперативная память": r"(?:ОЗУ|RAM|Оперативная память)[:\s]+(\d+\s*GB)",
+    "Процессор": r"(?:Процессор|CPU|Chipset)[:\s]+([A-Za-z0-9\s]+)",
+    "Экран": r"(?:Экран|Display|Screen)[:\s]+([\d.]+[\"']?\s*дюйм|[\d.]+[\"']?\s*inch)",
+    "Камера": r"(?:Камера|Camera)[:\s]+(\d+\s*МП|\d+\s*MP)",
+    "Батарея": r"(?:Батарея|Battery)[:\s]+(\d+\s*мАч|\d+\s*mAh)",
+}
+REFERENCE_PATTERNS = {
+    "android": _PHONE,
+    "apple": _PHONE,
+    "laptop": {
+        "Процессор": r"(?:Процессор|CPU|Processor)[:\s]+([A-Za-z0-9\s]+)",
+        "Оперативная память": r"(?:ОЗУ|RAM|Оперативная память)[:\s]+(\d+\s*GB)",
+        "Накопитель": r"(?:SSD|HDD|Накопитель|Storage)[:\s]+(\d+\s*GB|\d+\s*ТБ)",
+        "Экран": r"(?:Экран|Display|Screen)[:\s]+([\d.]+[\"']?\s*дюйм|[\d.]+[\"']?\s*inch)",
+        "Видеокарта": r"(?:Видеокарта|GPU|Graphics)[:\s]+([A-Za-z0-9\s]+)",
+    },
+    "pc": {
+        "Процессор": r"(?:Процессор|CPU|Processor)[:\s]+([A-Za-z0-9\s]+)",
+        "Оперативная память": r"(?:ОЗУ|RAM|Оперативная память)[:\s]+(\d+\s*GB)",
+        "Накопитель": r"(?:SSD|HDD|Накопитель|Storage)[:\s]+(\d+\s*GB|\d+\s*ТБ)",
+        "Видеокарта": r"(?:Видеокарта|GPU|Graphics)[:\s]+([A-Za-z0-9\s]+)",
+        "Материнская плата": r"(?:Материнская плата|Motherboard|MB)[:\s]+([A-Za-z0-9\s]+)",
+    },
+    "other": {
+        "Процессор": r"(?:Процессор|CPU|Processor)[:\s]+([A-Za-z0-9\s]+)",
+        "Память": r"(?:Память|Storage|ROM)[:\s]+(\d+\s*GB|\d+\s*ТБ)",
+        "Оперативная память": r"(?:ОЗУ|RAM|Оперативная память)[:\s]+(\d+\s*GB)",
+    },
+}
+
+# Граничные случаи: регистр, несколько вхождений, названия без значений, перекрытия
+EDGE_CASES = [
+    ("android", ""),
+    ("android", "Память: 128 GB\nОЗУ: 8 GB\nПроцессор: Snapdragon 8 Gen 2\nЭкран: 6.7\" дюйм"),
+    ("android", "память 64gb память: 256 GB RAM 12GB ram: 16 GB"),
+    ("apple", "Storage 1 ТБ, ROM: 512 GB; Chipset A17 Pro\nCamera: 48 MP Battery 4500 mAh"),
+    ("apple", "Оперативная память: 6 GB Память: 128 GB"),
+    ("android", "Камера: МП Камера 200 МП Батарея: 5000мАч"),
+    ("android", "CPU:\n\nTensor G3\nScreen 6.1' inch Display: 6.3 дюйм"),
+    ("laptop", "SSD 512 GB HDD: 1 ТБ Storage 256 GB GPU RTX 4060 Graphics: Iris Xe"),
+    ("laptop", "Processor Intel Core i7 13700H\nRAM 16 GB\nЭкран 15.6 inch"),
+    ("pc", "MB: ASUS B550 Motherboard MSI Z790 Материнская плата Gigabyte"),
+    ("pc", "Видеокарта: RTX 3060 CPU Ryzen 5 5600 Накопитель 2 ТБ ОЗУ 32 GB"),
+    ("other", "Процессор: MediaTek ROM 32 GB Оперативная память 2 GB"),
+    ("unknown", "CPU Apple M2 Storage 256 GB RAM 8 GB"),
+    ("android", "RAMROM: 8 GB ROMRAM 16 GB"),
+    ("laptop", "Экран:Экран: 14 дюйм"),
+]
+
+_LABELS = sorted({
+    label
+    for patterns in REFERENCE_PATTERNS.values()
+    for pattern in patterns.values()
+    for label in re.match(r"\(\?:([^)]*)\)", pattern).group(1).split("|")
+})
+_VALUES = ["128 GB", "1 ТБ", "8GB", "16 GB", "6.1 дюйм", "6.7\" inch", "15.6' дюйм", "48 MP", "200 МП",
+           "5000 мАч", "4500mAh", "Snapdragon 8 Gen 3", "Intel Core i5", "RTX 4070", "A16 Bionic", "",
+           "Отличное", "12", "GB", "ТБ"]
+_SEPARATORS = [": ", ":", " ", "\n", ":\n", " - ", "  ", ""]
+_NOISE = ["Продаю", "в отличном состоянии", "Комплект полный", "Цена 15 000", "\n", ", ", ".", "🔥", "доставка"]
+
+def reference_extract(text: str, category: str) -> Dict[str, str]:
+    """Прежнее извлечение: отдельный re.search на каждую характеристику категории"""
+    patterns = REFERENCE_PATTERNS.get(category, REFERENCE_PATTERNS["other"])
+    specs = {}
+    for key, pattern in patterns.items():
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            specs[key] = match.group(1).strip()
+    return specs
+
+def generate_cases(count: int, seed: int) -> List[Tuple[str, str]]:
+    """Тексты из случайных названий, разделителей, значений и шума (одинаковые для одного seed)"""
+    rng = random.Random(seed)
+    categories = list(REFERENCE_PATTERNS) + ["unknown"]
+    cases = []
+    for _ in range(count):
+        chunks = []
+        for _ in range(rng.randint(1, 12)):
+            if rng.random() < 0.25:
+                chunks.append(rng.choice(_NOISE))
+                continue
+            label = rng.choice(_LABELS)
+            if rng.random() < 0.3:
+                label = label.upper() if rng.random() < 0.5 else label.lower()
+            chunks.append(label + rng.choice(_SEPARATORS) + rng.choice(_VALUES))
+        cases.append((rng.choice(categories), rng.choice([" ", "\n", ", "]).join(chunks)))
+    return cases
+
+def check_extractors(cases: List[Tuple[str, str]]) -> List[tuple]:
+    """Расхождения extract_specs с прежним извлечением: [(категория, текст, ожидалось, получено)]"""
+    mismatches = []
+    for category, text in cases:
+        expected = reference_extract(text, category)
+        actual = extract_specs(text, category)
+        if actual != expected or list(actual) != list(expected):
+            mismatches.append((category, text, expected, actual))
+    return mismatches
+
+def run_check(cases: int = 20000, seed: int = 1) -> bool:
+    """Проверить граничные случаи и сгенерированный корпус, напечатать расхождения"""
+    corpus = EDGE_CASES + generate_cases(cases, seed)
+    mismatches = check_extractors(corpus)
+    print(f"Корпус извлечения характеристик: {len(corpus)} текстов, расхождений: {len(mismatches)}")
+    for category, text, expected, actual in mismatches[:5]:
+        print(f"  [{category}] {text!r}\n    ожидалось: {expected}\n    получено:  {actual}")
+    return not mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Регрессионная проверка извлечения характеристик")
+    parser.add_argument("--cases", type=int, default=20000, help="Сколько текстов сгенерировать")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    sys.exit(0 if run_check(args.cases, args.seed) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Бенчмарк HttpCatalogProvider на локальном каталоге: задержки с повторными запросами и без
+
+Примеры:
+    python benchmarks/spec_provider.py
+    python benchmarks/spec_provider.py --requests 2000 --concurrency 32 --slow-rate 0.1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_catalog import start_fake_catalog
+from spec_providers import HttpCatalogProvider
+
+def percentile(samples: list, fraction: float) -> float:
+    return samples[max(0, int(len(samples) * fraction) - 1)]
+
+async def run(url: str, hedge: bool, requests: int, concurrency: int) -> dict:
+    provider = HttpCatalogProvider(url, timeout=3.0, limit_per_host=concurrency, hedge_delay=0.1, hedge=hedge)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    found = 0
+    
+    async def lookup(i: int):
+        nonlocal found
+        async with semaphore:
+            started = time.perf_counter()
+            specs = await provider.fetch_specs(f"Samsung Galaxy S{i % 300}", "android")
+            latencies.append(time.perf_counter() - started)
+            found += bool(specs)
+    
+    try:
+        await asyncio.gather(*[lookup(i) for i in range(requests)])
+    finally:
+        await provider.close()
+    latencies.sort()
+    return {
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "found": found,
+        "sent": provider.requests,
+        "hedged": provider.hedged,
+    }
+
+async def main_async(args):
+    runner, url = await start_fake_catalog(latency=args.latency, slow_rate=args.slow_rate, slow_delay=args.slow_delay)
+    try:
+        for hedge in (False, True):
+            result = await run(url, hedge, args.requests, args.concurrency)
+            print(
+                f"{'С повторным запросом' if hedge else 'Без повторного запроса'}: "
+                f"p50 {result['p50'] * 1000:.1f} мс, p95 {result['p95'] * 1000:.1f} мс, "
+                f"p99 {result['p99'] * 1000:.1f} мс, найдено {result['found']}/{args.requests}, "
+                f"отправлено запросов {result['sent']} (повторных {result['hedged']})"
+            )
+    finally:
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк внешнего каталога характеристик")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-delay", type=float, default=0.5)
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Бенчмарк ограничителя частоты на локальном Bot API: очередь публикаций альбомов в канал
+с ограничителем и без него (ошибки 429, потерянные публикации, время, глубина очереди)
+
+Лимиты по умолчанию уменьшены по времени (20 сообщений в канал за 6 секунд вместо 60),
+чтобы прогон занимал секунды.
+
+Примеры:
+    python benchmarks/telegram_limits.py
+    python benchmarks/telegram_limits.py --posts 30 --photos 6 --chat-period 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import InputMediaPhoto
+
+from fake_bot_api import start_fake_bot_api
+from rate_limiter import TelegramRateLimiter
+
+CHANNEL_ID = -1001234567890
+ADMIN_ID = 123456789
+
+async def run(args, limited: bool) -> dict:
+    runner, url = await start_fake_bot_api(
+        global_rate=args.global_rate, chat_limit=args.chat_limit, chat_period=args.chat_period
+    )
+    session = AiohttpSession(api=TelegramAPIServer.from_base(url))
+    limiter = None
+    if limited:
+        limiter = TelegramRateLimiter(
+            global_rate=args.global_rate, chat_limit=args.chat_limit,
+            chat_period=args.chat_period, max_retries=args.max_retries
+        )
+        session.middleware(limiter)
+    bot = Bot("123456:TEST", session=session)
+    published = failed = 0
+    max_depth = 0
+
+    async def publish(i: int):
+        nonlocal published, failed
+        media = [InputMediaPhoto(media=f"https://example.com/{i}/{j}.jpg") for j in range(args.photos)]
+        try:
+            await bot.send_media_group(CHANNEL_ID, media)
+            await bot.send_message(ADMIN_ID, f"Пост {i} опубликован")
+            published += 1
+        except TelegramRetryAfter:
+            failed += 1
+
+    async def watch_queue():
+        nonlocal max_depth
+        while True:
+            max_depth = max(max_depth, limiter.queue_depth()["global"])
+            await asyncio.sleep(0.05)
+
+    watcher = asyncio.create_task(watch_queue()) if limiter else None
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*[publish(i) for i in range(args.posts)])
+        duration = time.perf_counter() - started
+    finally:
+        if watcher:
+            watcher.cancel()
+        await bot.session.close()
+        stats = runner.app["stats"]
+        await runner.cleanup()
+    return {
+        "published": published,
+        "failed": failed,
+        "duration": duration,
+        "requests": stats["requests"],
+        "limited": stats["limited"],
+        "retries": limiter.retries if limiter else 0,
+        "max_depth": max_depth,
+    }
+
+async def main_async(args):
+    # Нижняя граница времени: альбомы в один канал не быстрее chat_limit фото за chat_period
+    expected = max(0, args.posts * args.photos - args.chat_limit) * args.chat_period / args.chat_limit
+    print(f"{args.posts} постов по {args.photos} фото, минимум ~{expected:.1f} с по лимиту канала")
+    for limited in (False, True):
+        result = await run(args, limited)
+        print(
+            f"{'С ограничителем' if limited else 'Без ограничителя'}: "
+            f"опубликовано {result['published']}/{args.posts}, потеряно {result['failed']}, "
+            f"{result['duration']:.1f} с, запросов {result['requests']}, ответов 429 {result['limited']}, "
+            f"повторов {result['retries']}, макс. очередь {result['max_depth']}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк ограничителя частоты запросов к Telegram")
+    parser.add_argument("--posts", type=int, default=15)
+    parser.add_argument("--photos", type=int, default=4)
+    parser.add_argument("--global-rate", type=float, default=30)
+    parser.add_argument("--chat-limit", type=int, default=20)
+    parser.add_argument("--chat-period", type=float, default=6)
+    parser.add_argument("--max-retries", type=int, default=5)
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
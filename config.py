@@ -31,4 +31,50 @@ CATEGORIES = {
 # База данных
 DATABASE_PATH = "bot_database.db"
 
+# Количество соединений для чтения в пуле базы данных
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
 
+# Через сколько дней опубликованные посты переносятся в архив (отклоненные - сразу)
+ARCHIVE_PUBLISHED_AFTER_DAYS = int(os.getenv("ARCHIVE_PUBLISHED_AFTER_DAYS", "30"))
+
+# Как часто планировщик запускает архивацию (в секундах)
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "3600"))
+
+# Резервные копии базы данных
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+# Как часто делать резервную копию (в часах) и сколько последних копий хранить
+BACKUP_INTERVAL_HOURS = int(os.getenv("BACKUP_INTERVAL_HOURS", "24"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+
+# Кэш результатов поиска характеристик: количество записей и время жизни (в секундах)
+SPECS_CACHE_SIZE = int(os.getenv("SPECS_CACHE_SIZE", "1000"))
+SPECS_CACHE_TTL = int(os.getenv("SPECS_CACHE_TTL", "600"))
+
+# Фоновый прогрев кэша для часто искомых товаров: период (секунды),
+# сколько товаров прогревать и бюджет времени на один проход (секунды)
+PREWARM_INTERVAL = int(os.getenv("PREWARM_INTERVAL", "60"))
+PREWARM_TOP = int(os.getenv("PREWARM_TOP", "20"))
+PREWARM_TICK_BUDGET = float(os.getenv("PREWARM_TICK_BUDGET", "0.2"))
+
+# Сколько отрисованных предпросмотров постов Mini App хранить в памяти
+PREVIEW_CACHE_SIZE = int(os.getenv("PREVIEW_CACHE_SIZE", "512"))
+
+# Ограничения Telegram Bot API: сообщений в секунду всего, сообщений в группу/канал
+# за период (в секундах) и сколько раз повторять запрос после ответа "retry after"
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_LIMIT = int(os.getenv("TELEGRAM_CHAT_LIMIT", "20"))
+TELEGRAM_CHAT_PERIOD = float(os.getenv("TELEGRAM_CHAT_PERIOD", "60"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "5"))
+
+# Очередь публикаций: на сколько секунд публикация закрепляется за обработчиком
+# и сколько попыток дается, прежде чем сообщить администратору
+PUBLISH_LEASE = int(os.getenv("PUBLISH_LEASE", "600"))
+PUBLISH_MAX_ATTEMPTS = int(os.getenv("PUBLISH_MAX_ATTEMPTS", "5"))
+
+# Внешний каталог характеристик (пусто - не используется)
+SPEC_PROVIDER_URL = os.getenv("SPEC_PROVIDER_URL", "")
+# Таймаут запроса к каталогу (секунды) и число соединений на хост
+SPEC_PROVIDER_TIMEOUT = float(os.getenv("SPEC_PROVIDER_TIMEOUT", "3"))
+SPEC_PROVIDER_LIMIT_PER_HOST = int(os.getenv("SPEC_PROVIDER_LIMIT_PER_HOST", "4"))
+# Через сколько секунд без ответа отправлять повторный запрос (пока нет замеров p95)
+SPEC_PROVIDER_HEDGE_DELAY = float(os.getenv("SPEC_PROVIDER_HEDGE_DELAY", "0.5"))
@@ -1,15 +1,425 @@
 import aiosqlite
-from datetime import datetime
-from typing import Optional, List, Dict
+import asyncio
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, AsyncIterator, Awaitable, Callable
 import json
+import logging
+import re
+
+from product_names import normalize_product_name, TrigramIndex
+from spec_emojis import DEFAULT_SPEC_EMOJIS, SpecEmojiMatcher
+
+logger = logging.getLogger(__name__)
+
+# Настройки SQLite, применяемые к каждому соединению пула
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Колонки таблицы posts, которые читает Post
+POST_FIELDS = (
+    "post_id", "user_id", "category", "product_name", "specifications",
+    "photos", "avito_link", "post_text", "status", "scheduled_time", "created_at",
+    "price", "product_id", "shop_address", "shop_address_id", "shop_profile_link", "price_text",
+)
+POST_COLUMNS = ", ".join(POST_FIELDS)
+
+# Минимальный набор полей для модерации (одобрение/отклонение)
+POST_BRIEF_FIELDS = ("post_id", "user_id", "product_name", "status")
+
+# Шаги публикации в очереди publish_outbox по порядку: в step хранится последний выполненный
+PUBLISH_STEPS = ("queued", "sent", "markup", "published", "notified")
+
+class Post:
+    """
+    Запись поста из таблицы posts.
+    specifications и photos хранятся как JSON и декодируются при первом обращении;
+    поля, не выбранные запросом (проекция), равны None.
+    """
+    __slots__ = (
+        "post_id", "user_id", "category", "product_name", "avito_link", "post_text",
+        "status", "scheduled_time", "created_at", "price", "product_id", "shop_address",
+        "shop_address_id", "shop_profile_link", "price_text",
+        "_specifications_json", "_photos_json", "_specifications", "_photos",
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, None)
+        self._specifications_json = fields.pop("specifications", None)
+        self._photos_json = fields.pop("photos", None)
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def from_row(cls, row: tuple, fields: tuple = POST_FIELDS) -> "Post":
+        """Собрать запись из строки запроса с колонками fields"""
+        post = cls(**dict(zip(fields, row)))
+        if "avito_link" in fields:
+            post.avito_link = post.avito_link or ""
+        if "post_text" in fields:
+            post.post_text = post.post_text or ""
+        if "status" in fields:
+            post.status = post.status or "pending"
+        return post
+
+    @property
+    def specifications(self) -> Dict:
+        if self._specifications is None:
+            try:
+                self._specifications = json.loads(self._specifications_json) if self._specifications_json else {}
+            except (json.JSONDecodeError, TypeError):
+                self._specifications = {}
+        return self._specifications
+
+    @property
+    def photos(self) -> List[str]:
+        if self._photos is None:
+            try:
+                self._photos = json.loads(self._photos_json) if self._photos_json else []
+            except (json.JSONDecodeError, TypeError):
+                self._photos = []
+        return self._photos
+
+    def __repr__(self) -> str:
+        return f"Post(post_id={self.post_id!r}, status={self.status!r}, product_name={self.product_name!r})"
+
+def _post_columns(fields: tuple) -> str:
+    """Список колонок для проекции (только известные поля posts)"""
+    unknown = set(fields) - set(POST_FIELDS)
+    if unknown:
+        raise ValueError(f"Неизвестные поля поста: {', '.join(sorted(unknown))}")
+    return ", ".join(fields)
+
+# Полнотекстовый поиск по опубликованным постам (включая архивные), см. _migration_posts_fts
+SEARCH_POSTS_QUERY = """
+    SELECT f.rowid,
+           COALESCE(p.post_text, a.post_text),
+           COALESCE(p.specifications, a.specifications)
+    FROM posts_fts f
+    LEFT JOIN posts p ON p.post_id = f.rowid
+    LEFT JOIN posts_archive a ON a.post_id = f.rowid
+    WHERE posts_fts MATCH ? AND f.category = ?
+    ORDER BY f.rank
+    LIMIT ?
+"""
+
+# Текст, который попадает в индекс posts_fts для строки NEW
+_POST_FTS_VALUES = """
+    NEW.post_id, NEW.product_name, NEW.post_text,
+    CASE WHEN json_valid(NEW.specifications)
+         THEN (SELECT group_concat(value, ' ') FROM json_each(NEW.specifications)) END,
+    NEW.category
+"""
+
+def _fts_query(text: str) -> str:
+    """Запрос MATCH из произвольного текста: все слова должны встретиться (в кавычках, без операторов FTS5)"""
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", text.lower()))
+
+# Справочник характеристик: самое частое значение каждой характеристики товара
+PRODUCT_SPECS_QUERY = """
+    SELECT spec_name, spec_value, MAX(frequency) FROM product_specs
+    WHERE product_key = ? AND category = ?
+    GROUP BY spec_name
+"""
+
+# Характеристики категории (в порядке добавления)
+CATEGORY_SPECS_QUERY = """
+    SELECT spec_id, spec_name
+    FROM category_specs
+    WHERE category_id = ?
+    ORDER BY spec_id
+"""
+
+def _pending_posts_query(fields: tuple, after: bool, limit: bool) -> str:
+    """Запрос страницы очереди модерации (after - после ключа (created_at, post_id), limit - с LIMIT)"""
+    query = f"SELECT {_post_columns(fields)} FROM posts WHERE status = 'pending'"
+    if after:
+        query += " AND (created_at, post_id) < (?, ?)"
+    query += " ORDER BY created_at DESC, post_id DESC"
+    if limit:
+        query += " LIMIT ?"
+    return query
+
+def _scheduled_posts_query(fields: tuple, due: bool) -> str:
+    """Запрос запланированных постов (due - только с наступившим временем публикации)"""
+    query = f"SELECT {_post_columns(fields)} FROM posts WHERE status = 'approved' AND scheduled_time IS NOT NULL"
+    if due:
+        query += " AND scheduled_time <= ?"
+    return query + " ORDER BY scheduled_time ASC"
+
+# Категории по умолчанию: (ключ категории, название, эмодзи)
+DEFAULT_CATEGORIES = (
+    ("android", "Смартфон (Android)", "📱"),
+    ("apple", "Смартфон (Apple)", "🍎"),
+    ("laptop", "Ноутбук", "💻"),
+    ("pc", "ПК", "🖥️"),
+    ("other", "Другая техника", "🔧"),
+)
+
+# Значения характеристик, которые не попадают в справочник
+EMPTY_SPEC_VALUES = ("", "Не указано")
+# Через сколько секунд индекс названий перестраивается в фоне после записей другого процесса
+PRODUCT_INDEX_REFRESH = 600
+
+# Запросы горячего пути: каждый из них должен использовать индекс
+# (проверяется командой "python db_tools.py check-indexes")
+HOT_QUERIES = {
+    "get_pending_posts": (
+        _pending_posts_query(POST_BRIEF_FIELDS + ("created_at",), after=True, limit=True),
+        ("2030-01-01T00:00:00", 1000, 10)
+    ),
+    "get_scheduled_posts": (_scheduled_posts_query(POST_FIELDS, due=False), ()),
+    "scheduler_due_posts": (
+        _scheduled_posts_query(("post_id", "scheduled_time"), due=True),
+        ("2030-01-01T00:00:00",)
+    ),
+    "search_product_specs": (SEARCH_POSTS_QUERY, ('"iphone"', "apple", 20)),
+    "get_product_specs": (PRODUCT_SPECS_QUERY, ("iphone 13 pro", "apple")),
+    "get_category_specs": (CATEGORY_SPECS_QUERY, (1,)),
+}
 
 class Database:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, pool_size: int = 4,
+                 commit_delay: float = 0.002, max_batch_size: int = 64,
+                 cache_check_interval: float = 1.0):
         self.db_path = db_path
+        # Количество соединений для чтения (писатель всегда один)
+        self.pool_size = max(1, pool_size)
+        # Сколько писатель ждет новых операций перед коммитом пачки (секунды)
+        self.commit_delay = commit_delay
+        self.max_batch_size = max(1, max_batch_size)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        # Пул закрывается: новые записи не принимаются (иначе они встанут в очередь после остановки писателя)
+        self._closing = False
+        self._readers: Optional[asyncio.Queue] = None
+        self._pool_lock = asyncio.Lock()
+        # Кэш справочников (категории, характеристики, адреса, шаблоны)
+        self.cache_check_interval = cache_check_interval
+        self._cache: Dict[tuple, Any] = {}
+        self._cache_generation = 0
+        self._cache_data_version: Optional[int] = None
+        self._cache_checked_at = 0.0
+        # Время последней записи (для обслуживания в периоды простоя)
+        self._last_write_at = time.monotonic()
+        # Индекс названий товаров для нечеткого поиска: живет отдельно от кэша справочников,
+        # пополняется при публикации и строится заново только в rebuild_product_specs
+        self._product_index: Optional[TrigramIndex] = None
+        self._product_index_built_at = 0.0
+        self._product_index_stale = False
+        self._product_index_generation = 0
+        self._product_index_task: Optional[asyncio.Task] = None
+        # Товары, опубликованные во время построения индекса
+        self._product_index_pending: List[tuple] = []
+
+    async def _connect(self, **kwargs) -> aiosqlite.Connection:
+        """Открыть новое соединение с базой данных"""
+        conn = await aiosqlite.connect(self.db_path, timeout=30, **kwargs)
+        for pragma in SQLITE_PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def open(self):
+        """Открыть пул соединений: один писатель и pool_size читателей"""
+        async with self._pool_lock:
+            if self._writer is not None:
+                return
+            # Транзакциями писателя управляем сами (BEGIN/SAVEPOINT/COMMIT)
+            writer = await self._connect(isolation_level=None)
+            readers = asyncio.Queue()
+            for _ in range(self.pool_size):
+                readers.put_nowait(await self._connect())
+            self._writer = writer
+            self._readers = readers
+            self._write_queue = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._writer_loop())
+
+    async def close(self):
+        """Закрыть пул соединений (дожидается записи очереди и возврата читателей)"""
+        async with self._pool_lock:
+            if self._writer is None:
+                return
+            self._closing = True
+            try:
+                self._write_queue.put_nowait(None)
+                await self._writer_task
+            finally:
+                self._closing = False
+            await self._writer.close()
+            for _ in range(self.pool_size):
+                conn = await self._readers.get()
+                await conn.close()
+            self._writer = None
+            self._writer_task = None
+            self._write_queue = None
+            self._readers = None
+
+    @asynccontextmanager
+    async def _read(self):
+        """Взять соединение для чтения из пула"""
+        if self._writer is None:
+            await self.open()
+        readers = self._readers
+        conn = await readers.get()
+        try:
+            yield conn
+        finally:
+            readers.put_nowait(conn)
+
+    async def _write(self, operation: Callable[[aiosqlite.Connection], Awaitable[Any]],
+                     invalidate_cache: bool = False) -> Any:
+        """
+        Выполнить операцию записи через очередь группового коммита.
+        operation получает соединение писателя и не должна вызывать commit():
+        ее результат (или исключение) возвращается вызывающему после коммита пачки.
+        invalidate_cache - операция меняет справочники, кэш сбрасывается после коммита.
+        """
+        if self._writer is None:
+            await self.open()
+        if self._closing:
+            raise sqlite3.ProgrammingError("База данных закрывается: запись не принята")
+        self._last_write_at = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._write_queue.put_nowait((operation, future))
+        try:
+            return await future
+        finally:
+            if invalidate_cache:
+                self._invalidate_cache()
+
+    async def _write_statement(self, query: str, params: tuple = (), invalidate_cache: bool = False) -> int:
+        """Выполнить один оператор записи, вернуть lastrowid"""
+        async def operation(db):
+            cursor = await db.execute(query, params)
+            return cursor.lastrowid
+        return await self._write(operation, invalidate_cache=invalidate_cache)
+
+    def _invalidate_cache(self):
+        """Сбросить кэш справочников"""
+        self._cache.clear()
+        self._cache_generation += 1
+
+    async def _check_data_version(self):
+        """
+        Сбросить кэш, если базу изменил другой процесс (например, другой воркер uvicorn).
+        PRAGMA data_version на соединении писателя меняется только от чужих коммитов;
+        проверяется не чаще раза в cache_check_interval секунд.
+        """
+        now = time.monotonic()
+        if now - self._cache_checked_at < self.cache_check_interval:
+            return
+        self._cache_checked_at = now
+        async with self._writer.execute("PRAGMA data_version") as cursor:
+            data_version = (await cursor.fetchone())[0]
+        if self._cache_data_version is not None and data_version != self._cache_data_version:
+            self._invalidate_cache()
+            self._product_index_stale = True
+        self._cache_data_version = data_version
+
+    async def _cached(self, key: tuple, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Прочитать значение справочника через кэш"""
+        if self._writer is None:
+            await self.open()
+        await self._check_data_version()
+        if key in self._cache:
+            value = self._cache[key]
+        else:
+            generation = self._cache_generation
+            value = await loader()
+            # Не сохраняем результат, если во время чтения кэш был сброшен
+            if generation == self._cache_generation:
+                self._cache[key] = value
+        return list(value) if isinstance(value, list) else value
+
+    async def _writer_loop(self):
+        """Единственный писатель: собирает операции в пачки и коммитит их одной транзакцией"""
+        queue = self._write_queue
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.commit_delay
+            while len(batch) < self.max_batch_size:
+                if queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._commit_batch(batch)
+            except Exception as e:
+                # Например, не удался ROLLBACK после неудачного COMMIT: пачка получает ошибку,
+                # а писатель продолжает работать, иначе следующие записи ждали бы вечно
+                logger.exception(f"Ошибка пачки записи: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                # Следующая пачка должна начаться вне транзакции
+                try:
+                    if self._writer.in_transaction:
+                        await self._writer.execute("ROLLBACK")
+                except Exception as rollback_error:
+                    logger.error(f"Не удалось откатить транзакцию писателя: {rollback_error}")
+
+    async def _commit_batch(self, batch: list):
+        """Выполнить пачку операций в одной транзакции, каждую в своей точке сохранения"""
+        db = self._writer
+        outcomes = []
+        try:
+            await db.execute("BEGIN IMMEDIATE")
+            for operation, future in batch:
+                if future.cancelled():
+                    continue
+                await db.execute("SAVEPOINT write_op")
+                try:
+                    result = await operation(db)
+                except Exception as e:
+                    # Откатываем только эту операцию, остальные в пачке сохраняются
+                    await db.execute("ROLLBACK TO write_op")
+                    await db.execute("RELEASE write_op")
+                    outcomes.append((future, None, e))
+                else:
+                    await db.execute("RELEASE write_op")
+                    outcomes.append((future, result, None))
+            await db.execute("COMMIT")
+        except Exception as e:
+            # Транзакция не состоялась: ошибка достается всем операциям пачки
+            if db.in_transaction:
+                await db.execute("ROLLBACK")
+            outcomes = [(future, None, e) for _, future in batch]
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
 
     async def init_db(self):
         """Инициализация базы данных"""
-        async with aiosqlite.connect(self.db_path) as db:
+        await self.open()
+        async def operation(db):
             # Таблица пользователей
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -35,10 +445,54 @@ class Database:
                     status TEXT DEFAULT 'pending',
                     scheduled_time TEXT,
                     created_at TEXT,
+                    price REAL,
+                    product_id TEXT,
+                    shop_address TEXT,
+                    shop_address_id INTEGER,
+                    shop_profile_link TEXT,
+                    price_text TEXT,
                     FOREIGN KEY (user_id) REFERENCES users (user_id)
                 )
             """)
             
+            # Индексы для очереди модерации, планировщика, статистики и поиска
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_posts_status_created
+                ON posts (status, created_at)
+            """)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_posts_status_scheduled
+                ON posts (status, scheduled_time)
+            """)
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_posts_status_category_created
+                ON posts (status, category, created_at)
+            """)
+            
+            # Архив опубликованных и отклоненных постов (см. archive_posts)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS posts_archive (
+                    post_id INTEGER PRIMARY KEY,
+                    user_id INTEGER,
+                    category TEXT,
+                    product_name TEXT,
+                    specifications TEXT,
+                    photos TEXT,
+                    avito_link TEXT,
+                    post_text TEXT,
+                    status TEXT,
+                    scheduled_time TEXT,
+                    created_at TEXT,
+                    price REAL,
+                    product_id TEXT,
+                    shop_address TEXT,
+                    shop_address_id INTEGER,
+                    shop_profile_link TEXT,
+                    price_text TEXT,
+                    archived_at TEXT
+                )
+            """)
+            
             # Таблица характеристик (для редактирования)
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS post_specs (
@@ -70,6 +524,11 @@ class Database:
                 )
             """)
             
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS idx_category_specs_category
+                ON category_specs (category_id, spec_id)
+            """)
+            
             # Таблица адресов магазинов
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS shop_addresses (
@@ -106,183 +565,785 @@ class Database:
                 )
             """)
             
-            await db.commit()
-            
-            # Инициализация дефолтных категорий, если их нет
-            await self._init_default_categories()
-            
-            # Инициализация дефолтных адресов магазинов, если их нет
-            await self._init_default_shop_addresses()
-            
-            # Инициализация дефолтных шагов, если их нет
-            await self._init_default_post_steps()
+        await self._write(operation)
+        
+        # Миграции схемы для уже существующих баз
+        await self._migrate()
+        
+        # Инициализация дефолтных категорий, если их нет
+        await self._init_default_categories()
+        
+        # Инициализация дефолтных адресов магазинов, если их нет
+        await self._init_default_shop_addresses()
+        
+        # Инициализация дефолтных шагов, если их нет
+        await self._init_default_post_steps()
+        
+        # Соответствие ключей категорий загружается заранее
+        await self.get_category_ids()
+
+    async def _vacuum_incremental(self):
+        """Однократный VACUUM, после которого начинает действовать auto_vacuum=INCREMENTAL"""
+        def run():
+            # VACUUM выполняется вне транзакции писателя, поэтому - отдельным соединением
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            try:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            finally:
+                conn.close()
+        try:
+            await asyncio.to_thread(run)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"VACUUM для auto_vacuum=INCREMENTAL не выполнен ({e}), "
+                           f"свободное место не будет возвращаться до ручного VACUUM")
+
+    async def _migrate(self):
+        """Применить еще не примененные миграции схемы (номер хранится в PRAGMA user_version)"""
+        migrations = [
+            self._migration_typed_post_fields,
+            self._migration_post_counters,
+            self._migration_archive_counters,
+            self._migration_posts_fts,
+            self._migration_product_specs,
+            self._migration_category_keys,
+            self._migration_template_versions,
+            self._migration_spec_emojis,
+            self._migration_publish_outbox,
+            self._migration_price_text,
+            self._migration_incremental_vacuum,
+        ]
+        self._vacuum_after_migrate = False
+        
+        async def operation(db):
+            async with db.execute("PRAGMA user_version") as cursor:
+                version = (await cursor.fetchone())[0]
+            for number, migration in enumerate(migrations, start=1):
+                if version < number:
+                    await migration(db)
+                    await db.execute(f"PRAGMA user_version = {number}")
+        await self._write(operation)
+        if self._vacuum_after_migrate:
+            await self._vacuum_incremental()
+
+    @staticmethod
+    async def _table_columns(db: aiosqlite.Connection, table: str) -> List[str]:
+        """Получить список колонок таблицы"""
+        async with db.execute(f"PRAGMA table_info({table})") as cursor:
+            return [row[1] for row in await cursor.fetchall()]
+
+    async def _migration_typed_post_fields(self, db: aiosqlite.Connection):
+        """Миграция 1: перенос _price/_product_id/_shop_address/_shop_profile_link из specifications в колонки"""
+        columns = await self._table_columns(db, "posts")
+        for column, column_type in (("price", "REAL"), ("product_id", "TEXT"), ("shop_address", "TEXT"),
+                                    ("shop_address_id", "INTEGER"), ("shop_profile_link", "TEXT"),
+                                    ("price_text", "TEXT")):
+            if column not in columns:
+                await db.execute(f"ALTER TABLE posts ADD COLUMN {column} {column_type}")
+        
+        # Цена хранилась строкой ("15 000", "1500,50", "договорная"): текст сохраняется как есть
+        # в price_text, в price попадает только то, что является числом
+        await db.execute("""
+            UPDATE posts SET price_text = CAST(json_extract(specifications, '$._price') AS TEXT)
+            WHERE price_text IS NULL AND json_valid(specifications)
+              AND json_type(specifications, '$._price') IS NOT NULL
+        """)
+        # Число из текста - по тому же правилу, что и при создании поста (parse_price)
+        from post_formatter import parse_price
+        async with db.execute("""
+            SELECT post_id, json_extract(specifications, '$._price') FROM posts
+            WHERE json_valid(specifications) AND json_type(specifications, '$._price') IS NOT NULL
+        """) as cursor:
+            prices = [(parse_price(price), post_id) for post_id, price in await cursor.fetchall()]
+        await db.executemany(
+            "UPDATE posts SET price = ? WHERE post_id = ?",
+            [(price, post_id) for price, post_id in prices if price is not None]
+        )
+        await db.execute("""
+            UPDATE posts SET
+                product_id = COALESCE(product_id, json_extract(specifications, '$._product_id')),
+                shop_address = COALESCE(shop_address, json_extract(specifications, '$._shop_address')),
+                shop_profile_link = COALESCE(shop_profile_link, json_extract(specifications, '$._shop_profile_link')),
+                specifications = json_remove(specifications, '$._price', '$._product_id',
+                                             '$._shop_address', '$._shop_profile_link')
+            WHERE json_valid(specifications)
+              AND (json_type(specifications, '$._price') IS NOT NULL
+                   OR json_type(specifications, '$._product_id') IS NOT NULL
+                   OR json_type(specifications, '$._shop_address') IS NOT NULL
+                   OR json_type(specifications, '$._shop_profile_link') IS NOT NULL)
+        """)
+        # Адрес из справочника, если текст совпадает с одним из сохраненных адресов
+        await db.execute("""
+            UPDATE posts SET shop_address_id = (
+                SELECT address_id FROM shop_addresses
+                WHERE shop_addresses.address_text = posts.shop_address
+                ORDER BY address_id LIMIT 1
+            )
+            WHERE shop_address IS NOT NULL AND shop_address_id IS NULL
+        """)
+        
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_product_id ON posts (product_id)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_shop_address_id ON posts (shop_address_id)")
+
+    async def _migration_post_counters(self, db: aiosqlite.Connection):
+        """Миграция 2: счетчики постов по статусам, поддерживаемые триггерами"""
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS post_counters (
+                status TEXT PRIMARY KEY,
+                cnt INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        """)
+        # Триггеры выполняются в той же транзакции, что и изменение поста
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_posts_counters_insert AFTER INSERT ON posts
+            BEGIN
+                INSERT INTO post_counters (status, cnt) VALUES (NEW.status, 1)
+                ON CONFLICT (status) DO UPDATE SET cnt = cnt + 1;
+            END
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_posts_counters_delete AFTER DELETE ON posts
+            BEGIN
+                UPDATE post_counters SET cnt = cnt - 1 WHERE status = OLD.status;
+            END
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_posts_counters_status AFTER UPDATE OF status ON posts
+            WHEN OLD.status IS NOT NEW.status
+            BEGIN
+                UPDATE post_counters SET cnt = cnt - 1 WHERE status = OLD.status;
+                INSERT INTO post_counters (status, cnt) VALUES (NEW.status, 1)
+                ON CONFLICT (status) DO UPDATE SET cnt = cnt + 1;
+            END
+        """)
+        await self._recompute_post_counters(db)
+
+    async def _migration_archive_counters(self, db: aiosqlite.Connection):
+        """Миграция 3: архивные посты тоже учитываются в post_counters"""
+        # Перенос поста в архив уменьшает счетчик триггером на posts и увеличивает здесь
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_posts_archive_counters_insert AFTER INSERT ON posts_archive
+            BEGIN
+                INSERT INTO post_counters (status, cnt) VALUES (NEW.status, 1)
+                ON CONFLICT (status) DO UPDATE SET cnt = cnt + 1;
+            END
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_posts_archive_counters_delete AFTER DELETE ON posts_archive
+            BEGIN
+                UPDATE post_counters SET cnt = cnt - 1 WHERE status = OLD.status;
+            END
+        """)
+        await self._recompute_post_counters(db)
+
+    @staticmethod
+    async def _recompute_post_counters(db: aiosqlite.Connection):
+        """Пересчитать post_counters одним групповым запросом (живые и архивные посты)"""
+        await db.execute("DELETE FROM post_counters")
+        await db.execute("""
+            INSERT INTO post_counters (status, cnt)
+            SELECT status, COUNT(*) FROM (
+                SELECT status FROM posts
+                UNION ALL
+                SELECT status FROM posts_archive
+            )
+            WHERE status IS NOT NULL
+            GROUP BY status
+        """)
+
+    async def _migration_posts_fts(self, db: aiosqlite.Connection):
+        """Миграция 4: полнотекстовый индекс опубликованных постов (название, текст, значения характеристик)"""
+        await db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+                product_name, post_text, spec_values, category UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        """)
+        # Совпадение в названии товара важнее, чем в тексте поста
+        await db.execute("INSERT INTO posts_fts (posts_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 2.0)')")
+        
+        await db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_posts_fts_insert AFTER INSERT ON posts
+            WHEN NEW.status = 'published'
+            BEGIN
+                INSERT INTO posts_fts (rowid, product_name, post_text, spec_values, category)
+                VALUES ({_POST_FTS_VALUES});
+            END
+        """)
+        await db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_posts_fts_update
+            AFTER UPDATE OF status, category, product_name, post_text, specifications ON posts
+            BEGIN
+                DELETE FROM posts_fts WHERE rowid = OLD.post_id;
+                INSERT INTO posts_fts (rowid, product_name, post_text, spec_values, category)
+                SELECT {_POST_FTS_VALUES} WHERE NEW.status = 'published';
+            END
+        """)
+        # Пост, перенесенный в архив (archive_posts), остается в индексе
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_posts_fts_delete AFTER DELETE ON posts
+            WHEN NOT EXISTS (SELECT 1 FROM posts_archive WHERE post_id = OLD.post_id)
+            BEGIN
+                DELETE FROM posts_fts WHERE rowid = OLD.post_id;
+            END
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_posts_archive_fts_delete AFTER DELETE ON posts_archive
+            BEGIN
+                DELETE FROM posts_fts WHERE rowid = OLD.post_id;
+            END
+        """)
+        
+        for table in ("posts", "posts_archive"):
+            await db.execute(f"""
+                INSERT INTO posts_fts (rowid, product_name, post_text, spec_values, category)
+                SELECT {_POST_FTS_VALUES.replace("NEW.", "")}
+                FROM {table} WHERE status = 'published'
+            """)
+
+    async def _migration_product_specs(self, db: aiosqlite.Connection):
+        """Миграция 5: справочник характеристик товаров, заполняется по опубликованным постам"""
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS product_specs (
+                product_key TEXT NOT NULL,
+                category TEXT NOT NULL,
+                spec_name TEXT NOT NULL,
+                spec_value TEXT NOT NULL,
+                frequency INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (product_key, category, spec_name, spec_value)
+            ) WITHOUT ROWID
+        """)
+        await self._rebuild_product_specs(db)
+
+    @staticmethod
+    async def _record_product_specs(db: aiosqlite.Connection, product_name: str, category: str,
+                                    specifications_json: str):
+        """Учесть характеристики опубликованного поста в справочнике product_specs"""
+        try:
+            specifications = json.loads(specifications_json) if specifications_json else {}
+        except (json.JSONDecodeError, TypeError):
+            return
+        product_key = normalize_product_name(product_name)
+        if not product_key or not category or not isinstance(specifications, dict):
+            return
+        rows = [
+            (product_key, category, str(spec_name), str(spec_value).strip())
+            for spec_name, spec_value in specifications.items()
+            if spec_value is not None and str(spec_value).strip() not in EMPTY_SPEC_VALUES
+        ]
+        if rows:
+            await db.executemany("""
+                INSERT INTO product_specs (product_key, category, spec_name, spec_value, frequency)
+                VALUES (?, ?, ?, ?, 1)
+                ON CONFLICT (product_key, category, spec_name, spec_value)
+                DO UPDATE SET frequency = frequency + 1
+            """, rows)
+
+    async def _rebuild_product_specs(self, db: aiosqlite.Connection) -> int:
+        """Заполнить product_specs заново по всем опубликованным постам (включая архив)"""
+        await db.execute("DELETE FROM product_specs")
+        count = 0
+        async with db.execute("""
+            SELECT product_name, category, specifications FROM posts WHERE status = 'published'
+            UNION ALL
+            SELECT product_name, category, specifications FROM posts_archive WHERE status = 'published'
+        """) as cursor:
+            async for product_name, category, specifications_json in cursor:
+                await self._record_product_specs(db, product_name, category, specifications_json)
+                count += 1
+        return count
+
+    async def rebuild_product_specs(self) -> int:
+        """Перестроить справочник характеристик, вернуть количество учтенных постов"""
+        count = await self._write(self._rebuild_product_specs, invalidate_cache=True)
+        # Индекс названий построится заново при следующем поиске
+        self._product_index = None
+        self._product_index_generation += 1
+        return count
+
+    async def find_similar_products(self, product_name: str, category: str,
+                                    limit: int = 5) -> List[tuple]:
+        """Ближайшие по названию товары из справочника: [(product_key, сходство)], лучшие первыми"""
+        if self._writer is None:
+            await self.open()
+        await self._check_data_version()
+        index = self._product_index
+        if index is None:
+            index = await asyncio.shield(self._product_index_build())
+        elif (self._product_index_stale and self._product_index_task is None
+              and time.monotonic() - self._product_index_built_at >= PRODUCT_INDEX_REFRESH):
+            # Справочник меняли другие процессы: перестраиваем в фоне, пока ищем по старому индексу
+            self._product_index_build()
+        return index.search(product_name, category, limit)
+
+    def _product_index_build(self) -> asyncio.Task:
+        """Построение индекса названий: одно на все одновременные запросы"""
+        if self._product_index_task is None:
+            task = asyncio.create_task(self._build_product_index())
+            task.add_done_callback(self._product_index_built)
+            self._product_index_task = task
+        return self._product_index_task
+
+    def _product_index_built(self, task: asyncio.Task):
+        """Построение индекса завершилось: ошибка логируется, следующий поиск повторит построение"""
+        if self._product_index_task is task:
+            self._product_index_task = None
+            self._product_index_pending = []
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            logger.error(f"Ошибка построения индекса названий товаров: {error}", exc_info=error)
+            # Индекс по-прежнему устарел (built_at не обновлялся), фоновое обновление повторится
+            self._product_index_stale = True
+
+    async def _build_product_index(self) -> TrigramIndex:
+        """Прочитать названия из product_specs и построить индекс в отдельном потоке"""
+        generation = self._product_index_generation
+        self._product_index_pending = []
+        self._product_index_stale = False
+        async with self._read() as db:
+            async with db.execute("SELECT DISTINCT product_key, category FROM product_specs") as cursor:
+                rows = await cursor.fetchall()
+        
+        def build():
+            index = TrigramIndex()
+            for product_key, category_key in rows:
+                index.add(product_key, category_key)
+            return index
+        index = await asyncio.to_thread(build)
+        for product_key, category_key in self._product_index_pending:
+            index.add(product_key, category_key)
+        # Справочник перестроили во время чтения: индекс уже устарел, но для этого поиска годится
+        if generation == self._product_index_generation:
+            self._product_index = index
+            self._product_index_built_at = time.monotonic()
+        return index
+
+    async def get_product_specs(self, product_name: str, category: str) -> Dict[str, str]:
+        """Характеристики товара из справочника: самое частое значение каждой характеристики"""
+        product_key = normalize_product_name(product_name)
+        if not product_key:
+            return {}
+        async with self._read() as db:
+            async with db.execute(PRODUCT_SPECS_QUERY, (product_key, category)) as cursor:
+                return {spec_name: spec_value for spec_name, spec_value, _ in await cursor.fetchall()}
+
+    async def _migration_category_keys(self, db: aiosqlite.Connection):
+        """Миграция 6: постоянный ключ категории (android, laptop...) в таблице categories"""
+        if "category_key" not in await self._table_columns(db, "categories"):
+            await db.execute("ALTER TABLE categories ADD COLUMN category_key TEXT")
+        await db.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_categories_key
+            ON categories (category_key) WHERE category_key IS NOT NULL
+        """)
+        
+        async with db.execute("""
+            SELECT category_id, category_name FROM categories
+            WHERE category_key IS NULL ORDER BY category_id
+        """) as cursor:
+            categories = await cursor.fetchall()
+        used = set()
+        for key, default_name, _ in DEFAULT_CATEGORIES:
+            # Категория с названием по умолчанию, иначе - первая, в названии которой есть ключ
+            category_id = next((cat_id for cat_id, name in categories if name == default_name), None)
+            if category_id is None:
+                category_id = next((cat_id for cat_id, name in categories
+                                    if key in (name or "").lower() and cat_id not in used), None)
+            if category_id is not None and category_id not in used:
+                used.add(category_id)
+                await db.execute(
+                    "UPDATE categories SET category_key = ? WHERE category_id = ?",
+                    (key, category_id)
+                )
+
+    async def _migration_template_versions(self, db: aiosqlite.Connection):
+        """Миграция 7: версия шаблона поста (ключ кэша скомпилированных шаблонов)"""
+        if "version" not in await self._table_columns(db, "post_templates"):
+            await db.execute("ALTER TABLE post_templates ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+    async def _migration_spec_emojis(self, db: aiosqlite.Connection):
+        """Миграция 8: эмодзи характеристик (category_id NULL - правило для всех категорий)"""
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS spec_emojis (
+                emoji_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category_id INTEGER,
+                keyword TEXT NOT NULL,
+                emoji TEXT NOT NULL,
+                sort_order INTEGER NOT NULL,
+                FOREIGN KEY (category_id) REFERENCES categories (category_id)
+            )
+        """)
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_spec_emojis_category
+            ON spec_emojis (category_id, sort_order)
+        """)
+        await db.executemany("""
+            INSERT INTO spec_emojis (category_id, keyword, emoji, sort_order) VALUES (NULL, ?, ?, ?)
+        """, [(keyword, emoji, order) for order, (keyword, emoji) in enumerate(DEFAULT_SPEC_EMOJIS)])
+
+    async def _migration_publish_outbox(self, db: aiosqlite.Connection):
+        """Миграция 9: очередь публикаций в канал с отметками выполненных шагов"""
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS publish_outbox (
+                post_id INTEGER PRIMARY KEY,
+                step TEXT NOT NULL DEFAULT 'queued',
+                message_ids TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claim TEXT,
+                claimed_until TEXT,
+                last_error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_publish_outbox_step ON publish_outbox (step, claimed_until)
+        """)
+
+    async def _migration_price_text(self, db: aiosqlite.Connection):
+        """Миграция 10: цена в том виде, как ее ввели (для баз, где миграция 1 прошла без price_text)
+        
+        Для таких постов исходный текст цены уже не восстановить: берется число из price.
+        """
+        for table in ("posts", "posts_archive"):
+            if "price_text" not in await self._table_columns(db, table):
+                await db.execute(f"ALTER TABLE {table} ADD COLUMN price_text TEXT")
+            await db.execute(f"""
+                UPDATE {table} SET price_text = CASE
+                    WHEN price = CAST(price AS INTEGER) THEN CAST(CAST(price AS INTEGER) AS TEXT)
+                    ELSE CAST(price AS TEXT) END
+                WHERE price_text IS NULL AND price IS NOT NULL
+            """)
+
+    async def _migration_incremental_vacuum(self, db: aiosqlite.Connection):
+        """Миграция 11: auto_vacuum=INCREMENTAL (VACUUM - после транзакции миграций, см. _migrate)"""
+        async with db.execute("PRAGMA auto_vacuum") as cursor:
+            self._vacuum_after_migrate = (await cursor.fetchone())[0] != 2
 
     async def add_user(self, user_id: int, username: str = None, full_name: str = None):
         """Добавить пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT OR IGNORE INTO users (user_id, username, full_name, created_at)
-                VALUES (?, ?, ?, ?)
-            """, (user_id, username, full_name, datetime.now().isoformat()))
-            await db.commit()
+        await self._write_statement("""
+            INSERT OR IGNORE INTO users (user_id, username, full_name, created_at)
+            VALUES (?, ?, ?, ?)
+        """, (user_id, username, full_name, datetime.now().isoformat()))
 
     async def is_admin(self, user_id: int) -> bool:
         """Проверить, является ли пользователь администратором"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._read() as db:
             async with db.execute("SELECT is_admin FROM users WHERE user_id = ?", (user_id,)) as cursor:
                 row = await cursor.fetchone()
                 return row[0] == 1 if row else False
 
     async def create_post(self, user_id: int, category: str, product_name: str, 
-                         specifications: Dict, photos: List[str], avito_link: str) -> int:
-        """Создать новый пост"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("""
-                INSERT INTO posts (user_id, category, product_name, specifications, 
-                                 photos, avito_link, created_at, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, 'pending')
-            """, (
-                user_id,
-                category,
-                product_name,
-                json.dumps(specifications, ensure_ascii=False),
-                json.dumps(photos, ensure_ascii=False),
-                avito_link,
-                datetime.now().isoformat()
-            ))
-            post_id = cursor.lastrowid
-            await db.commit()
-            return post_id
+                         specifications: Dict, photos: List[str], avito_link: str,
+                         price: Optional[float] = None, product_id: Optional[str] = None,
+                         shop_address: Optional[str] = None, shop_address_id: Optional[int] = None,
+                         shop_profile_link: Optional[str] = None, price_text: Optional[str] = None) -> int:
+        """Создать новый пост (price - число для запросов, price_text - цена, как ее ввели)"""
+        return await self._write_statement("""
+            INSERT INTO posts (user_id, category, product_name, specifications, 
+                             photos, avito_link, created_at, status,
+                             price, product_id, shop_address, shop_address_id, shop_profile_link, price_text)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?, ?, ?, ?)
+        """, (
+            user_id,
+            category,
+            product_name,
+            json.dumps(specifications, ensure_ascii=False),
+            json.dumps(photos, ensure_ascii=False),
+            avito_link,
+            datetime.now().isoformat(),
+            price,
+            product_id,
+            shop_address,
+            shop_address_id,
+            shop_profile_link,
+            price_text
+        ))
 
     async def update_post_text(self, post_id: int, post_text: str):
         """Обновить текст поста"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                UPDATE posts SET post_text = ? WHERE post_id = ?
-            """, (post_text, post_id))
-            await db.commit()
+        await self._write_statement("""
+            UPDATE posts SET post_text = ? WHERE post_id = ?
+        """, (post_text, post_id))
 
     async def update_post_status(self, post_id: int, status: str, scheduled_time: str = None):
-        """Обновить статус поста"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
+        """Обновить статус поста (при публикации характеристики попадают в справочник product_specs)"""
+        if status != "published":
+            await self._write_statement("""
                 UPDATE posts SET status = ?, scheduled_time = ? WHERE post_id = ?
             """, (status, scheduled_time, post_id))
-            await db.commit()
+            return
+        
+        published = await self._write(lambda db: self._set_published(db, post_id, scheduled_time))
+        self._index_published(published)
+
+    async def _set_published(self, db: aiosqlite.Connection, post_id: int,
+                             scheduled_time: str = None) -> Optional[tuple]:
+        """Перевести пост в published; вернуть (product_name, category), если раньше он не был опубликован"""
+        async with db.execute("""
+            SELECT status, product_name, category, specifications FROM posts WHERE post_id = ?
+        """, (post_id,)) as cursor:
+            row = await cursor.fetchone()
+        await db.execute("""
+            UPDATE posts SET status = 'published', scheduled_time = ? WHERE post_id = ?
+        """, (scheduled_time, post_id))
+        if row and row[0] != "published":
+            await self._record_product_specs(db, row[1], row[2], row[3])
+            return row[1], row[2]
+        return None
+
+    def _index_published(self, published: Optional[tuple]):
+        """Новый товар сразу доступен нечеткому поиску (если индекс построен или строится)"""
+        if not published:
+            return
+        product_key = normalize_product_name(published[0])
+        if not product_key or not published[1]:
+            return
+        if self._product_index_task is not None:
+            self._product_index_pending.append((product_key, published[1]))
+        if self._product_index is not None:
+            self._product_index.add(product_key, published[1])
 
-    async def get_post(self, post_id: int) -> Optional[Dict]:
-        """Получить пост по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
+    async def get_post(self, post_id: int, fields: tuple = POST_FIELDS) -> Optional[Post]:
+        """Получить пост по ID (fields - проекция: какие колонки читать)
+        
+        Если поста нет в posts, он ищется в архиве posts_archive.
+        """
+        columns = _post_columns(fields)
+        async with self._read() as db:
+            for table in ("posts", "posts_archive"):
+                async with db.execute(f"""
+                    SELECT {columns} FROM {table} WHERE post_id = ?
+                """, (post_id,)) as cursor:
+                    row = await cursor.fetchone()
+                if row:
+                    return Post.from_row(row, fields)
+        return None
+
+    async def archive_posts(self, published_before: str, batch_size: int = 500) -> int:
+        """Перенести в posts_archive опубликованные посты, созданные до published_before,
+        и все отклоненные посты. Перенос идет пачками по batch_size, каждая пачка -
+        отдельная короткая транзакция. Возвращает количество перенесенных постов.
+        """
+        async def operation(db):
             async with db.execute("""
-                SELECT post_id, user_id, category, product_name, specifications,
-                       photos, avito_link, post_text, status, scheduled_time, created_at
-                FROM posts WHERE post_id = ?
-            """, (post_id,)) as cursor:
+                SELECT post_id FROM posts WHERE status = 'rejected'
+                UNION ALL
+                SELECT post_id FROM posts WHERE status = 'published' AND created_at < ?
+                LIMIT ?
+            """, (published_before, batch_size)) as cursor:
+                post_ids = [row[0] for row in await cursor.fetchall()]
+            if not post_ids:
+                return 0
+            
+            placeholders = ", ".join("?" * len(post_ids))
+            await db.execute(f"""
+                INSERT INTO posts_archive ({POST_COLUMNS}, archived_at)
+                SELECT {POST_COLUMNS}, ? FROM posts WHERE post_id IN ({placeholders})
+            """, (datetime.now().isoformat(), *post_ids))
+            await db.execute(f"DELETE FROM posts WHERE post_id IN ({placeholders})", post_ids)
+            await db.execute(f"DELETE FROM publish_outbox WHERE post_id IN ({placeholders})", post_ids)
+            return len(post_ids)
+        
+        total = 0
+        while True:
+            moved = await self._write(operation)
+            total += moved
+            if moved < batch_size:
+                return total
+
+    async def search_published_posts(self, text: str, category: str, limit: int = 20) -> List[Post]:
+        """Найти опубликованные посты категории, в которых встречаются все слова text (по релевантности)"""
+        query = _fts_query(text)
+        if not query:
+            return []
+        fields = ("post_id", "post_text", "specifications")
+        async with self._read() as db:
+            async with db.execute(SEARCH_POSTS_QUERY, (query, category, limit)) as cursor:
+                return [Post.from_row(row, fields) for row in await cursor.fetchall()]
+
+    async def get_pending_posts(self, after_created_at: str = None, after_id: int = None,
+                                limit: int = None, fields: tuple = POST_FIELDS) -> List[Post]:
+        """Получить посты на модерации, от новых к старым
+        
+        Постраничный обход по ключу: after_created_at и after_id - created_at и post_id
+        последнего поста предыдущей страницы. Каждая страница - один запрос по индексу
+        idx_posts_status_created, независимо от длины очереди.
+        """
+        after = after_created_at is not None and after_id is not None
+        query = _pending_posts_query(fields, after, limit is not None)
+        params = ()
+        if after:
+            params += (after_created_at, after_id)
+        if limit is not None:
+            params += (limit,)
+        async with self._read() as db:
+            async with db.execute(query, params) as cursor:
+                return [Post.from_row(row, fields) for row in await cursor.fetchall()]
+
+    async def iter_posts(self, statuses: tuple, category: str = None, chunk_size: int = 500,
+                         fields: tuple = POST_FIELDS) -> AsyncIterator[List[Post]]:
+        """Посты с указанными статусами пачками по chunk_size
+        
+        Обход по ключу (created_at, post_id) внутри каждого статуса: каждая пачка - отдельный
+        запрос по индексу, в памяти одновременно только одна пачка.
+        """
+        # Ключ обхода читается всегда
+        select_fields = tuple(dict.fromkeys(("post_id", "created_at") + tuple(fields)))
+        columns = _post_columns(select_fields)
+        for status in statuses:
+            after = None
+            while True:
+                query = f"SELECT {columns} FROM posts WHERE status = ?"
+                params = (status,)
+                if category is not None:
+                    query += " AND category = ?"
+                    params += (category,)
+                if after is not None:
+                    query += " AND (created_at, post_id) > (?, ?)"
+                    params += after
+                query += " ORDER BY created_at, post_id LIMIT ?"
+                async with self._read() as db:
+                    async with db.execute(query, params + (chunk_size,)) as cursor:
+                        posts = [Post.from_row(row, select_fields) for row in await cursor.fetchall()]
+                if not posts:
+                    break
+                yield posts
+                if len(posts) < chunk_size:
+                    break
+                after = (posts[-1].created_at, posts[-1].post_id)
+
+    async def count_posts(self, statuses: tuple, category: str = None) -> int:
+        """Количество постов с указанными статусами (и категорией)"""
+        placeholders = ", ".join("?" * len(statuses))
+        query = f"SELECT COUNT(*) FROM posts WHERE status IN ({placeholders})"
+        params = tuple(statuses)
+        if category is not None:
+            query += " AND category = ?"
+            params += (category,)
+        async with self._read() as db:
+            async with db.execute(query, params) as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def update_post_texts(self, texts: List[tuple], statuses: tuple) -> int:
+        """Записать тексты постов [(post_text, post_id)] одним executemany
+        
+        Пост, статус которого за это время сменился (например, уже опубликован), не меняется.
+        """
+        placeholders = ", ".join("?" * len(statuses))
+        async def operation(db):
+            before = db.total_changes
+            await db.executemany(
+                f"UPDATE posts SET post_text = ? WHERE post_id = ? AND status IN ({placeholders})",
+                [(post_text, post_id, *statuses) for post_text, post_id in texts]
+            )
+            return db.total_changes - before
+        return await self._write(operation)
+
+    async def pending_count(self) -> int:
+        """Количество постов на модерации (из счетчиков post_counters)"""
+        async with self._read() as db:
+            async with db.execute("SELECT cnt FROM post_counters WHERE status = 'pending'") as cursor:
                 row = await cursor.fetchone()
-                if row:
-                    # Обрабатываем specifications
-                    try:
-                        specs = json.loads(row[4]) if row[4] else {}
-                    except (json.JSONDecodeError, TypeError):
-                        specs = {}
-                    
-                    # Обрабатываем photos
-                    try:
-                        photos = json.loads(row[5]) if row[5] else []
-                    except (json.JSONDecodeError, TypeError):
-                        photos = []
-                    
-                    return {
-                        "post_id": row[0],
-                        "user_id": row[1],
-                        "category": row[2],
-                        "product_name": row[3],
-                        "specifications": specs,
-                        "photos": photos,
-                        "avito_link": row[6] or "",
-                        "post_text": row[7] or "",
-                        "status": row[8] or "pending",
-                        "scheduled_time": row[9],
-                        "created_at": row[10]
-                    }
-                return None
-
-    async def get_pending_posts(self) -> List[Dict]:
-        """Получить все посты на модерации"""
-        async with aiosqlite.connect(self.db_path) as db:
+                return row[0] if row else 0
+
+    async def get_scheduled_posts(self, fields: tuple = POST_FIELDS, due_before: str = None) -> List[Post]:
+        """Получить запланированные посты (due_before - только те, чье время уже наступило)"""
+        query = _scheduled_posts_query(fields, due_before is not None)
+        params = (due_before,) if due_before is not None else ()
+        async with self._read() as db:
+            async with db.execute(query, params) as cursor:
+                return [Post.from_row(row, fields) for row in await cursor.fetchall()]
+
+    async def enqueue_publish(self, post_id: int):
+        """Поставить пост в очередь публикации (повторная постановка ничего не меняет)"""
+        now = datetime.now().isoformat()
+        await self._write_statement("""
+            INSERT OR IGNORE INTO publish_outbox (post_id, created_at, updated_at) VALUES (?, ?, ?)
+        """, (post_id, now, now))
+
+    async def claim_publish_job(self, post_id: int, claim: str, lease_seconds: float) -> Optional[tuple]:
+        """Занять публикацию поста одним UPDATE на lease_seconds секунд
+        
+        Возвращает (step, message_ids, attempts) или None, если публикация уже завершена,
+        ее выполняет другой обработчик или поста нет в очереди.
+        """
+        now = datetime.now()
+        claimed_until = (now + timedelta(seconds=lease_seconds)).isoformat()
+        async def operation(db):
             async with db.execute("""
-                SELECT post_id, user_id, category, product_name, specifications,
-                       photos, avito_link, post_text, status, scheduled_time, created_at
-                FROM posts WHERE status = 'pending'
-                ORDER BY created_at DESC
-            """) as cursor:
-                rows = await cursor.fetchall()
-                return [{
-                    "post_id": row[0],
-                    "user_id": row[1],
-                    "category": row[2],
-                    "product_name": row[3],
-                    "specifications": json.loads(row[4]),
-                    "photos": json.loads(row[5]),
-                    "avito_link": row[6],
-                    "post_text": row[7],
-                    "status": row[8],
-                    "scheduled_time": row[9],
-                    "created_at": row[10]
-                } for row in rows]
-
-    async def get_scheduled_posts(self) -> List[Dict]:
-        """Получить запланированные посты"""
-        async with aiosqlite.connect(self.db_path) as db:
+                UPDATE publish_outbox
+                SET claim = ?, claimed_until = ?, attempts = attempts + 1, updated_at = ?
+                WHERE post_id = ? AND step != 'notified' AND (claimed_until IS NULL OR claimed_until < ?)
+                RETURNING step, message_ids, attempts
+            """, (claim, claimed_until, now.isoformat(), post_id, now.isoformat())) as cursor:
+                return await cursor.fetchone()
+        row = await self._write(operation)
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]) if row[1] else [], row[2]
+
+    async def checkpoint_publish(self, post_id: int, claim: str, step: str,
+                                 message_ids: List[int] = None) -> bool:
+        """Отметить выполненный шаг публикации (только владельцем claim)
+        
+        Шаг published в той же транзакции переводит пост в статус published.
+        Возвращает False, если публикацию уже занял другой обработчик.
+        """
+        async def operation(db):
+            cursor = await db.execute("""
+                UPDATE publish_outbox SET step = ?, message_ids = COALESCE(?, message_ids), updated_at = ?
+                WHERE post_id = ? AND claim = ?
+            """, (step, json.dumps(message_ids) if message_ids is not None else None,
+                  datetime.now().isoformat(), post_id, claim))
+            if cursor.rowcount == 0:
+                return False, None
+            if step == "published":
+                return True, await self._set_published(db, post_id)
+            return True, None
+        claimed, published = await self._write(operation)
+        self._index_published(published)
+        return claimed
+
+    async def release_publish_job(self, post_id: int, claim: str, error: str = None):
+        """Освободить публикацию (error - причина неудачи, по ней ее повторит планировщик)"""
+        await self._write_statement("""
+            UPDATE publish_outbox SET claim = NULL, claimed_until = NULL, last_error = ?, updated_at = ?
+            WHERE post_id = ? AND claim = ?
+        """, (error, datetime.now().isoformat(), post_id, claim))
+
+    async def get_publish_jobs(self, max_attempts: int, limit: int = 100) -> List[int]:
+        """ID незавершенных публикаций, которые никто не выполняет и число попыток которых не исчерпано"""
+        async with self._read() as db:
             async with db.execute("""
-                SELECT post_id, user_id, category, product_name, specifications,
-                       photos, avito_link, post_text, status, scheduled_time, created_at
-                FROM posts WHERE status = 'approved' AND scheduled_time IS NOT NULL
-                ORDER BY scheduled_time ASC
-            """) as cursor:
-                rows = await cursor.fetchall()
-                return [{
-                    "post_id": row[0],
-                    "user_id": row[1],
-                    "category": row[2],
-                    "product_name": row[3],
-                    "specifications": json.loads(row[4]),
-                    "photos": json.loads(row[5]),
-                    "avito_link": row[6],
-                    "post_text": row[7],
-                    "status": row[8],
-                    "scheduled_time": row[9],
-                    "created_at": row[10]
-                } for row in rows]
+                SELECT post_id FROM publish_outbox
+                WHERE step != 'notified' AND (claimed_until IS NULL OR claimed_until < ?) AND attempts < ?
+                ORDER BY created_at LIMIT ?
+            """, (datetime.now().isoformat(), max_attempts, limit)) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
 
     async def _init_default_categories(self):
         """Инициализация дефолтных категорий"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async def operation(db):
             # Проверяем, есть ли категории
             async with db.execute("SELECT COUNT(*) FROM categories") as cursor:
                 count = (await cursor.fetchone())[0]
             
             if count == 0:
                 # Добавляем дефолтные категории
-                default_categories = [
-                    ("Смартфон (Android)", "📱"),
-                    ("Смартфон (Apple)", "🍎"),
-                    ("Ноутбук", "💻"),
-                    ("ПК", "🖥️"),
-                    ("Другая техника", "🔧")
-                ]
-                
-                for name, emoji in default_categories:
+                for key, name, emoji in DEFAULT_CATEGORIES:
                     await db.execute("""
-                        INSERT INTO categories (category_name, category_emoji, created_at)
-                        VALUES (?, ?, ?)
-                    """, (name, emoji, datetime.now().isoformat()))
+                        INSERT INTO categories (category_name, category_emoji, created_at, category_key)
+                        VALUES (?, ?, ?, ?)
+                    """, (name, emoji, datetime.now().isoformat(), key))
                 
-                await db.commit()
+        await self._write(operation, invalidate_cache=True)
 
     async def _init_default_shop_addresses(self):
         """Инициализация дефолтных адресов магазинов"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async def operation(db):
             # Проверяем, есть ли адреса
             async with db.execute("SELECT COUNT(*) FROM shop_addresses") as cursor:
                 count = (await cursor.fetchone())[0]
@@ -300,11 +1361,11 @@ class Database:
                         VALUES (?, ?, ?)
                     """, (name, address, datetime.now().isoformat()))
                 
-                await db.commit()
+        await self._write(operation, invalidate_cache=True)
 
     async def _init_default_post_steps(self):
         """Инициализация дефолтных шагов процесса создания поста"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async def operation(db):
             # Проверяем, есть ли шаги
             async with db.execute("SELECT COUNT(*) FROM post_steps") as cursor:
                 count = (await cursor.fetchone())[0]
@@ -331,68 +1392,111 @@ class Database:
                         VALUES (?, ?, ?, ?, 1, ?)
                     """, (order, name, step_type, config, datetime.now().isoformat()))
                 
-                await db.commit()
+        await self._write(operation)
 
     async def get_categories(self) -> List[tuple]:
         """Получить все категории"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("""
-                SELECT category_id, category_name, category_emoji
-                FROM categories
-                ORDER BY category_id
-            """) as cursor:
-                return await cursor.fetchall()
+        async def load():
+            async with self._read() as db:
+                async with db.execute("""
+                    SELECT category_id, category_name, category_emoji
+                    FROM categories
+                    ORDER BY category_id
+                """) as cursor:
+                    return await cursor.fetchall()
+        return await self._cached(("categories",), load)
 
     async def get_category(self, category_id: int) -> Optional[tuple]:
         """Получить категорию по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("""
-                SELECT category_id, category_name, category_emoji
-                FROM categories
-                WHERE category_id = ?
-            """, (category_id,)) as cursor:
-                return await cursor.fetchone()
+        async def load():
+            async with self._read() as db:
+                async with db.execute("""
+                    SELECT category_id, category_name, category_emoji
+                    FROM categories
+                    WHERE category_id = ?
+                """, (category_id,)) as cursor:
+                    return await cursor.fetchone()
+        return await self._cached(("category", category_id), load)
 
-    async def add_category(self, name: str, emoji: str) -> int:
-        """Добавить категорию"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("""
-                INSERT INTO categories (category_name, category_emoji, created_at)
-                VALUES (?, ?, ?)
-            """, (name, emoji, datetime.now().isoformat()))
-            await db.commit()
-            return cursor.lastrowid
+    async def add_category(self, name: str, emoji: str, category_key: str = None) -> int:
+        """Добавить категорию (category_key - ключ, по которому категорию выбирают бот и веб-приложение)"""
+        return await self._write_statement("""
+            INSERT INTO categories (category_name, category_emoji, created_at, category_key)
+            VALUES (?, ?, ?, ?)
+        """, (name, emoji, datetime.now().isoformat(), category_key), invalidate_cache=True)
+
+    async def get_category_ids(self) -> Dict[str, int]:
+        """Соответствие ключ категории -> category_id (обновляется при изменении категорий)"""
+        async def load():
+            async with self._read() as db:
+                async with db.execute("""
+                    SELECT category_key, category_id FROM categories
+                    WHERE category_key IS NOT NULL
+                """) as cursor:
+                    return {key: category_id for key, category_id in await cursor.fetchall()}
+        return await self._cached(("category_ids",), load)
+
+    async def get_category_id(self, category_key: str) -> Optional[int]:
+        """category_id по ключу категории ("android", "laptop"...)"""
+        return (await self.get_category_ids()).get(category_key)
 
     async def delete_category(self, category_id: int):
         """Удалить категорию"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("DELETE FROM categories WHERE category_id = ?", (category_id,))
-            await db.commit()
+        await self._write_statement("DELETE FROM categories WHERE category_id = ?", (category_id,), invalidate_cache=True)
+
+    async def get_spec_emojis(self, category_id: int = None) -> List[tuple]:
+        """Правила эмодзи категории (None - общие) по порядку: (emoji_id, keyword, emoji)"""
+        async def load():
+            async with self._read() as db:
+                async with db.execute("""
+                    SELECT emoji_id, keyword, emoji FROM spec_emojis
+                    WHERE category_id IS ?
+                    ORDER BY sort_order, emoji_id
+                """, (category_id,)) as cursor:
+                    return await cursor.fetchall()
+        return await self._cached(("spec_emojis", category_id), load)
+
+    async def get_spec_emoji_matcher(self, category_id: int = None) -> SpecEmojiMatcher:
+        """Эмодзи характеристик для категории: сначала ее правила, затем общие"""
+        async def load():
+            rules = await self.get_spec_emojis(category_id) if category_id else []
+            rules += await self.get_spec_emojis(None)
+            return SpecEmojiMatcher((keyword, emoji) for _, keyword, emoji in rules)
+        return await self._cached(("spec_emoji_matcher", category_id), load)
+
+    async def add_spec_emoji(self, keyword: str, emoji: str, category_id: int = None) -> int:
+        """Добавить правило эмодзи в конец списка категории (None - общие правила)"""
+        async def operation(db):
+            cursor = await db.execute("""
+                INSERT INTO spec_emojis (category_id, keyword, emoji, sort_order)
+                VALUES (?, ?, ?, (SELECT COALESCE(MAX(sort_order), -1) + 1
+                                  FROM spec_emojis WHERE category_id IS ?))
+            """, (category_id, keyword.lower(), emoji, category_id))
+            return cursor.lastrowid
+        return await self._write(operation, invalidate_cache=True)
+
+    async def delete_spec_emoji(self, emoji_id: int):
+        """Удалить правило эмодзи"""
+        await self._write_statement("DELETE FROM spec_emojis WHERE emoji_id = ?", (emoji_id,), invalidate_cache=True)
 
     async def get_category_specs(self, category_id: int) -> List[tuple]:
         """Получить характеристики категории"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("""
-                SELECT spec_id, spec_name
-                FROM category_specs
-                WHERE category_id = ?
-                ORDER BY spec_id
-            """, (category_id,)) as cursor:
-                return await cursor.fetchall()
+        async def load():
+            async with self._read() as db:
+                async with db.execute(CATEGORY_SPECS_QUERY, (category_id,)) as cursor:
+                    return await cursor.fetchall()
+        return await self._cached(("category_specs", category_id), load)
 
     async def add_category_spec(self, category_id: int, spec_name: str) -> int:
         """Добавить характеристику категории"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("""
-                INSERT INTO category_specs (category_id, spec_name)
-                VALUES (?, ?)
-            """, (category_id, spec_name))
-            await db.commit()
-            return cursor.lastrowid
+        return await self._write_statement("""
+            INSERT INTO category_specs (category_id, spec_name)
+            VALUES (?, ?)
+        """, (category_id, spec_name), invalidate_cache=True)
 
     async def get_spec(self, spec_id: int) -> Optional[tuple]:
         """Получить характеристику по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._read() as db:
             async with db.execute("""
                 SELECT spec_id, spec_name, category_id
                 FROM category_specs
@@ -402,81 +1506,71 @@ class Database:
 
     async def delete_spec(self, spec_id: int):
         """Удалить характеристику"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("DELETE FROM category_specs WHERE spec_id = ?", (spec_id,))
-            await db.commit()
+        await self._write_statement("DELETE FROM category_specs WHERE spec_id = ?", (spec_id,), invalidate_cache=True)
 
     async def get_stats(self) -> Dict:
-        """Получить статистику"""
-        async with aiosqlite.connect(self.db_path) as db:
-            stats = {}
-            
-            # Количество пользователей
-            async with db.execute("SELECT COUNT(*) FROM users") as cursor:
-                stats['users'] = (await cursor.fetchone())[0]
-            
-            # Количество постов
-            async with db.execute("SELECT COUNT(*) FROM posts") as cursor:
-                stats['posts'] = (await cursor.fetchone())[0]
-            
-            # Посты на модерации
-            async with db.execute("SELECT COUNT(*) FROM posts WHERE status = 'pending'") as cursor:
-                stats['pending'] = (await cursor.fetchone())[0]
-            
-            # Одобренные посты
-            async with db.execute("SELECT COUNT(*) FROM posts WHERE status = 'approved'") as cursor:
-                stats['approved'] = (await cursor.fetchone())[0]
-            
-            # Опубликованные посты
-            async with db.execute("SELECT COUNT(*) FROM posts WHERE status = 'published'") as cursor:
-                stats['published'] = (await cursor.fetchone())[0]
-            
-            # Отклоненные посты
-            async with db.execute("SELECT COUNT(*) FROM posts WHERE status = 'rejected'") as cursor:
-                stats['rejected'] = (await cursor.fetchone())[0]
-            
-            return stats
+        """Получить статистику (счетчики постов читаются из post_counters)"""
+        async with self._read() as db:
+            async with db.execute("""
+                SELECT 'users', COUNT(*) FROM users
+                UNION ALL
+                SELECT status, cnt FROM post_counters
+            """) as cursor:
+                rows = await cursor.fetchall()
+        
+        stats = {'users': 0, 'posts': 0, 'pending': 0, 'approved': 0, 'published': 0, 'rejected': 0}
+        for key, count in rows:
+            if key == 'users':
+                stats['users'] = count
+            else:
+                stats[key] = count
+                stats['posts'] += count
+        return stats
+
+    async def recompute_stats(self) -> Dict:
+        """Перестроить счетчики постов по таблице posts (восстановление после ручных правок)"""
+        await self._write(self._recompute_post_counters)
+        return await self.get_stats()
 
     async def get_shop_addresses(self) -> List[tuple]:
         """Получить все адреса магазинов"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("""
-                SELECT address_id, address_name, address_text
-                FROM shop_addresses
-                ORDER BY address_id
-            """) as cursor:
-                return await cursor.fetchall()
+        async def load():
+            async with self._read() as db:
+                async with db.execute("""
+                    SELECT address_id, address_name, address_text
+                    FROM shop_addresses
+                    ORDER BY address_id
+                """) as cursor:
+                    return await cursor.fetchall()
+        return await self._cached(("shop_addresses",), load)
 
     async def add_shop_address(self, name: str, address: str) -> int:
         """Добавить адрес магазина"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("""
-                INSERT INTO shop_addresses (address_name, address_text, created_at)
-                VALUES (?, ?, ?)
-            """, (name, address, datetime.now().isoformat()))
-            await db.commit()
-            return cursor.lastrowid
+        return await self._write_statement("""
+            INSERT INTO shop_addresses (address_name, address_text, created_at)
+            VALUES (?, ?, ?)
+        """, (name, address, datetime.now().isoformat()), invalidate_cache=True)
 
     async def delete_shop_address(self, address_id: int):
         """Удалить адрес магазина"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("DELETE FROM shop_addresses WHERE address_id = ?", (address_id,))
-            await db.commit()
+        await self._write_statement("DELETE FROM shop_addresses WHERE address_id = ?", (address_id,), invalidate_cache=True)
 
     async def get_shop_address(self, address_id: int) -> Optional[tuple]:
         """Получить адрес магазина по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("""
-                SELECT address_id, address_name, address_text
-                FROM shop_addresses
-                WHERE address_id = ?
-            """, (address_id,)) as cursor:
-                return await cursor.fetchone()
+        async def load():
+            async with self._read() as db:
+                async with db.execute("""
+                    SELECT address_id, address_name, address_text
+                    FROM shop_addresses
+                    WHERE address_id = ?
+                """, (address_id,)) as cursor:
+                    return await cursor.fetchone()
+        return await self._cached(("shop_address", address_id), load)
 
     # Методы для работы с шаблонами постов
     async def add_post_template(self, category_id: int, template_name: str, template_text: str, is_default: int = 0) -> int:
         """Добавить шаблон поста"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async def operation(db):
             # Если это дефолтный шаблон, снимаем флаг с других шаблонов этой категории
             if is_default:
                 await db.execute("""
@@ -487,54 +1581,61 @@ class Database:
                 INSERT INTO post_templates (category_id, template_name, template_text, is_default, created_at)
                 VALUES (?, ?, ?, ?, ?)
             """, (category_id, template_name, template_text, is_default, datetime.now().isoformat()))
-            await db.commit()
             return cursor.lastrowid
+        return await self._write(operation, invalidate_cache=True)
 
     async def get_post_template(self, category_id: int) -> Optional[tuple]:
-        """Получить шаблон поста для категории (дефолтный или первый)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Сначала ищем дефолтный
-            async with db.execute("""
-                SELECT template_id, category_id, template_name, template_text, is_default
-                FROM post_templates
-                WHERE category_id = ? AND is_default = 1
-                LIMIT 1
-            """, (category_id,)) as cursor:
-                result = await cursor.fetchone()
-                if result:
-                    return result
-            
-            # Если дефолтного нет, берем первый
-            async with db.execute("""
-                SELECT template_id, category_id, template_name, template_text, is_default
-                FROM post_templates
-                WHERE category_id = ?
-                LIMIT 1
-            """, (category_id,)) as cursor:
-                return await cursor.fetchone()
-
-    async def get_all_post_templates(self, category_id: int = None) -> List[tuple]:
-        """Получить все шаблоны постов (для категории или все)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            if category_id:
+        """Получить шаблон поста для категории (дефолтный или первый)
+        
+        (template_id, category_id, template_name, template_text, is_default, version)
+        """
+        async def load():
+            async with self._read() as db:
+                # Сначала ищем дефолтный
                 async with db.execute("""
-                    SELECT template_id, category_id, template_name, template_text, is_default
+                    SELECT template_id, category_id, template_name, template_text, is_default, version
                     FROM post_templates
-                    WHERE category_id = ?
-                    ORDER BY is_default DESC, template_id
+                    WHERE category_id = ? AND is_default = 1
+                    LIMIT 1
                 """, (category_id,)) as cursor:
-                    return await cursor.fetchall()
-            else:
+                    result = await cursor.fetchone()
+                    if result:
+                        return result
+            
+                # Если дефолтного нет, берем первый
                 async with db.execute("""
-                    SELECT template_id, category_id, template_name, template_text, is_default
+                    SELECT template_id, category_id, template_name, template_text, is_default, version
                     FROM post_templates
-                    ORDER BY category_id, is_default DESC, template_id
-                """) as cursor:
-                    return await cursor.fetchall()
+                    WHERE category_id = ?
+                    LIMIT 1
+                """, (category_id,)) as cursor:
+                    return await cursor.fetchone()
+        return await self._cached(("post_template", category_id), load)
+
+    async def get_all_post_templates(self, category_id: int = None) -> List[tuple]:
+        """Получить все шаблоны постов (для категории или все)"""
+        async def load():
+            async with self._read() as db:
+                if category_id:
+                    async with db.execute("""
+                        SELECT template_id, category_id, template_name, template_text, is_default
+                        FROM post_templates
+                        WHERE category_id = ?
+                        ORDER BY is_default DESC, template_id
+                    """, (category_id,)) as cursor:
+                        return await cursor.fetchall()
+                else:
+                    async with db.execute("""
+                        SELECT template_id, category_id, template_name, template_text, is_default
+                        FROM post_templates
+                        ORDER BY category_id, is_default DESC, template_id
+                    """) as cursor:
+                        return await cursor.fetchall()
+        return await self._cached(("post_templates", category_id), load)
 
     async def update_post_template(self, template_id: int, template_name: str = None, template_text: str = None, is_default: int = None):
         """Обновить шаблон поста"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async def operation(db):
             # Получаем category_id шаблона
             async with db.execute("SELECT category_id FROM post_templates WHERE template_id = ?", (template_id,)) as cursor:
                 row = await cursor.fetchone()
@@ -555,7 +1656,9 @@ class Database:
                 updates.append("template_name = ?")
                 params.append(template_name)
             if template_text is not None:
+                # Новая версия: скомпилированный шаблон прежней версии больше не используется
                 updates.append("template_text = ?")
+                updates.append("version = version + 1")
                 params.append(template_text)
             if is_default is not None:
                 updates.append("is_default = ?")
@@ -566,28 +1669,28 @@ class Database:
                 await db.execute(f"""
                     UPDATE post_templates SET {', '.join(updates)} WHERE template_id = ?
                 """, params)
-                await db.commit()
+        await self._write(operation, invalidate_cache=True)
 
     async def delete_post_template(self, template_id: int):
         """Удалить шаблон поста"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("DELETE FROM post_templates WHERE template_id = ?", (template_id,))
-            await db.commit()
+        await self._write_statement("DELETE FROM post_templates WHERE template_id = ?", (template_id,), invalidate_cache=True)
 
     async def get_template(self, template_id: int) -> Optional[tuple]:
         """Получить шаблон по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("""
-                SELECT template_id, category_id, template_name, template_text, is_default
-                FROM post_templates
-                WHERE template_id = ?
-            """, (template_id,)) as cursor:
-                return await cursor.fetchone()
+        async def load():
+            async with self._read() as db:
+                async with db.execute("""
+                    SELECT template_id, category_id, template_name, template_text, is_default
+                    FROM post_templates
+                    WHERE template_id = ?
+                """, (template_id,)) as cursor:
+                    return await cursor.fetchone()
+        return await self._cached(("template", template_id), load)
 
     # Методы для работы с шагами процесса создания поста
     async def add_post_step(self, step_order: int, step_name: str, step_type: str, step_config: str = "{}", is_active: int = 1) -> int:
         """Добавить шаг процесса создания поста"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async def operation(db):
             # Обновляем порядок существующих шагов
             await db.execute("""
                 UPDATE post_steps SET step_order = step_order + 1 
@@ -598,12 +1701,12 @@ class Database:
                 INSERT INTO post_steps (step_order, step_name, step_type, step_config, is_active, created_at)
                 VALUES (?, ?, ?, ?, ?, ?)
             """, (step_order, step_name, step_type, step_config, is_active, datetime.now().isoformat()))
-            await db.commit()
             return cursor.lastrowid
+        return await self._write(operation)
 
     async def get_post_steps(self, active_only: bool = True) -> List[tuple]:
         """Получить все шаги процесса создания поста"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._read() as db:
             if active_only:
                 async with db.execute("""
                     SELECT step_id, step_order, step_name, step_type, step_config, is_active
@@ -622,7 +1725,7 @@ class Database:
 
     async def get_post_step(self, step_id: int) -> Optional[tuple]:
         """Получить шаг по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._read() as db:
             async with db.execute("""
                 SELECT step_id, step_order, step_name, step_type, step_config, is_active
                 FROM post_steps
@@ -633,7 +1736,7 @@ class Database:
     async def update_post_step(self, step_id: int, step_order: int = None, step_name: str = None, 
                               step_type: str = None, step_config: str = None, is_active: int = None):
         """Обновить шаг процесса создания поста"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async def operation(db):
             updates = []
             params = []
             
@@ -658,15 +1761,16 @@ class Database:
                 await db.execute(f"""
                     UPDATE post_steps SET {', '.join(updates)} WHERE step_id = ?
                 """, params)
-                await db.commit()
+        await self._write(operation)
 
     async def delete_post_step(self, step_id: int):
         """Удалить шаг процесса создания поста"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async def operation(db):
             # Получаем порядок удаляемого шага
-            step = await self.get_post_step(step_id)
+            async with db.execute("SELECT step_order FROM post_steps WHERE step_id = ?", (step_id,)) as cursor:
+                step = await cursor.fetchone()
             if step:
-                step_order = step[1]
+                step_order = step[0]
                 # Удаляем шаг
                 await db.execute("DELETE FROM post_steps WHERE step_id = ?", (step_id,))
                 # Обновляем порядок остальных шагов
@@ -674,5 +1778,74 @@ class Database:
                     UPDATE post_steps SET step_order = step_order - 1 
                     WHERE step_order > ? AND is_active = 1
                 """, (step_order,))
-                await db.commit()
+        await self._write(operation)
+
+    def seconds_since_last_write(self) -> float:
+        """Сколько секунд назад через этот экземпляр выполнялась запись"""
+        return time.monotonic() - self._last_write_at
+
+    async def freelist_count(self) -> int:
+        """Количество свободных страниц в файле базы"""
+        async with self._read() as db:
+            async with db.execute("PRAGMA freelist_count") as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def incremental_vacuum(self, pages: int) -> int:
+        """Вернуть до pages свободных страниц файловой системе, вернуть число освобожденных страниц"""
+        def run():
+            # PRAGMA incremental_vacuum выполняется вне транзакции писателя,
+            # поэтому используется отдельное короткое соединение
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            try:
+                before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+                after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                # В режиме WAL файл уменьшается только после контрольной точки
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+                return before - after
+            finally:
+                conn.close()
+        return await asyncio.to_thread(run)
+
+    async def backup(self, target_path: str, pages: int = 256, sleep: float = 0.05,
+                     progress: Callable[[int, int], None] = None):
+        """
+        Онлайн-копия базы через backup API SQLite.
+        Источник - отдельное соединение с открытой транзакцией чтения: копия получается
+        из одного снимка WAL, поэтому коммиты бота во время копирования не заставляют
+        backup начинать заново. Копирование идет шагами по pages страниц в отдельном потоке;
+        после каждого шага поток ждет asyncio.sleep(sleep) в цикле событий, а писатель
+        в это время продолжает работу. progress(remaining, total) вызывается после
+        каждого шага (из потока копирования).
+        """
+        loop = asyncio.get_running_loop()
+        
+        def step_done(status, remaining, total):
+            if progress:
+                progress(remaining, total)
+            if remaining:
+                asyncio.run_coroutine_threadsafe(asyncio.sleep(sleep), loop).result()
+        
+        def run():
+            source = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            target = sqlite3.connect(target_path)
+            try:
+                # Транзакция чтения фиксирует снимок до конца копирования
+                # (контрольная точка WAL до этого времени не продвигается дальше снимка)
+                source.execute("BEGIN")
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+                source.backup(target, pages=pages, progress=step_done)
+                source.execute("COMMIT")
+            finally:
+                target.close()
+                source.close()
+        await asyncio.to_thread(run)
 
+    async def explain_hot_queries(self) -> Dict[str, List[str]]:
+        """Получить планы выполнения (EXPLAIN QUERY PLAN) для запросов горячего пути"""
+        plans = {}
+        async with self._read() as db:
+            for name, (query, params) in HOT_QUERIES.items():
+                async with db.execute(f"EXPLAIN QUERY PLAN {query}", params) as cursor:
+                    plans[name] = [row[3] for row in await cursor.fetchall()]
+        return plans
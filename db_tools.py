@@ -0,0 +1,153 @@
+"""
+Служебные команды для обслуживания базы данных бота
+
+Примеры:
+    python db_tools.py check-indexes
+    python db_tools.py --db /path/to/bot_database.db check-indexes
+    python db_tools.py recompute-stats
+    python db_tools.py archive --days 30
+    python db_tools.py backup backups/manual.db
+    python db_tools.py rebuild-specs
+    python db_tools.py rerender-posts --dry-run
+    python db_tools.py rerender-posts --status approved --category apple
+"""
+import argparse
+import asyncio
+import difflib
+import sys
+import time
+from datetime import datetime, timedelta
+
+from config import DATABASE_PATH, ARCHIVE_PUBLISHED_AFTER_DAYS
+from database import Database
+from post_formatter import rerender_posts
+
+def is_indexed_plan(plan: list) -> bool:
+    """Проверка, что план запроса не содержит полного сканирования и сортировки"""
+    for step in plan:
+        if step.startswith("SCAN") and "INDEX" not in step:
+            return False
+        if "USE TEMP B-TREE" in step:
+            return False
+    return True
+
+async def check_indexes(db: Database) -> bool:
+    """Проверка, что каждый запрос горячего пути использует индекс"""
+    plans = await db.explain_hot_queries()
+    all_ok = True
+    for name, plan in plans.items():
+        ok = is_indexed_plan(plan)
+        all_ok = all_ok and ok
+        print(f"{'✅' if ok else '❌'} {name}")
+        for step in plan:
+            print(f"     {step}")
+    return all_ok
+
+async def recompute_stats(db: Database):
+    """Пересчет счетчиков постов по статусам"""
+    stats = await db.recompute_stats()
+    print("✅ Счетчики постов пересчитаны")
+    for key, value in stats.items():
+        print(f"     {key}: {value}")
+
+async def archive(db: Database, days: int):
+    """Перенос старых опубликованных и всех отклоненных постов в архив"""
+    published_before = datetime.now() - timedelta(days=days)
+    archived = await db.archive_posts(published_before.isoformat())
+    print(f"✅ Перенесено в архив постов: {archived}")
+
+async def backup(db: Database, target: str):
+    """Онлайн-копия базы с выводом прогресса"""
+    def progress(remaining: int, total: int):
+        if total:
+            print(f"\r     {(total - remaining) * 100 // total}%", end="", flush=True)
+    
+    started = time.monotonic()
+    await db.backup(target, progress=progress)
+    print(f"\n✅ Резервная копия {target} создана за {time.monotonic() - started:.1f} сек")
+
+async def rebuild_specs(db: Database):
+    """Перестройка справочника характеристик по опубликованным постам"""
+    count = await db.rebuild_product_specs()
+    print(f"✅ Справочник характеристик перестроен, учтено постов: {count}")
+
+async def rerender(db: Database, statuses: list, category: str, chunk_size: int,
+                   dry_run: bool, max_diffs: int):
+    """Перерисовка текста неопубликованных постов по текущим шаблонам"""
+    shown = 0
+    
+    def on_change(post, text: str):
+        nonlocal shown
+        if shown >= max_diffs:
+            return
+        shown += 1
+        diff = difflib.unified_diff(
+            (post.post_text or "").splitlines(), text.splitlines(),
+            f"post {post.post_id} (сейчас)", f"post {post.post_id} (новый)", lineterm=""
+        )
+        print("\n" + "\n".join(diff))
+    
+    def progress(done: int, total: int):
+        if total and not dry_run:
+            print(f"\r     {done * 100 // total}% ({done}/{total})", end="", flush=True)
+    
+    started = time.monotonic()
+    result = await rerender_posts(
+        db, tuple(statuses), category, chunk_size, dry_run,
+        progress=progress, on_change=on_change if dry_run else None
+    )
+    elapsed = time.monotonic() - started
+    if dry_run:
+        print(f"\n🔎 Просмотрено постов: {result['total']}, изменится: {result['changed']} "
+              f"(показано {shown}), за {elapsed:.1f} сек")
+    else:
+        print(f"\n✅ Просмотрено постов: {result['total']}, обновлено: {result['written']} за {elapsed:.1f} сек")
+
+async def run(args) -> int:
+    db = Database(args.db)
+    try:
+        await db.init_db()
+        if args.command == "check-indexes":
+            return 0 if await check_indexes(db) else 1
+        if args.command == "recompute-stats":
+            await recompute_stats(db)
+        if args.command == "archive":
+            await archive(db, args.days)
+        if args.command == "backup":
+            await backup(db, args.target)
+        if args.command == "rebuild-specs":
+            await rebuild_specs(db)
+        if args.command == "rerender-posts":
+            await rerender(db, args.status, args.category, args.chunk_size, args.dry_run, args.max_diffs)
+    finally:
+        await db.close()
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание базы данных бота")
+    parser.add_argument("--db", default=DATABASE_PATH, help="Путь к файлу базы данных")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("check-indexes", help="Проверить планы запросов горячего пути")
+    subparsers.add_parser("recompute-stats", help="Пересчитать счетчики постов для статистики")
+    archive_parser = subparsers.add_parser("archive", help="Перенести старые посты в архив")
+    archive_parser.add_argument("--days", type=int, default=ARCHIVE_PUBLISHED_AFTER_DAYS,
+                                help="Возраст опубликованных постов для архивации (в днях)")
+    backup_parser = subparsers.add_parser("backup", help="Сделать онлайн-копию базы данных")
+    backup_parser.add_argument("target", help="Путь к файлу копии")
+    subparsers.add_parser("rebuild-specs", help="Перестроить справочник характеристик товаров")
+    rerender_parser = subparsers.add_parser("rerender-posts",
+                                            help="Перерисовать текст неопубликованных постов по текущим шаблонам")
+    rerender_parser.add_argument("--status", nargs="+", default=["pending", "approved"],
+                                 choices=["pending", "approved"], help="Статусы постов")
+    rerender_parser.add_argument("--category", help="Только посты категории (ключ, например apple)")
+    rerender_parser.add_argument("--chunk-size", type=int, default=500, help="Постов в одной пачке")
+    rerender_parser.add_argument("--dry-run", action="store_true",
+                                 help="Ничего не записывать, показать изменения")
+    rerender_parser.add_argument("--max-diffs", type=int, default=20,
+                                 help="Сколько изменений показать в режиме --dry-run")
+    
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,7 @@ import logging
 from config import CATEGORIES, MAX_PHOTOS
 from database import Database
 from product_search import search_product_specs
-from post_formatter import format_post
+from post_formatter import render_post, parse_price
 import globals as globals_module
 
 logger = logging.getLogger(__name__)
@@ -469,7 +469,7 @@ async def process_shop_address_callback(callback: CallbackQuery, state: FSMConte
     address = await globals_module.db.get_shop_address(address_id)
     
     if address:
-        await state.update_data(shop_address=address[2])
+        await state.update_data(shop_address=address[2], shop_address_id=address[0])
         await callback.message.edit_text(
             f"✅ Адрес выбран: {address[2]}\n\n"
             "💬 Введите ссылку на профиль для покупки (например: @username или https://t.me/username) или /skip:",
@@ -487,7 +487,7 @@ async def process_shop_address(message: Message, state: FSMContext):
         return
     
     shop_address = message.text.strip()
-    await state.update_data(shop_address=shop_address)
+    await state.update_data(shop_address=shop_address, shop_address_id=None)
     
     await message.answer(
         "💬 Введите ссылку на профиль для покупки (например: @username или https://t.me/username) или /skip:",
@@ -550,7 +550,7 @@ async def process_avito_link(message: Message, state: FSMContext):
     data = await state.get_data()
     
     # Формируем пост с новыми полями
-    post_text = format_post(
+    post_text = await render_post(
         data.get("product_name"),
         data.get("category"),
         data.get("specifications", {}),
@@ -561,25 +561,20 @@ async def process_avito_link(message: Message, state: FSMContext):
         shop_profile_link=data.get("shop_profile_link")
     )
     
-    # Сохраняем дополнительные данные в specifications
-    extended_specs = data.get("specifications", {}).copy()
-    if data.get("price"):
-        extended_specs['_price'] = data.get("price")
-    if data.get("product_id"):
-        extended_specs['_product_id'] = data.get("product_id")
-    if data.get("shop_address"):
-        extended_specs['_shop_address'] = data.get("shop_address")
-    if data.get("shop_profile_link"):
-        extended_specs['_shop_profile_link'] = data.get("shop_profile_link")
-    
     # Сохраняем пост в базу данных
     post_id = await globals_module.db.create_post(
         user_id=message.from_user.id,
         category=data.get("category"),
         product_name=data.get("product_name"),
-        specifications=extended_specs,
+        specifications=data.get("specifications", {}),
         photos=data.get("photos", []),
-        avito_link=avito_link
+        avito_link=avito_link,
+        price=parse_price(data.get("price")),
+        product_id=data.get("product_id"),
+        shop_address=data.get("shop_address"),
+        shop_address_id=data.get("shop_address_id"),
+        shop_profile_link=data.get("shop_profile_link"),
+        price_text=data.get("price")
     )
     
     await globals_module.db.update_post_text(post_id, post_text)
@@ -5,12 +5,16 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
-from config import BOT_TOKEN, DATABASE_PATH
+from config import BOT_TOKEN, DATABASE_PATH, DB_POOL_SIZE
 from database import Database
 from handlers import router as handlers_router
 from moderation import router as moderation_router
 from admin_panel import router as admin_panel_router
 from scheduler import PostScheduler
+from maintenance import DatabaseMaintenance
+from spec_providers import close_spec_provider
+from prewarm import SpecsPrewarmer
+from rate_limiter import telegram_rate_limiter
 from globals import init_globals
 
 # Настройка логирования
@@ -25,6 +29,8 @@ bot = Bot(
     token=BOT_TOKEN,
     default=DefaultBotProperties(parse_mode=ParseMode.HTML)
 )
+# Все запросы к Bot API проходят через ограничитель частоты
+bot.session.middleware(telegram_rate_limiter)
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
@@ -34,7 +40,7 @@ dp.include_router(moderation_router)
 dp.include_router(admin_panel_router)
 
 # Инициализация базы данных
-db = Database(DATABASE_PATH)
+db = Database(DATABASE_PATH, pool_size=DB_POOL_SIZE)
 
 # Инициализация глобальных объектов
 init_globals(bot, db)
@@ -42,6 +48,12 @@ init_globals(bot, db)
 # Планировщик постов
 scheduler = PostScheduler(db)
 
+# Резервные копии и обслуживание базы данных
+maintenance = DatabaseMaintenance(db, bot)
+
+# Прогрев кэша характеристик для популярных товаров
+prewarmer = SpecsPrewarmer()
+
 async def on_startup():
     """Действия при запуске бота"""
     logger.info("Инициализация базы данных...")
@@ -52,12 +64,24 @@ async def on_startup():
     await scheduler.start()
     logger.info("Планировщик запущен")
     
+    logger.info("Запуск обслуживания базы данных...")
+    await maintenance.start()
+    await prewarmer.start()
+    
     logger.info("Бот запущен и готов к работе!")
 
 async def on_shutdown():
     """Действия при остановке бота"""
     logger.info("Остановка планировщика...")
     scheduler.stop()
+    maintenance.stop()
+    prewarmer.stop()
+    
+    logger.info("Закрытие соединений с каталогом характеристик...")
+    await close_spec_provider()
+    
+    logger.info("Закрытие соединений с базой данных...")
+    await db.close()
     logger.info("Бот остановлен")
 
 async def main():
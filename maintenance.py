@@ -0,0 +1,152 @@
+"""
+Фоновое обслуживание базы данных: онлайн-копии и возврат свободного места
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+
+from config import ADMIN_ID, BACKUP_DIR, BACKUP_INTERVAL_HOURS, BACKUP_KEEP
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+# Период проверки (секунды)
+MAINTENANCE_TICK = 60
+# Сколько секунд без записей считается простоем
+IDLE_SECONDS = 30
+# Сколько страниц возвращать за один шаг incremental_vacuum
+VACUUM_STEP_PAGES = 256
+# Как часто обновлять сообщение администратору о ходе копирования (секунды)
+PROGRESS_REPORT_INTERVAL = 5
+
+class DatabaseMaintenance:
+    def __init__(self, db: Database, bot=None):
+        self.db = db
+        self.bot = bot
+        self.running = False
+    
+    async def start(self):
+        """Запуск обслуживания"""
+        self.running = True
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        asyncio.create_task(self._maintenance_loop())
+    
+    async def _maintenance_loop(self):
+        """Основной цикл обслуживания"""
+        while self.running:
+            try:
+                if self._backup_due():
+                    await self.run_backup()
+                elif self.db.seconds_since_last_write() >= IDLE_SECONDS:
+                    await self.run_incremental_vacuum()
+            except Exception as e:
+                logger.error(f"Ошибка обслуживания базы данных: {e}")
+            await asyncio.sleep(MAINTENANCE_TICK)
+    
+    def _backups(self) -> list:
+        """Файлы резервных копий, от старых к новым"""
+        names = sorted(
+            name for name in os.listdir(BACKUP_DIR)
+            if name.startswith("backup-") and name.endswith(".db")
+        )
+        return [os.path.join(BACKUP_DIR, name) for name in names]
+    
+    def _backup_due(self) -> bool:
+        """Пора ли делать резервную копию (по времени последней копии на диске)"""
+        backups = self._backups()
+        if not backups:
+            return True
+        return time.time() - os.path.getmtime(backups[-1]) >= BACKUP_INTERVAL_HOURS * 3600
+    
+    async def run_backup(self) -> str:
+        """Сделать онлайн-копию базы и сообщить администратору о ходе и длительности"""
+        target = os.path.join(BACKUP_DIR, f"backup-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db")
+        partial = target + ".part"
+        status_message = await self._notify("💾 Резервное копирование базы данных: начато")
+        
+        loop = asyncio.get_running_loop()
+        last_report = time.monotonic()
+        
+        async def report(percent: int):
+            if status_message:
+                try:
+                    await status_message.edit_text(f"💾 Резервное копирование базы данных: {percent}%")
+                except Exception:
+                    pass
+        
+        def progress(remaining: int, total: int):
+            # Вызывается из потока копирования
+            nonlocal last_report
+            if total and time.monotonic() - last_report >= PROGRESS_REPORT_INTERVAL:
+                last_report = time.monotonic()
+                percent = int((total - remaining) * 100 / total)
+                asyncio.run_coroutine_threadsafe(report(percent), loop)
+        
+        started = time.monotonic()
+        try:
+            await self.db.backup(partial, progress=progress)
+            os.replace(partial, target)
+        except Exception as e:
+            if os.path.exists(partial):
+                os.remove(partial)
+            await self._notify(f"❌ Ошибка резервного копирования: {e}", status_message)
+            raise
+        duration = time.monotonic() - started
+        
+        # Удаляем старые копии сверх BACKUP_KEEP
+        for old in self._backups()[:-BACKUP_KEEP]:
+            os.remove(old)
+        
+        size_mb = os.path.getsize(target) / (1024 * 1024)
+        await self._notify(
+            f"✅ Резервная копия создана\n\n"
+            f"Файл: {target}\n"
+            f"Размер: {size_mb:.1f} МБ\n"
+            f"Длительность: {duration:.1f} сек",
+            status_message
+        )
+        logger.info(f"Резервная копия {target} ({size_mb:.1f} МБ) за {duration:.1f} сек")
+        return target
+    
+    async def run_incremental_vacuum(self) -> int:
+        """Вернуть свободные страницы файловой системе, пока нет записей"""
+        free_pages = await self.db.freelist_count()
+        if not free_pages:
+            return 0
+        
+        started = time.monotonic()
+        freed = 0
+        while self.running and self.db.seconds_since_last_write() >= IDLE_SECONDS:
+            step = await self.db.incremental_vacuum(VACUUM_STEP_PAGES)
+            freed += step
+            if step < VACUUM_STEP_PAGES:
+                break
+            # Отдаем управление между шагами
+            await asyncio.sleep(0)
+        duration = time.monotonic() - started
+        
+        if freed:
+            await self._notify(
+                f"🧹 Освобождено страниц базы данных: {freed} из {free_pages}\n"
+                f"Длительность: {duration:.1f} сек"
+            )
+            logger.info(f"incremental_vacuum: освобождено {freed} страниц за {duration:.1f} сек")
+        return freed
+    
+    async def _notify(self, text: str, message=None):
+        """Сообщение администратору (message - отредактировать ранее отправленное)"""
+        if not self.bot or not ADMIN_ID:
+            return None
+        try:
+            if message:
+                return await message.edit_text(text)
+            return await self.bot.send_message(ADMIN_ID, text)
+        except Exception as e:
+            logger.error(f"Не удалось отправить отчет об обслуживании: {e}")
+            return None
+    
+    def stop(self):
+        """Остановка обслуживания"""
+        self.running = False
@@ -6,9 +6,11 @@ from aiogram.fsm.state import State, StatesGroup
 from datetime import datetime
 import re
 import logging
+import uuid
 
-from config import ADMIN_ID, CHANNEL_ID
-from database import Database
+from config import ADMIN_ID, CHANNEL_ID, PUBLISH_LEASE, PUBLISH_MAX_ATTEMPTS
+from database import Database, Post, POST_BRIEF_FIELDS
+from product_search import specs_cache
 import globals as globals_module
 
 logger = logging.getLogger(__name__)
@@ -37,7 +39,7 @@ async def approve_post(callback: CallbackQuery, state: FSMContext):
         return
     
     try:
-        post = await globals_module.db.get_post(post_id)
+        post = await globals_module.db.get_post(post_id, fields=POST_BRIEF_FIELDS)
     except Exception as e:
         await callback.answer(f"❌ Ошибка при получении поста: {str(e)}", show_alert=True)
         return
@@ -92,7 +94,7 @@ async def reject_post(callback: CallbackQuery):
         return
     
     try:
-        post = await globals_module.db.get_post(post_id)
+        post = await globals_module.db.get_post(post_id, fields=POST_BRIEF_FIELDS)
     except Exception as e:
         await callback.answer(f"❌ Ошибка при получении поста: {str(e)}", show_alert=True)
         return
@@ -111,9 +113,9 @@ async def reject_post(callback: CallbackQuery):
     # Уведомляем автора
     try:
         await globals_module.bot.send_message(
-            post["user_id"],
+            post.user_id,
             f"❌ Ваш пост был отклонен администратором.\n"
-            f"Товар: {post['product_name']}\n\n"
+            f"Товар: {post.product_name}\n\n"
             f"Создайте новый пост с исправлениями."
         )
     except:
@@ -137,7 +139,7 @@ async def process_schedule_time(message: Message, state: FSMContext):
     
     data = await state.get_data()
     post_id = data.get("post_id")
-    post = await globals_module.db.get_post(post_id)
+    post = await globals_module.db.get_post(post_id, fields=POST_BRIEF_FIELDS)
     
     if not post:
         await message.answer("❌ Пост не найден!")
@@ -148,8 +150,13 @@ async def process_schedule_time(message: Message, state: FSMContext):
     
     if schedule_time_str.lower() == "now":
         # Немедленная публикация
-        await publish_post(post_id, post)
-        await message.answer("✅ Пост опубликован в канал!")
+        if await publish_post(post_id):
+            await message.answer("✅ Пост опубликован в канал!")
+        else:
+            await message.answer(
+                "⚠️ Пост сейчас не опубликован: он уже публикуется или опубликован, "
+                "либо произошла ошибка (планировщик повторит попытку)."
+            )
     else:
         # Парсим время
         try:
@@ -178,14 +185,10 @@ async def process_schedule_time(message: Message, state: FSMContext):
     
     await state.clear()
 
-async def publish_post(post_id: int, post: dict):
-    """Публикация поста в канал"""
-    from config import CHANNEL_ID
-    
-    # Извлекаем дополнительные данные из specifications
-    specs = post.get("specifications", {})
-    shop_profile_link = specs.get("_shop_profile_link")
-    avito_link = post["avito_link"]
+def _post_keyboard(post: Post) -> InlineKeyboardMarkup:
+    """Кнопки поста в канале"""
+    shop_profile_link = post.shop_profile_link
+    avito_link = post.avito_link
     
     # Создаем две кнопки
     post_keyboard = InlineKeyboardBuilder()
@@ -204,68 +207,134 @@ async def publish_post(post_id: int, post: dict):
     # Кнопка "Купить на Авито"
     post_keyboard.button(text="🛒 Купить на Авито", url=avito_link)
     post_keyboard.adjust(2)
-    
+    return post_keyboard.as_markup()
+
+async def _send_post(post: Post, reply_markup: InlineKeyboardMarkup) -> list:
+    """Отправить пост в канал, вернуть message_id отправленных сообщений"""
     # Отправляем фотографии с текстом в одном сообщении
-    photos = post.get("photos", [])
-    
-    # Обрабатываем photos, если это строка JSON
-    if isinstance(photos, str):
-        import json
-        try:
-            photos = json.loads(photos)
-        except:
-            photos = []
+    photos = post.photos
     
     if photos and len(photos) > 0:
         if len(photos) == 1:
             # Одна фотография с текстом
-            await globals_module.bot.send_photo(
+            sent = await globals_module.bot.send_photo(
                 CHANNEL_ID,
                 photos[0],
-                caption=post["post_text"],
-                reply_markup=post_keyboard.as_markup(),
+                caption=post.post_text,
+                reply_markup=reply_markup,
                 parse_mode="HTML"
             )
-        else:
-            # Медиа-группа: первое фото с текстом, остальные без текста
-            from aiogram.types import InputMediaPhoto
-            media = [InputMediaPhoto(media=photo_id) for photo_id in photos[:10]]
-            # Текст и кнопки только на первом фото
-            media[0].caption = post["post_text"]
-            media[0].parse_mode = "HTML"
-            
-            sent_messages = await globals_module.bot.send_media_group(CHANNEL_ID, media)
-            
-            # Добавляем кнопки к первому сообщению (с текстом)
-            try:
-                await globals_module.bot.edit_message_reply_markup(
-                    chat_id=CHANNEL_ID,
-                    message_id=sent_messages[0].message_id,
-                    reply_markup=post_keyboard.as_markup(),
-                    business_connection_id=None  # Явно указываем None, чтобы избежать ошибки валидации
-                )
-            except Exception as e:
-                logger.error(f"Error editing message reply markup: {e}")
-                # Продолжаем работу даже если не удалось добавить кнопки
-    else:
-        # Только текст
-        await globals_module.bot.send_message(
-            CHANNEL_ID,
-            post["post_text"],
-            reply_markup=post_keyboard.as_markup(),
-            parse_mode="HTML"
-        )
+            return [sent.message_id]
+        
+        # Медиа-группа: первое фото с текстом, остальные без текста
+        from aiogram.types import InputMediaPhoto
+        media = [InputMediaPhoto(media=photo_id) for photo_id in photos[:10]]
+        # Текст и кнопки только на первом фото
+        media[0].caption = post.post_text
+        media[0].parse_mode = "HTML"
+        
+        sent_messages = await globals_module.bot.send_media_group(CHANNEL_ID, media)
+        return [sent.message_id for sent in sent_messages]
     
-    # Обновляем статус
-    await globals_module.db.update_post_status(post_id, "published")
+    # Только текст
+    sent = await globals_module.bot.send_message(
+        CHANNEL_ID,
+        post.post_text,
+        reply_markup=reply_markup,
+        parse_mode="HTML"
+    )
+    return [sent.message_id]
+
+async def publish_post(post_id: int, post: Post = None) -> bool:
+    """Публикация поста в канал через очередь publish_outbox (полная запись загружается, если не передана)
     
-    # Уведомляем автора
-    try:
-        await globals_module.bot.send_message(
-            post["user_id"],
-            f"✅ Ваш пост опубликован в канал!\n"
-            f"Товар: {post['product_name']}"
-        )
-    except:
-        pass
+    Возвращает True, если публикация завершена этим вызовом.
+    """
+    await globals_module.db.enqueue_publish(post_id)
+    return await run_publish_job(post_id, post)
 
+async def run_publish_job(post_id: int, post: Post = None) -> bool:
+    """
+    Выполнить публикацию из очереди, продолжая с последнего выполненного шага:
+    sent (альбом отправлен) -> markup (кнопки добавлены) -> published (статус поста)
+    -> notified (автор уведомлен). Публикация занимается одним UPDATE, поэтому
+    планировщик и немедленная публикация не отправят пост дважды. Повтор после сбоя
+    не отправляет пост заново, если шаг sent уже отмечен.
+    """
+    db = globals_module.db
+    claim = uuid.uuid4().hex
+    job = await db.claim_publish_job(post_id, claim, PUBLISH_LEASE)
+    if job is None:
+        return False
+    step, message_ids, attempts = job
+    error = None
+    
+    try:
+        if post is None:
+            post = await db.get_post(post_id)
+        if not post:
+            error = "Пост не найден"
+            logger.error(f"Post {post_id} not found for publishing")
+            return False
+        
+        reply_markup = _post_keyboard(post)
+        
+        if step == "queued":
+            message_ids = await _send_post(post, reply_markup)
+            if not await db.checkpoint_publish(post_id, claim, "sent", message_ids):
+                return False
+            step = "sent"
+        
+        if step == "sent":
+            # Добавляем кнопки к первому сообщению альбома (с текстом)
+            if len(message_ids) > 1:
+                try:
+                    await globals_module.bot.edit_message_reply_markup(
+                        chat_id=CHANNEL_ID,
+                        message_id=message_ids[0],
+                        reply_markup=reply_markup,
+                        business_connection_id=None  # Явно указываем None, чтобы избежать ошибки валидации
+                    )
+                except Exception as e:
+                    logger.error(f"Error editing message reply markup: {e}")
+                    # Продолжаем работу даже если не удалось добавить кнопки
+            if not await db.checkpoint_publish(post_id, claim, "markup"):
+                return False
+            step = "markup"
+        
+        if step == "markup":
+            # Статус поста меняется в одной транзакции с отметкой шага
+            if not await db.checkpoint_publish(post_id, claim, "published"):
+                return False
+            # Новый пост меняет справочник характеристик категории
+            specs_cache.invalidate_category(post.category)
+            step = "published"
+        
+        if step == "published":
+            # Уведомляем автора
+            try:
+                await globals_module.bot.send_message(
+                    post.user_id,
+                    f"✅ Ваш пост опубликован в канал!\n"
+                    f"Товар: {post.product_name}"
+                )
+            except:
+                pass
+            if not await db.checkpoint_publish(post_id, claim, "notified"):
+                return False
+        return True
+    except Exception as e:
+        error = str(e)
+        logger.error(f"Ошибка публикации поста {post_id} (шаг {step}, попытка {attempts}): {e}")
+        if attempts >= PUBLISH_MAX_ATTEMPTS:
+            try:
+                await globals_module.bot.send_message(
+                    ADMIN_ID,
+                    f"❌ Не удалось опубликовать пост #{post_id} за {attempts} попыток: {error}\n"
+                    f"Опубликуйте его снова (now), публикация продолжится с шага «{step}»."
+                )
+            except:
+                pass
+        return False
+    finally:
+        await db.release_publish_job(post_id, claim, error)
@@ -1,63 +1,59 @@
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Union
+import logging
+import re
 from config import CATEGORIES
+from spec_emojis import DEFAULT_EMOJI_MATCHER, SpecEmojiMatcher
+import globals as globals_module
+
+logger = logging.getLogger(__name__)
+
+def parse_price(price: Optional[Union[str, int, float]]) -> Optional[float]:
+    """Привести введенную цену к числу ("15 000" -> 15000.0), None если это не число"""
+    if price is None or isinstance(price, bool):
+        return None
+    if isinstance(price, (int, float)):
+        return float(price)
+    cleaned = re.sub(r"[\s₽]", "", price).replace(",", ".")
+    if not re.fullmatch(r"\d+(?:\.\d+)?", cleaned):
+        return None
+    return float(cleaned)
+
+def format_price(price: Optional[Union[str, int, float]]) -> str:
+    """Цена для текста поста: убираем лишние пробелы, добавляем ₽ если нет"""
+    if not price:
+        return ""
+    price_clean = str(price).strip()
+    if not price_clean.endswith(('₽', 'Р', 'руб', 'рублей')):
+        price_clean = f"{price_clean} ₽"
+    return price_clean
+
+def filled_specs(specifications: Dict[str, str]) -> List[tuple]:
+    """Заполненные характеристики: [(название, значение)]"""
+    return [
+        (spec_name, spec_value) for spec_name, spec_value in specifications.items()
+        if spec_value and spec_value.strip() and spec_value != "Не указано"
+    ]
 
 def format_post(product_name: str, category: str, specifications: Dict[str, str], 
                 avito_link: str, price: Optional[str] = None, product_id: Optional[str] = None,
-                shop_address: Optional[str] = None, shop_profile_link: Optional[str] = None) -> str:
+                shop_address: Optional[str] = None, shop_profile_link: Optional[str] = None,
+                emoji_matcher: Optional[SpecEmojiMatcher] = None) -> str:
     """
     Форматирование поста в красивый вид (как в примере)
+    emoji_matcher - эмодзи характеристик категории (по умолчанию - общие правила)
     """
-    # Маппинг эмодзи для характеристик
-    spec_emojis = {
-        "состояние": "📱",
-        "гарантия": "🛠️",
-        "комплект": "📦",
-        "память": "💾",
-        "оперативная память": "⚡",
-        "ram": "⚡",
-        "процессор": "🔧",
-        "cpu": "🔧",
-        "экран": "📺",
-        "дисплей": "📺",
-        "камера": "📷",
-        "батарея": "🔋",
-        "аккумулятор": "🔋",
-        "цвет": "🎨",
-        "размер": "📏",
-        "вес": "⚖️",
-        "операционная система": "💻",
-        "os": "💻",
-    }
+    spec_emoji = emoji_matcher or DEFAULT_EMOJI_MATCHER
     
     # Название и цена в одной строке (как в примере)
     if price:
-        # Форматируем цену (убираем лишние пробелы, добавляем ₽ если нет)
-        price_clean = price.strip()
-        if not price_clean.endswith(('₽', 'Р', 'руб', 'рублей')):
-            price_clean = f"{price_clean} ₽"
-        post = f"🔥 <b>{product_name} - {price_clean}</b>\n\n"
+        post = f"🔥 <b>{product_name} - {format_price(price)}</b>\n\n"
     else:
         post = f"🔥 <b>{product_name}</b>\n\n"
     
     # Характеристики с уникальными эмодзи для каждой
-    spec_count = 0
-    for spec_name, spec_value in specifications.items():
-        # Пропускаем служебные поля
-        if spec_name.startswith("_"):
-            continue
-            
-        if spec_value and spec_value.strip() and spec_value != "Не указано":
-            spec_count += 1
-            # Определяем эмодзи для характеристики
-            spec_lower = spec_name.lower()
-            emoji = "🔹"  # По умолчанию
-            for key, emoji_value in spec_emojis.items():
-                if key in spec_lower:
-                    emoji = emoji_value
-                    break
-            
-            # Форматируем характеристику
-            post += f"{emoji} <b>{spec_name}:</b> {spec_value}\n"
+    for spec_name, spec_value in filled_specs(specifications):
+        post += f"{spec_emoji(spec_name)} <b>{spec_name}:</b> {spec_value}\n"
     
     # Адрес магазина (если указан)
     if shop_address:
@@ -72,3 +68,299 @@ def format_post(product_name: str, category: str, specifications: Dict[str, str]
     
     return post
 
+# Подстановки шаблона поста и полей характеристики внутри {#specifications}...{/specifications}
+TEMPLATE_FIELDS = (
+    "product_name", "category", "price", "price_formatted", "product_id",
+    "shop_address", "shop_profile_link", "avito_link", "specifications",
+)
+SPEC_FIELDS = ("emoji", "name", "value")
+# Ключ списка характеристик в значениях шаблона (не может совпасть с подстановкой)
+_SPEC_ITEMS = "#specifications"
+_TEMPLATE_TOKEN = re.compile(r"\{([#/]?)([a-z_]+)\}")
+# Сколько разобранных шаблонов хранить
+TEMPLATE_CACHE_SIZE = 128
+
+class CompiledTemplate:
+    """
+    Шаблон поста, разобранный один раз: соседние литералы и подстановки собраны
+    в строки формата str.format, при отрисовке остается проверить секции и склеить строки.
+    
+    {поле} - подстановка, {#поле}...{/поле} - фрагмент, который выводится только
+    для непустого поля; {#specifications}...{/specifications} повторяется для каждой
+    заполненной характеристики с подстановками {emoji}, {name}, {value}.
+    Неизвестные подстановки остаются в тексте как есть.
+    """
+    __slots__ = ("parts", "uses_specs_text", "uses_specs_loop")
+
+    def __init__(self, template_text: str):
+        self.uses_specs_text = False
+        self.uses_specs_loop = False
+        self.parts, _ = self._parse(template_text, 0, None, TEMPLATE_FIELDS)
+
+    @property
+    def uses_specs(self) -> bool:
+        return self.uses_specs_text or self.uses_specs_loop
+
+    def _parse(self, text: str, position: int, closing: Optional[str], fields: tuple):
+        """
+        Разбор до {/closing}: список частей - литералы (str), ("format", строка формата),
+        ("section", имя, части) и ("loop", части) для цикла по характеристикам;
+        внутри цикла поле характеристики подставляется по номеру в SPEC_FIELDS
+        """
+        parts = []
+        literal_start = position
+        for match in _TEMPLATE_TOKEN.finditer(text, position):
+            if match.start() < literal_start:
+                continue
+            kind, name = match.groups()
+            if name not in fields and not (kind == "/" and name == closing):
+                continue
+            if match.start() > literal_start:
+                parts.append(text[literal_start:match.start()])
+            if kind == "/":
+                if name != closing:
+                    raise ValueError(f"Лишний конец секции {{/{name}}}")
+                return _merge(parts), match.end()
+            if kind == "#":
+                if name == "specifications":
+                    self.uses_specs_loop = True
+                    inner, literal_start = self._parse(text, match.end(), name, SPEC_FIELDS)
+                    parts.append(("loop", inner))
+                else:
+                    inner, literal_start = self._parse(text, match.end(), name, fields)
+                    parts.append(("section", _field_key(name, fields), inner))
+            else:
+                if name == "specifications":
+                    self.uses_specs_text = True
+                parts.append(("field", _field_key(name, fields)))
+                literal_start = match.end()
+        if closing is not None:
+            raise ValueError(f"Не закрыта секция {{#{closing}}}")
+        if literal_start < len(text):
+            parts.append(text[literal_start:])
+        return _merge(parts), len(text)
+
+    def render(self, values: dict) -> str:
+        """Текст по значениям подстановок (см. template_values)"""
+        out = []
+        self._render(self.parts, values, out)
+        return "".join(out)
+
+    def _render(self, parts: list, values, out: list, in_loop: bool = False):
+        """values - значения подстановок или кортеж (эмодзи, название, значение) внутри цикла"""
+        append = out.append
+        for part in parts:
+            if part.__class__ is str:
+                append(part)
+            elif part[0] == "format":
+                append(part[1].format(*values) if in_loop else part[1].format_map(values))
+            elif part[0] == "section":
+                if values[part[1]]:
+                    self._render(part[2], values, out, in_loop)
+            elif len(part[1]) == 1 and part[1][0][0] == "format":
+                # Тело цикла без секций: одна строка формата на характеристику
+                line = part[1][0][1]
+                append("".join([line.format(*item) for item in values[_SPEC_ITEMS]]))
+            else:
+                for item in values[_SPEC_ITEMS]:
+                    self._render(part[1], item, out, True)
+
+def _merge(parts: list) -> list:
+    """Соседние литералы и ("field", ключ) -> ("format", строка формата) или просто литерал"""
+    merged = []
+    run = []
+    has_field = False
+    for part in parts + [None]:
+        if part is not None and (part.__class__ is str or part[0] == "field"):
+            run.append(part)
+            has_field = has_field or part.__class__ is not str
+            continue
+        if run:
+            if has_field:
+                merged.append(("format", "".join(
+                    item.replace("{", "{{").replace("}", "}}") if item.__class__ is str else "{%s}" % item[1]
+                    for item in run
+                )))
+            else:
+                merged.append("".join(run))
+            run = []
+            has_field = False
+        if part is not None:
+            merged.append(part)
+    return merged
+
+def _field_key(name: str, fields: tuple):
+    """Ключ значения: имя подстановки или номер поля характеристики"""
+    return fields.index(name) if fields is SPEC_FIELDS else name
+
+_compiled_templates: "OrderedDict[tuple, CompiledTemplate]" = OrderedDict()
+
+def compile_template(template_id: int, version: int, template_text: str) -> CompiledTemplate:
+    """Разобранный шаблон из кэша по (template_id, version)"""
+    key = (template_id, version)
+    compiled = _compiled_templates.get(key)
+    if compiled is not None:
+        _compiled_templates.move_to_end(key)
+        return compiled
+    compiled = CompiledTemplate(template_text)
+    # Прежние версии этого шаблона больше не понадобятся
+    for old_key in [old_key for old_key in _compiled_templates if old_key[0] == template_id]:
+        del _compiled_templates[old_key]
+    _compiled_templates[key] = compiled
+    while len(_compiled_templates) > TEMPLATE_CACHE_SIZE:
+        _compiled_templates.popitem(last=False)
+    return compiled
+
+def template_values(product_name: str, category: str, specifications: Dict[str, str],
+                    avito_link: str, price: Optional[str] = None, product_id: Optional[str] = None,
+                    shop_address: Optional[str] = None, shop_profile_link: Optional[str] = None,
+                    specs_text: bool = True, specs_items: bool = True,
+                    emoji_matcher: Optional[SpecEmojiMatcher] = None) -> dict:
+    """Значения подстановок шаблона поста (характеристики - только если шаблон их использует)"""
+    spec_emoji = emoji_matcher or DEFAULT_EMOJI_MATCHER
+    items = []
+    if specs_text or specs_items:
+        items = [(spec_emoji(spec_name), spec_name, spec_value)
+                 for spec_name, spec_value in filled_specs(specifications)]
+    return {
+        "product_name": product_name or "",
+        "category": CATEGORIES.get(category, category or ""),
+        "price": str(price).strip() if price else "",
+        "price_formatted": format_price(price),
+        "product_id": str(product_id or ""),
+        "shop_address": shop_address or "",
+        "shop_profile_link": shop_profile_link or "",
+        "avito_link": avito_link or "",
+        "specifications": "".join([f"{emoji} <b>{name}:</b> {value}\n" for emoji, name, value in items])
+                          if specs_text else "",
+        _SPEC_ITEMS: items,
+    }
+
+class RenderContext:
+    """Шаблон и эмодзи категории, от которых зависит текст поста"""
+    __slots__ = ("template", "emoji_matcher")
+
+    def __init__(self, template: Optional[tuple], emoji_matcher: Optional[SpecEmojiMatcher]):
+        self.template = template
+        self.emoji_matcher = emoji_matcher
+
+    @property
+    def signature(self) -> str:
+        """Версия оформления: меняется при изменении шаблона или правил эмодзи"""
+        template = f"{self.template[0]}.{self.template[5]}" if self.template else "-"
+        emojis = self.emoji_matcher.signature if self.emoji_matcher else "-"
+        return f"{template}:{emojis}"
+
+    def render(self, product_name: str, category: str, specifications: Dict[str, str],
+               avito_link: str, price: Optional[str] = None, product_id: Optional[str] = None,
+               shop_address: Optional[str] = None, shop_profile_link: Optional[str] = None) -> str:
+        """
+        Текст поста по шаблону категории;
+        если шаблонов нет или шаблон с ошибкой - стандартный вид format_post
+        """
+        if self.template:
+            template_id, _, _, template_text, _, version = self.template
+            try:
+                compiled = compile_template(template_id, version, template_text)
+                return compiled.render(template_values(
+                    product_name, category, specifications, avito_link, price, product_id,
+                    shop_address, shop_profile_link,
+                    specs_text=compiled.uses_specs_text, specs_items=compiled.uses_specs_loop,
+                    emoji_matcher=self.emoji_matcher
+                ))
+            except (ValueError, KeyError) as e:
+                logger.error(f"Ошибка шаблона поста {template_id}: {e}")
+        return format_post(product_name, category, specifications, avito_link, price,
+                           product_id, shop_address, shop_profile_link, self.emoji_matcher)
+
+async def get_render_context(category: str, db=None) -> RenderContext:
+    """Шаблон (по умолчанию или первый) и эмодзи категории из базы"""
+    db = db or globals_module.db
+    if db is None:
+        return RenderContext(None, None)
+    category_id = await db.get_category_id(category)
+    template = await db.get_post_template(category_id) if category_id else None
+    return RenderContext(template, await db.get_spec_emoji_matcher(category_id))
+
+async def render_post(product_name: str, category: str, specifications: Dict[str, str],
+                      avito_link: str, price: Optional[str] = None, product_id: Optional[str] = None,
+                      shop_address: Optional[str] = None, shop_profile_link: Optional[str] = None) -> str:
+    """Текст поста по шаблону категории (см. RenderContext.render)"""
+    context = await get_render_context(category)
+    return context.render(product_name, category, specifications, avito_link, price,
+                          product_id, shop_address, shop_profile_link)
+
+# Поля поста, из которых строится текст
+RERENDER_FIELDS = (
+    "post_id", "category", "product_name", "specifications", "avito_link", "post_text",
+    "price", "product_id", "shop_address", "shop_profile_link", "price_text",
+)
+# Подставляется вместо цены, чтобы найти место цены в тексте
+_PRICE_MARK = "\x00"
+# Разница только в записи числа: "15 000" и "15000", "1500,50" и "1500.5"
+_PRICE_NUMBER = re.compile(r"[\d\s.,]+")
+
+def _stored_price(post) -> Optional[str]:
+    """Цена поста, как ее ввели (для старых записей без текста - из числа: 15000.0 -> 15000)"""
+    if post.price_text is not None:
+        return post.price_text
+    if post.price is None:
+        return None
+    return str(int(post.price)) if float(post.price).is_integer() else str(post.price)
+
+def _price_only_change(context: "RenderContext", post, price: Optional[str]) -> bool:
+    """Сохраненный текст отличается от нового только записью того же числа в цене"""
+    if not price or parse_price(price) is None:
+        return False
+    marked = context.render(
+        post.product_name, post.category, post.specifications, post.avito_link,
+        price=_PRICE_MARK, product_id=post.product_id,
+        shop_address=post.shop_address, shop_profile_link=post.shop_profile_link
+    )
+    if _PRICE_MARK not in marked:
+        return False
+    pattern = "(.*?)".join(re.escape(fragment) for fragment in marked.split(_PRICE_MARK))
+    match = re.fullmatch(pattern, post.post_text, re.DOTALL)
+    return bool(match) and all(
+        _PRICE_NUMBER.fullmatch(old) and parse_price(old) == parse_price(price) for old in match.groups()
+    )
+
+async def rerender_posts(db, statuses: tuple = ("pending", "approved"), category: str = None,
+                         chunk_size: int = 500, dry_run: bool = False,
+                         progress: Callable[[int, int], None] = None,
+                         on_change: Callable[[Any, str], None] = None) -> Dict[str, int]:
+    """
+    Перерисовать сохраненный текст постов по текущим шаблонам и эмодзи.
+    Цена берется в том виде, как ее ввели; пост, в тексте которого отличается
+    только запись того же числа в цене ("15 000" и "15000"), не меняется.
+    Посты читаются пачками по chunk_size, каждая пачка записывается одним executemany;
+    оформление категории берется из базы один раз за проход.
+    dry_run - только посчитать изменения (on_change получает пост и новый текст).
+    Возвращает {"total": просмотрено, "changed": отличается, "written": записано}
+    """
+    total = await db.count_posts(statuses, category)
+    contexts: Dict[str, RenderContext] = {}
+    done = changed = written = 0
+    async for posts in db.iter_posts(statuses, category, chunk_size, fields=RERENDER_FIELDS):
+        texts = []
+        for post in posts:
+            context = contexts.get(post.category)
+            if context is None:
+                context = contexts[post.category] = await get_render_context(post.category, db)
+            price = _stored_price(post)
+            text = context.render(
+                post.product_name, post.category, post.specifications, post.avito_link,
+                price=price, product_id=post.product_id,
+                shop_address=post.shop_address, shop_profile_link=post.shop_profile_link
+            )
+            if text != post.post_text and not _price_only_change(context, post, price):
+                texts.append((text, post.post_id))
+                if on_change:
+                    on_change(post, text)
+        changed += len(texts)
+        if texts and not dry_run:
+            written += await db.update_post_texts(texts, statuses)
+        done += len(posts)
+        if progress:
+            progress(done, total)
+    return {"total": done, "changed": changed, "written": written}
@@ -0,0 +1,63 @@
+"""
+Фоновый прогрев кэша характеристик для часто искомых товаров
+"""
+import asyncio
+import logging
+import time
+
+from config import PREWARM_INTERVAL, PREWARM_TOP, PREWARM_TICK_BUDGET, SPECS_CACHE_TTL
+from product_search import specs_cache, search_tracker, _search_product_specs
+
+logger = logging.getLogger(__name__)
+
+# Во сколько раз уменьшать частоту поиска за один проход
+PREWARM_DECAY = 0.9
+# Запись считается устаревающей, если ей осталось жить меньше этой доли TTL
+REFRESH_BEFORE = 0.2
+
+class SpecsPrewarmer:
+    def __init__(self):
+        self.running = False
+
+    async def start(self):
+        """Запуск прогрева"""
+        self.running = True
+        asyncio.create_task(self._prewarm_loop())
+
+    async def _prewarm_loop(self):
+        """Основной цикл прогрева"""
+        while self.running:
+            await asyncio.sleep(PREWARM_INTERVAL)
+            try:
+                await self.prewarm_once()
+            except Exception as e:
+                logger.error(f"Ошибка прогрева кэша характеристик: {e}")
+            search_tracker.decay(PREWARM_DECAY)
+
+    async def prewarm_once(self) -> int:
+        """
+        Один проход: досчитать характеристики популярных товаров, которых нет в кэше
+        или которые скоро устареют. Возвращает количество прогретых товаров
+        """
+        deadline = time.monotonic() + PREWARM_TICK_BUDGET
+        cpu_deadline = time.process_time() + PREWARM_TICK_BUDGET
+        warmed = 0
+
+        for key, product_name in search_tracker.top(PREWARM_TOP):
+            # Пользовательские поиски важнее: уступаем им весь проход
+            if specs_cache.busy():
+                break
+            if time.monotonic() >= deadline or time.process_time() >= cpu_deadline:
+                break
+            if specs_cache.expires_in(key) > SPECS_CACHE_TTL * REFRESH_BEFORE:
+                continue
+            category = key[1]
+            await specs_cache.prewarm(key, lambda: _search_product_specs(product_name, category))
+            warmed += 1
+            await asyncio.sleep(0)
+
+        return warmed
+
+    def stop(self):
+        """Остановка прогрева"""
+        self.running = False
@@ -0,0 +1,139 @@
+"""
+Нормализация названий товаров для поиска и справочника характеристик
+"""
+import heapq
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Set, Tuple
+
+_NON_WORD = re.compile(r"[\W_]+")
+_LETTER_DIGIT = re.compile(r"(?<=[^\W\d_])(?=\d)|(?<=\d)(?=[^\W\d_])")
+_CYRILLIC_WORD = re.compile(r"[а-я]+")
+
+# Русские написания брендов и моделей, которые не получаются транслитерацией
+PRODUCT_WORD_ALIASES = {
+    "айфон": "iphone",
+    "айпад": "ipad",
+    "эпл": "apple",
+    "эппл": "apple",
+    "макбук": "macbook",
+    "аймак": "imac",
+    "самсунг": "samsung",
+    "галакси": "galaxy",
+    "сяоми": "xiaomi",
+    "ксиоми": "xiaomi",
+    "ксяоми": "xiaomi",
+    "редми": "redmi",
+    "поко": "poco",
+    "хуавей": "huawei",
+    "хонор": "honor",
+    "пиксель": "pixel",
+    "нот": "note",
+    "ноут": "note",
+    "про": "pro",
+    "макс": "max",
+    "плюс": "plus",
+    "мини": "mini",
+    "ультра": "ultra",
+    "асус": "asus",
+    "леново": "lenovo",
+    "делл": "dell",
+    "асер": "acer",
+    "эйсер": "acer",
+}
+
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p",
+    "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "c", "ч": "ch",
+    "ш": "sh", "щ": "sch", "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+})
+
+def normalize_product_name(name: str) -> str:
+    """
+    Ключ названия товара: нижний регистр, "ё" -> "е", знаки препинания
+    заменены пробелами, лишние пробелы убраны.
+    "iPhone 13 Pro (128GB)" -> "iphone 13 pro 128gb"
+    """
+    name = (name or "").lower().replace("ё", "е")
+    return _NON_WORD.sub(" ", name).strip()
+
+def product_match_key(name: str) -> str:
+    """
+    Ключ для нечеткого сравнения: нормализованное название латиницей,
+    буквы и цифры разделены. "Айфон13Про" и "iPhone 13 Pro" -> "iphone 13 pro"
+    """
+    name = _LETTER_DIGIT.sub(" ", normalize_product_name(name))
+    name = _CYRILLIC_WORD.sub(
+        lambda match: PRODUCT_WORD_ALIASES.get(match.group(0), match.group(0).translate(_TRANSLIT)),
+        name
+    )
+    return " ".join(name.split())
+
+def trigrams(text: str) -> Set[str]:
+    """Триграммы слов текста (слова дополняются пробелами, как в pg_trgm)"""
+    result = set()
+    for word in text.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+class TrigramIndex:
+    """
+    Индекс названий товаров по триграммам для нечеткого поиска.
+    Сходство - доля общих триграмм (|A ∩ B| / |A ∪ B|).
+    Время поиска ограничено: списки триграмм обходятся от редких к частым,
+    и после max_scan просмотренных записей частые триграммы пропускаются.
+    """
+    def __init__(self, max_scan: int = 20000, max_candidates: int = 50):
+        self.max_scan = max_scan
+        self.max_candidates = max_candidates
+        self._keys: List[str] = []
+        self._trigrams: List[frozenset] = []
+        self._ids: Dict[Tuple[str, str], int] = {}
+        # category -> триграмма -> номера названий
+        self._postings: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+    
+    def add(self, product_key: str, category: str):
+        """Добавить название товара (повторное добавление игнорируется)"""
+        if (product_key, category) in self._ids:
+            return
+        grams = frozenset(trigrams(product_match_key(product_key)))
+        if not grams:
+            return
+        product_id = len(self._keys)
+        self._ids[(product_key, category)] = product_id
+        self._keys.append(product_key)
+        self._trigrams.append(grams)
+        postings = self._postings[category]
+        for gram in grams:
+            postings[gram].append(product_id)
+    
+    def search(self, name: str, category: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Ближайшие названия товаров категории: [(product_key, сходство)], лучшие первыми"""
+        query = trigrams(product_match_key(name))
+        postings = self._postings.get(category)
+        if not query or not postings:
+            return []
+        
+        lists = sorted((postings[gram] for gram in query if gram in postings), key=len)
+        counts = Counter()
+        scanned = 0
+        for ids in lists:
+            if counts and scanned + len(ids) > self.max_scan:
+                break
+            counts.update(ids)
+            scanned += len(ids)
+        
+        candidates = [product_id for product_id, _ in counts.most_common(self.max_candidates)]
+        scored = []
+        for product_id in candidates:
+            grams = self._trigrams[product_id]
+            common = len(query & grams)
+            scored.append((self._keys[product_id], common / (len(query) + len(grams) - common)))
+        return heapq.nlargest(limit, scored, key=lambda item: item[1])
+
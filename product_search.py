@@ -1,213 +1,362 @@
-import aiohttp
-from bs4 import BeautifulSoup
-from typing import Dict, Optional
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 import re
 import globals as globals_module
-from config import CHANNEL_ID
+from config import CHANNEL_ID, SPECS_CACHE_SIZE, SPECS_CACHE_TTL
+from product_names import normalize_product_name
+from spec_providers import get_spec_provider
+
+# Минимальное сходство названий (по триграммам), при котором берутся характеристики похожего товара
+MIN_PRODUCT_SIMILARITY = 0.5
+
+class SpecsCache:
+    """
+    LRU-кэш результатов поиска характеристик с временем жизни записей.
+    Одинаковые одновременные запросы ждут одно общее вычисление.
+    """
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        # Поколение категории: результат, посчитанный до сброса категории, не сохраняется
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.prewarmed = 0
+    
+    async def get_or_compute(self, key: tuple, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Значение по ключу (product_key, category): из кэша, из текущего вычисления или новое"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+        
+        self.misses += 1
+        return await self._compute(key, compute)
+    
+    def expires_in(self, key: tuple) -> float:
+        """Сколько секунд осталось жить записи (0, если записи нет)"""
+        entry = self._entries.get(key)
+        return max(0.0, entry[0] - time.monotonic()) if entry else 0.0
+    
+    def busy(self) -> bool:
+        """Идут ли сейчас вычисления по запросам пользователей"""
+        return bool(self._inflight)
+    
+    async def prewarm(self, key: tuple, compute: Callable[[], Awaitable[Any]]):
+        """Посчитать значение заранее (не учитывается как промах)"""
+        if key in self._inflight:
+            return
+        self.prewarmed += 1
+        await self._compute(key, compute)
+    
+    async def _compute(self, key: tuple, compute: Callable[[], Awaitable[Any]]) -> Any:
+        category = key[1]
+        generation = self._generations.get(category, 0)
+        task = asyncio.ensure_future(compute())
+        self._inflight[key] = task
+        try:
+            # shield: отмена одного ожидающего не отменяет вычисление для остальных
+            value = await asyncio.shield(task)
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+        
+        if self._generations.get(category, 0) == generation:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+    
+    def invalidate_category(self, category: str):
+        """Сбросить результаты категории (после публикации нового поста)"""
+        self._generations[category] = self._generations.get(category, 0) + 1
+        for key in [key for key in self._entries if key[1] == category]:
+            del self._entries[key]
+        for key in [key for key in self._inflight if key[1] == category]:
+            del self._inflight[key]
+    
+    def stats(self) -> Dict[str, int]:
+        """Счетчики для подбора размера кэша"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "prewarmed": self.prewarmed,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+        }
+
+class SearchTracker:
+    """Частота поиска товаров с затуханием: какие товары ищут сейчас"""
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self.counts: Counter = Counter()
+        # Название, как его ввел пользователь (для повторного поиска)
+        self.names: Dict[tuple, str] = {}
+    
+    def record(self, key: tuple, product_name: str):
+        self.counts[key] += 1
+        self.names[key] = product_name
+        if len(self.counts) > self.max_size * 2:
+            self._trim(self.max_size)
+    
+    def decay(self, factor: float):
+        """Уменьшить все счетчики: старые запросы постепенно теряют вес"""
+        for key in list(self.counts):
+            self.counts[key] *= factor
+            if self.counts[key] < 0.5:
+                del self.counts[key]
+                del self.names[key]
+    
+    def top(self, count: int) -> List[Tuple[tuple, str]]:
+        """Самые искомые товары: [((product_key, category), название)]"""
+        return [(key, self.names[key]) for key, _ in self.counts.most_common(count)]
+    
+    def _trim(self, size: int):
+        keep = dict(self.counts.most_common(size))
+        self.counts = Counter(keep)
+        self.names = {key: self.names[key] for key in keep}
+
+# Кэш результатов search_product_specs и частота поиска товаров
+specs_cache = SpecsCache(SPECS_CACHE_SIZE, SPECS_CACHE_TTL)
+search_tracker = SearchTracker()
 
 async def search_product_specs(product_name: str, category: str) -> Dict[str, str]:
+    """
+    Поиск характеристик товара (результат кэшируется по нормализованному названию и категории)
+    Если не находит, возвращает пустые поля категории
+    """
+    key = (normalize_product_name(product_name), category)
+    search_tracker.record(key, product_name)
+    specs = await specs_cache.get_or_compute(key, lambda: _search_product_specs(product_name, category))
+    # Копия: вызывающий код может менять характеристики
+    return dict(specs)
+
+async def _search_product_specs(product_name: str, category: str) -> Dict[str, str]:
     """
     Поиск характеристик товара в Telegram канале
     Если не находит или не подключен к каналу, возвращает пустые поля
     """
-    specs = {}
+    # Внешний каталог запрашивается параллельно с локальным поиском
+    provider = get_spec_provider()
+    provider_task = asyncio.ensure_future(provider.fetch_specs(product_name, category)) if provider else None
     
-    # Сначала пытаемся найти в Telegram канале
-    if CHANNEL_ID and globals_module.bot:
-        try:
-            # Получаем категорию из БД для поиска category_id
-            categories = await globals_module.db.get_categories()
-            category_id = None
-            
-            # Маппинг ключей категорий
-            category_key_map = {
-                "android": "android",
-                "apple": "apple",
-                "laptop": "laptop", 
-                "pc": "pc",
-                "other": "other"
-            }
-            
-            # Ищем по ключу категории
-            for cat_id, cat_name, cat_emoji in categories:
-                cat_key = category_key_map.get(category)
-                if cat_key and (cat_key in cat_name.lower() or category in cat_name.lower()):
-                    category_id = cat_id
-                    break
-            
-            # Если не нашли, ищем по названию
-            if not category_id:
-                for cat_id, cat_name, cat_emoji in categories:
-                    if category in cat_name.lower() or cat_name.lower() in category:
-                        category_id = cat_id
-                        break
-            
-            # Получаем характеристики для категории из БД
-            if category_id:
-                category_specs = await globals_module.db.get_category_specs(category_id)
+    local_done = False
+    try:
+        # Сначала берем характеристики из справочника, собранного по опубликованным постам
+        specs = await globals_module.db.get_product_specs(product_name, category)
+    
+        # Название написано иначе ("айфон 13 про", "iPhone13Pro"): берем самый похожий товар
+        if not specs:
+            matches = await globals_module.db.find_similar_products(product_name, category, limit=1)
+            if matches and matches[0][1] >= MIN_PRODUCT_SIMILARITY:
+                specs = await globals_module.db.get_product_specs(matches[0][0], category)
+    
+        # Характеристики категории (ключ категории -> category_id)
+        category_id = await globals_module.db.get_category_id(category)
+        category_specs = await globals_module.db.get_category_specs(category_id) if category_id else []
+    
+        # Если товара нет в справочнике, пытаемся найти в Telegram канале
+        if not specs and CHANNEL_ID and globals_module.bot:
+            try:
+                # Получаем характеристики для категории из БД
                 spec_names = [spec[1] for spec in category_specs]
-            else:
-                spec_names = []
             
-            # Ищем в опубликованных постах в БД с похожим названием товара
-            try:
-                # Получаем все посты со статусом published из БД
-                all_posts = []
-                import aiosqlite
-                import json
-                async with aiosqlite.connect(globals_module.db.db_path) as db:
-                    async with db.execute("""
-                        SELECT post_text, specifications
-                        FROM posts
-                        WHERE status = 'published' AND category = ?
-                        ORDER BY created_at DESC
-                        LIMIT 50
-                    """, (category,)) as cursor:
-                        rows = await cursor.fetchall()
-                        for row in rows:
-                            try:
-                                specs_json = json.loads(row[1]) if row[1] else {}
-                            except:
-                                specs_json = {}
-                            all_posts.append({"text": row[0] or "", "specs": specs_json})
+                # Ищем в опубликованных постах в БД с похожим названием товара
+                try:
+                    # Полнотекстовый поиск по всей истории публикаций, лучшие совпадения первыми
+                    found_posts = await globals_module.db.search_published_posts(product_name, category)
                 
-                # Ищем посты с похожим названием
-                messages_text = ""
-                for post in all_posts:
-                    if post["text"] and product_name.lower() in post["text"].lower():
-                        messages_text += post["text"] + "\n"
+                    messages_text = ""
+                    for post in found_posts:
+                        if post.post_text:
+                            messages_text += post.post_text + "\n"
                         # Также пытаемся извлечь из specifications
-                        if post["specs"]:
-                            for spec_name, spec_value in post["specs"].items():
-                                # Пропускаем служебные поля (начинающиеся с _)
-                                if not spec_name.startswith("_") and spec_name not in specs and spec_value and spec_value != "Не указано" and spec_value.strip():
-                                    specs[spec_name] = spec_value
+                        for spec_name, spec_value in post.specifications.items():
+                            if spec_name not in specs and isinstance(spec_value, str) and spec_value != "Не указано" and spec_value.strip():
+                                specs[spec_name] = spec_value
                 
-                # Если нашли сообщения, пытаемся извлечь характеристики
-                if messages_text:
-                    # Извлекаем характеристики в зависимости от категории
-                    if category in ["android", "apple"]:
-                        found_specs = extract_phone_specs(messages_text, product_name)
-                    elif category == "laptop":
-                        found_specs = extract_laptop_specs(messages_text, product_name)
-                    elif category == "pc":
-                        found_specs = extract_pc_specs(messages_text, product_name)
-                    else:
-                        found_specs = extract_general_specs(messages_text, product_name)
+                    # Если нашли сообщения, пытаемся извлечь характеристики
+                    if messages_text:
+                        # Извлекаем характеристики экстрактором категории
+                        found_specs = extract_specs(messages_text, category)
                     
-                    # Объединяем найденные характеристики
-                    for key, value in found_specs.items():
-                        if key not in specs or not specs[key]:
-                            specs[key] = value
+                        # Объединяем найденные характеристики
+                        for key, value in found_specs.items():
+                            if key not in specs or not specs[key]:
+                                specs[key] = value
                     
-                    # Заполняем пустые характеристики из списка категории
-                    for spec_name in spec_names:
-                        if spec_name not in specs:
-                            specs[spec_name] = ""
+                        # Заполняем пустые характеристики из списка категории
+                        for spec_name in spec_names:
+                            if spec_name not in specs:
+                                specs[spec_name] = ""
             
-            except Exception as e:
-                # Если не удалось получить доступ к БД, просто продолжаем
-                print(f"Не удалось получить доступ к БД: {e}")
+                except Exception as e:
+                    # Если не удалось получить доступ к БД, просто продолжаем
+                    print(f"Не удалось получить доступ к БД: {e}")
         
+            except Exception as e:
+                print(f"Ошибка при поиске в канале: {e}")
+        local_done = True
+    finally:
+        # Локальный поиск завершился ошибкой (или корутину отменили): запрос к каталогу
+        # больше не нужен, его отменяем и дожидаемся, чтобы исключение задачи не потерялось
+        if provider_task and not local_done:
+            provider_task.cancel()
+            await asyncio.gather(provider_task, return_exceptions=True)
+    
+    # Дополняем характеристиками из внешнего каталога (локальные значения важнее)
+    if provider_task:
+        try:
+            for spec_name, spec_value in (await provider_task).items():
+                if not specs.get(spec_name):
+                    specs[spec_name] = spec_value
         except Exception as e:
-            print(f"Ошибка при поиске в канале: {e}")
+            print(f"Ошибка внешнего каталога характеристик: {e}")
     
     # Если не нашли характеристики, возвращаем базовые поля (пустые)
     if not specs:
         specs = get_default_specs(category)
     else:
         # Дополняем найденные характеристики пустыми полями из категории
-        categories = await globals_module.db.get_categories()
-        category_id = None
-        for cat_id, cat_name, cat_emoji in categories:
-            if category in cat_name.lower() or cat_name.lower() in category:
-                category_id = cat_id
-                break
-        
-        if category_id:
-            category_specs = await globals_module.db.get_category_specs(category_id)
-            for spec_id, spec_name in category_specs:
-                if spec_name not in specs:
-                    specs[spec_name] = ""
+        for spec_id, spec_name in category_specs:
+            if spec_name not in specs:
+                specs[spec_name] = ""
     
     return specs
 
-def extract_phone_specs(text: str, product_name: str) -> Dict[str, str]:
-    """Извлечение характеристик смартфона"""
-    specs = {}
-    
-    # Паттерны для поиска характеристик
-    patterns = {
-        "Память": r"(?:Память|Storage|ROM)[:\s]+(\d+\s*GB|\d+\s*ТБ)",
-        "Оперативная память": r"(?:ОЗУ|RAM|Оперативная память)[:\s]+(\d+\s*GB)",
-        "Процессор": r"(?:Процессор|CPU|Chipset)[:\s]+([A-Za-z0-9\s]+)",
-        "Экран": r"(?:Экран|Display|Screen)[:\s]+([\d.]+[\"']?\s*дюйм|[\d.]+[\"']?\s*inch)",
-        "Камера": r"(?:Камера|Camera)[:\s]+(\d+\s*МП|\d+\s*MP)",
-        "Батарея": r"(?:Батарея|Battery)[:\s]+(\d+\s*мАч|\d+\s*mAh)",
-    }
-    
-    for key, pattern in patterns.items():
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            specs[key] = match.group(1).strip()
-    
-    return specs
+# Значения характеристик (ровно одна группа захвата)
+_SIZE = r"(\d+\s*GB|\d+\s*ТБ)"
+_RAM_SIZE = r"(\d+\s*GB)"
+_MODEL = r"([A-Za-z0-9\s]+)"
+_DIAGONAL = r"([\d.]+[\"']?\s*дюйм|[\d.]+[\"']?\s*inch)"
 
-def extract_laptop_specs(text: str, product_name: str) -> Dict[str, str]:
-    """Извлечение характеристик ноутбука"""
-    specs = {}
-    
-    patterns = {
-        "Процессор": r"(?:Процессор|CPU|Processor)[:\s]+([A-Za-z0-9\s]+)",
-        "Оперативная память": r"(?:ОЗУ|RAM|Оперативная память)[:\s]+(\d+\s*GB)",
-        "Накопитель": r"(?:SSD|HDD|Накопитель|Storage)[:\s]+(\d+\s*GB|\d+\s*ТБ)",
-        "Экран": r"(?:Экран|Display|Screen)[:\s]+([\d.]+[\"']?\s*дюйм|[\d.]+[\"']?\s*inch)",
-        "Видеокарта": r"(?:Видеокарта|GPU|Graphics)[:\s]+([A-Za-z0-9\s]+)",
-    }
-    
-    for key, pattern in patterns.items():
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            specs[key] = match.group(1).strip()
-    
-    return specs
+_PROCESSOR = (("Процессор", "CPU", "Processor"), _MODEL)
+_STORAGE = (("Память", "Storage", "ROM"), _SIZE)
+_RAM = (("ОЗУ", "RAM", "Оперативная память"), _RAM_SIZE)
+_SCREEN = (("Экран", "Display", "Screen"), _DIAGONAL)
+_DRIVE = (("SSD", "HDD", "Накопитель", "Storage"), _SIZE)
+_GPU = (("Видеокарта", "GPU", "Graphics"), _MODEL)
 
-def extract_pc_specs(text: str, product_name: str) -> Dict[str, str]:
-    """Извлечение характеристик ПК"""
-    specs = {}
+class SpecExtractor:
+    """
+    Извлечение характеристик категории за один проход по тексту.
     
-    patterns = {
-        "Процессор": r"(?:Процессор|CPU|Processor)[:\s]+([A-Za-z0-9\s]+)",
-        "Оперативная память": r"(?:ОЗУ|RAM|Оперативная память)[:\s]+(\d+\s*GB)",
-        "Накопитель": r"(?:SSD|HDD|Накопитель|Storage)[:\s]+(\d+\s*GB|\d+\s*ТБ)",
-        "Видеокарта": r"(?:Видеокарта|GPU|Graphics)[:\s]+([A-Za-z0-9\s]+)",
-        "Материнская плата": r"(?:Материнская плата|Motherboard|MB)[:\s]+([A-Za-z0-9\s]+)",
-    }
+    Шаблон характеристики - названия в тексте и значение: "<название>[:\\s]+<значение>".
+    Все шаблоны объединены в одну опережающую проверку с именованными группами,
+    поиск идет вперед по тексту; найденная характеристика исключается из выражения,
+    поэтому для каждой берется первое вхождение (как у отдельного re.search).
+    Названия разных характеристик не должны быть префиксами друг друга: тогда в одной
+    позиции может начинаться только одна характеристика.
+    """
+    def __init__(self, specs: Dict[str, Tuple[Tuple[str, ...], str]]):
+        self.names = list(specs)
+        labels = [[label.lower() for label in spec_labels] for spec_labels, _ in specs.values()]
+        for index, spec_labels in enumerate(labels):
+            for other in labels[index + 1:]:
+                if any(a.startswith(b) or b.startswith(a) for a in spec_labels for b in other):
+                    raise ValueError(f"Названия характеристик пересекаются: {spec_labels} и {other}")
+        self.patterns = [
+            f"(?:{'|'.join(re.escape(label) for label in spec_labels)})[:\\s]+{value}"
+            for spec_labels, value in specs.values()
+        ]
+        self.first_chars = [
+            "".join(sorted({c for label in spec_labels for c in (label[0].lower(), label[0].upper())}))
+            for spec_labels, _ in specs.values()
+        ]
+        # Выражения для оставшихся (еще не найденных) характеристик
+        self._regexes: Dict[tuple, re.Pattern] = {}
+        self._regex(tuple(range(len(self.names))))
     
-    for key, pattern in patterns.items():
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            specs[key] = match.group(1).strip()
+    def _regex(self, indexes: tuple) -> re.Pattern:
+        regex = self._regexes.get(indexes)
+        if regex is None:
+            # Быстрая проверка первой буквы, затем альтернатива полных шаблонов
+            first_chars = "".join(sorted(set("".join(self.first_chars[i] for i in indexes))))
+            alternatives = "|".join(f"(?P<s{i}>{self.patterns[i]})" for i in indexes)
+            regex = re.compile(f"(?=[{re.escape(first_chars)}])(?={alternatives})", re.IGNORECASE)
+            self._regexes[indexes] = regex
+        return regex
     
-    return specs
+    def extract(self, text: str) -> Dict[str, str]:
+        """Характеристики, найденные в тексте, в порядке объявления шаблонов"""
+        found = {}
+        remaining = tuple(range(len(self.names)))
+        position = 0
+        while remaining:
+            regex = self._regex(remaining)
+            match = regex.search(text, position)
+            if not match:
+                break
+            index = int(match.lastgroup[1:])
+            # Группа значения идет сразу за именованной группой характеристики
+            found[index] = match.group(regex.groupindex[match.lastgroup] + 1).strip()
+            remaining = tuple(i for i in remaining if i != index)
+            position = match.start()
+        return {self.names[index]: found[index] for index in sorted(found)}
 
-def extract_general_specs(text: str, product_name: str) -> Dict[str, str]:
-    """Извлечение общих характеристик"""
-    specs = {}
-    
-    # Базовые характеристики для любой техники
-    patterns = {
-        "Процессор": r"(?:Процессор|CPU|Processor)[:\s]+([A-Za-z0-9\s]+)",
-        "Память": r"(?:Память|Storage|ROM)[:\s]+(\d+\s*GB|\d+\s*ТБ)",
-        "Оперативная память": r"(?:ОЗУ|RAM|Оперативная память)[:\s]+(\d+\s*GB)",
-    }
-    
-    for key, pattern in patterns.items():
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            specs[key] = match.group(1).strip()
-    
-    return specs
+# Экстракторы по ключу категории
+SPEC_EXTRACTORS: Dict[str, SpecExtractor] = {}
+
+def register_spec_extractor(category_keys, specs: Dict[str, Tuple[Tuple[str, ...], str]]) -> SpecExtractor:
+    """Зарегистрировать шаблоны характеристик для одной или нескольких категорий"""
+    extractor = SpecExtractor(specs)
+    if isinstance(category_keys, str):
+        category_keys = [category_keys]
+    for key in category_keys:
+        SPEC_EXTRACTORS[key] = extractor
+    return extractor
+
+register_spec_extractor(["android", "apple"], {
+    "Память": _STORAGE,
+    "Оперативная память": _RAM,
+    "Процессор": (("Процессор", "CPU", "Chipset"), _MODEL),
+    "Экран": _SCREEN,
+    "Камера": (("Камера", "Camera"), r"(\d+\s*МП|\d+\s*MP)"),
+    "Батарея": (("Батарея", "Battery"), r"(\d+\s*мАч|\d+\s*mAh)"),
+})
+register_spec_extractor("laptop", {
+    "Процессор": _PROCESSOR,
+    "Оперативная память": _RAM,
+    "Накопитель": _DRIVE,
+    "Экран": _SCREEN,
+    "Видеокарта": _GPU,
+})
+register_spec_extractor("pc", {
+    "Процессор": _PROCESSOR,
+    "Оперативная память": _RAM,
+    "Накопитель": _DRIVE,
+    "Видеокарта": _GPU,
+    "Материнская плата": (("Материнская плата", "Motherboard", "MB"), _MODEL),
+})
+# Базовые характеристики для любой техники (и для категорий без своих шаблонов)
+GENERAL_SPEC_EXTRACTOR = register_spec_extractor("other", {
+    "Процессор": _PROCESSOR,
+    "Память": _STORAGE,
+    "Оперативная память": _RAM,
+})
+
+def extract_specs(text: str, category: str) -> Dict[str, str]:
+    """Извлечение характеристик товара из текста по шаблонам категории"""
+    return SPEC_EXTRACTORS.get(category, GENERAL_SPEC_EXTRACTOR).extract(text)
 
 def get_default_specs(category: str) -> Dict[str, str]:
     """Возвращает базовые поля характеристик для категории"""
@@ -0,0 +1,127 @@
+"""
+Ограничение частоты запросов к Telegram Bot API (middleware сессии бота)
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Union
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMediaGroup
+
+from config import (
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_LIMIT, TELEGRAM_CHAT_PERIOD, TELEGRAM_MAX_RETRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    Корзина токенов: capacity токенов, пополняется со скоростью rate токенов в секунду.
+    Ожидающие получают токены строго по очереди.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        # Пауза после RetryAfter: до этого момента токены не выдаются
+        self.paused_until = 0.0
+        self.waiting = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, cost: float = 1):
+        """Дождаться и забрать cost токенов (не больше емкости корзины)"""
+        cost = min(cost, self.capacity)
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    delay = max(self.paused_until - now, (cost - self.tokens) / self.rate)
+                    if delay <= 0:
+                        self.tokens -= cost
+                        return
+                    await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
+
+    def pause(self, seconds: float):
+        """Не выдавать токены seconds секунд (ответ Telegram "retry after")"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0
+        self.paused_until = max(self.paused_until, now + seconds)
+
+class TelegramRateLimiter(BaseRequestMiddleware):
+    """
+    Общая корзина на все отправки (global_rate сообщений в секунду) и корзина на каждую
+    группу или канал (chat_limit сообщений за chat_period секунд). Альбом расходует
+    по токену на каждое фото. На TelegramRetryAfter запрос повторяется после паузы,
+    которую назвал Telegram (чат при этом тоже ставится на паузу).
+    Запросы без chat_id (getUpdates, answerCallbackQuery...) не ограничиваются.
+    """
+    def __init__(self, global_rate: float = TELEGRAM_GLOBAL_RATE, chat_limit: int = TELEGRAM_CHAT_LIMIT,
+                 chat_period: float = TELEGRAM_CHAT_PERIOD, max_retries: int = TELEGRAM_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_limit = chat_limit
+        self.chat_period = chat_period
+        self.max_retries = max_retries
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self.retries = 0
+
+    @staticmethod
+    def _is_group(chat_id: Union[int, str]) -> bool:
+        """Группы и каналы: отрицательный id или @username канала"""
+        if isinstance(chat_id, int):
+            return chat_id < 0
+        return str(chat_id).startswith(("-", "@"))
+
+    def _chat_bucket(self, chat_id: Union[int, str, None]) -> Optional[TokenBucket]:
+        if chat_id is None or not self._is_group(chat_id):
+            return None
+        key = str(chat_id)
+        bucket = self._chat_buckets.get(key)
+        if bucket is None:
+            bucket = self._chat_buckets[key] = TokenBucket(self.chat_limit / self.chat_period, self.chat_limit)
+        return bucket
+
+    def queue_depth(self) -> Dict[str, int]:
+        """Сколько запросов ждут отправки: всего и по чатам"""
+        chats = {chat_id: bucket.waiting for chat_id, bucket in self._chat_buckets.items() if bucket.waiting}
+        return {"global": self.global_bucket.waiting + sum(chats.values()), "chats": chats}
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        cost = len(method.media) if isinstance(method, SendMediaGroup) else 1
+        chat_bucket = self._chat_bucket(chat_id)
+        attempt = 0
+        while True:
+            if chat_bucket:
+                await chat_bucket.acquire(cost)
+            await self.global_bucket.acquire(cost)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                self.retries += 1
+                if attempt > self.max_retries:
+                    raise
+                logger.warning(f"Telegram: {type(method).__name__} в {chat_id}, повтор через {e.retry_after} сек")
+                if chat_bucket:
+                    chat_bucket.pause(e.retry_after)
+                else:
+                    self.global_bucket.pause(e.retry_after)
+                await asyncio.sleep(e.retry_after)
+
+# Ограничитель для сессии бота (подключается в main.py)
+telegram_rate_limiter = TelegramRateLimiter()
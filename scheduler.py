@@ -1,12 +1,15 @@
 import asyncio
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+from config import ARCHIVE_PUBLISHED_AFTER_DAYS, ARCHIVE_INTERVAL, PUBLISH_MAX_ATTEMPTS
 from database import Database
-from moderation import publish_post
+from moderation import run_publish_job
 
 class PostScheduler:
     def __init__(self, db: Database):
         self.db = db
         self.running = False
+        self._last_archive = None
     
     async def start(self):
         """Запуск планировщика"""
@@ -17,16 +20,22 @@ class PostScheduler:
         """Основной цикл планировщика"""
         while self.running:
             try:
-                # Получаем запланированные посты
-                scheduled_posts = await self.db.get_scheduled_posts()
+                # Получаем только ID постов, время публикации которых наступило
                 current_time = datetime.now()
+                due_posts = await self.db.get_scheduled_posts(
+                    fields=("post_id", "scheduled_time"),
+                    due_before=current_time.isoformat()
+                )
                 
-                for post in scheduled_posts:
-                    scheduled_time = datetime.fromisoformat(post["scheduled_time"])
-                    
-                    # Если время публикации наступило
-                    if scheduled_time <= current_time:
-                        await publish_post(post["post_id"], post)
+                for post in due_posts:
+                    await self.db.enqueue_publish(post.post_id)
+                
+                # Очередь публикаций: новые посты и незавершенные после сбоя
+                # (полная запись загружается внутри run_publish_job)
+                for post_id in await self.db.get_publish_jobs(PUBLISH_MAX_ATTEMPTS):
+                    await run_publish_job(post_id)
+                
+                await self._archive_if_due()
                 
                 # Проверяем каждую минуту
                 await asyncio.sleep(60)
@@ -34,6 +43,17 @@ class PostScheduler:
                 print(f"Ошибка в планировщике: {e}")
                 await asyncio.sleep(60)
     
+    async def _archive_if_due(self):
+        """Перенос старых опубликованных и отклоненных постов в архив (не чаще ARCHIVE_INTERVAL)"""
+        if self._last_archive is not None and time.monotonic() - self._last_archive < ARCHIVE_INTERVAL:
+            return
+        self._last_archive = time.monotonic()
+        
+        published_before = datetime.now() - timedelta(days=ARCHIVE_PUBLISHED_AFTER_DAYS)
+        archived = await self.db.archive_posts(published_before.isoformat())
+        if archived:
+            print(f"Перенесено в архив постов: {archived}")
+    
     def stop(self):
         """Остановка планировщика"""
         self.running = False
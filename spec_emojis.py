@@ -0,0 +1,77 @@
+"""
+Эмодзи характеристик в тексте поста: правила "ключевое слово -> эмодзи"
+"""
+import hashlib
+import re
+from typing import Dict, Iterable, Tuple
+
+# Правила по умолчанию (для всех категорий). Порядок важен: выбирается первое правило,
+# ключевое слово которого входит в название характеристики
+DEFAULT_SPEC_EMOJIS = (
+    ("состояние", "📱"),
+    ("гарантия", "🛠️"),
+    ("комплект", "📦"),
+    ("память", "💾"),
+    ("оперативная память", "⚡"),
+    ("ram", "⚡"),
+    ("процессор", "🔧"),
+    ("cpu", "🔧"),
+    ("экран", "📺"),
+    ("дисплей", "📺"),
+    ("камера", "📷"),
+    ("батарея", "🔋"),
+    ("аккумулятор", "🔋"),
+    ("цвет", "🎨"),
+    ("размер", "📏"),
+    ("вес", "⚖️"),
+    ("операционная система", "💻"),
+    ("os", "💻"),
+)
+
+# Эмодзи для нераспознанной характеристики
+DEFAULT_EMOJI = "🔹"
+# Сколько названий характеристик запоминать
+MEMO_SIZE = 4096
+
+class SpecEmojiMatcher:
+    """
+    Все правила объединены в одно выражение: опережающая проверка с альтернативами
+    в порядке правил. В каждой позиции альтернатива находит правило с наименьшим номером,
+    из всех позиций берется наименьший номер - как при проверке правил по очереди.
+    Результат для названия характеристики запоминается.
+    """
+    def __init__(self, rules: Iterable[Tuple[str, str]]):
+        self.rules = [(keyword.lower(), emoji) for keyword, emoji in rules if keyword]
+        # Одинаковая во всех процессах отметка правил (для ключей кэша)
+        self.signature = hashlib.blake2b(repr(self.rules).encode(), digest_size=8).hexdigest()
+        self._memo: Dict[str, str] = {}
+        if self.rules:
+            alternatives = "|".join(f"({re.escape(keyword)})" for keyword, _ in self.rules)
+            # Быстрая проверка первой буквы: в остальных позициях альтернативы не перебираются
+            first_chars = re.escape("".join(sorted({keyword[0] for keyword, _ in self.rules})))
+            self._regex = re.compile(f"(?=[{first_chars}])(?=(?:{alternatives}))")
+        else:
+            self._regex = None
+
+    def __call__(self, spec_name: str) -> str:
+        emoji = self._memo.get(spec_name)
+        if emoji is None:
+            emoji = self._match(spec_name)
+            if len(self._memo) >= MEMO_SIZE:
+                self._memo.clear()
+            self._memo[spec_name] = emoji
+        return emoji
+
+    def _match(self, spec_name: str) -> str:
+        if self._regex is None:
+            return DEFAULT_EMOJI
+        best = None
+        for match in self._regex.finditer(spec_name.lower()):
+            index = match.lastindex - 1
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return self.rules[best][1] if best is not None else DEFAULT_EMOJI
+
+DEFAULT_EMOJI_MATCHER = SpecEmojiMatcher(DEFAULT_SPEC_EMOJIS)
@@ -0,0 +1,162 @@
+"""
+Внешние источники характеристик товаров (HTTP-каталоги)
+"""
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, Optional
+
+import aiohttp
+from bs4 import BeautifulSoup
+
+from config import (SPEC_PROVIDER_URL, SPEC_PROVIDER_TIMEOUT, SPEC_PROVIDER_LIMIT_PER_HOST,
+                    SPEC_PROVIDER_HEDGE_DELAY)
+
+logger = logging.getLogger(__name__)
+
+class SpecProvider(ABC):
+    """Интерфейс источника характеристик"""
+    
+    @abstractmethod
+    async def fetch_specs(self, product_name: str, category: str) -> Dict[str, str]:
+        """Характеристики товара (пустой словарь, если товар не найден или источник недоступен)"""
+    
+    async def close(self):
+        """Освободить ресурсы источника"""
+
+def parse_specs_html(html: str) -> Dict[str, str]:
+    """
+    Характеристики со страницы каталога: строки таблиц (<th>/<td> или две <td>)
+    и списки определений (<dt>/<dd>). Первое значение характеристики побеждает.
+    """
+    soup = BeautifulSoup(html, "lxml")
+    specs = {}
+    for row in soup.find_all("tr"):
+        cells = row.find_all(["th", "td"])
+        if len(cells) >= 2:
+            name, value = cells[0].get_text(" ", strip=True), cells[1].get_text(" ", strip=True)
+            if name and value:
+                specs.setdefault(name.rstrip(":"), value)
+    for term in soup.find_all("dt"):
+        definition = term.find_next_sibling("dd")
+        if definition:
+            name, value = term.get_text(" ", strip=True), definition.get_text(" ", strip=True)
+            if name and value:
+                specs.setdefault(name.rstrip(":"), value)
+    return specs
+
+class HttpCatalogProvider(SpecProvider):
+    """
+    Каталог, отдающий HTML-страницу товара по запросу GET <base_url>/search?q=...&category=...
+    
+    Одна общая сессия aiohttp с пулом соединений (не больше limit_per_host на хост)
+    и жесткими таймаутами. Если ответ не пришел за p95 наблюдаемых задержек,
+    отправляется второй такой же запрос, берется первый успешный ответ.
+    Разбор HTML выполняется в отдельном потоке.
+    """
+    def __init__(self, base_url: str, timeout: float = 3.0, limit_per_host: int = 4,
+                 hedge_delay: float = 0.5, hedge: bool = True):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.limit_per_host = limit_per_host
+        # Задержка перед повторным запросом, пока не накоплено достаточно замеров
+        self.hedge_delay = hedge_delay
+        self.hedge = hedge
+        self._latencies = deque(maxlen=200)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.requests = 0
+        self.hedged = 0
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit_per_host * 4, limit_per_host=self.limit_per_host),
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.timeout / 3),
+            )
+        return self._session
+    
+    def _current_hedge_delay(self) -> float:
+        """p95 задержек последних запросов"""
+        if len(self._latencies) < 20:
+            return self.hedge_delay
+        latencies = sorted(self._latencies)
+        return latencies[int(len(latencies) * 0.95) - 1]
+    
+    async def _request(self, product_name: str, category: str) -> str:
+        started = time.monotonic()
+        self.requests += 1
+        async with self._get_session().get(
+            f"{self.base_url}/search",
+            params={"q": product_name, "category": category}
+        ) as response:
+            if response.status == 404:
+                return ""
+            response.raise_for_status()
+            html = await response.text()
+        self._latencies.append(time.monotonic() - started)
+        return html
+    
+    async def _hedged_request(self, product_name: str, category: str) -> str:
+        """Запрос с повторной отправкой после p95, побеждает первый успешный ответ"""
+        first = asyncio.ensure_future(self._request(product_name, category))
+        if not self.hedge:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=self._current_hedge_delay())
+        if done:
+            return first.result()
+        
+        self.hedged += 1
+        pending = {first, asyncio.ensure_future(self._request(product_name, category))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def fetch_specs(self, product_name: str, category: str) -> Dict[str, str]:
+        try:
+            html = await self._hedged_request(product_name, category)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Каталог характеристик недоступен: {e!r}")
+            return {}
+        if not html:
+            return {}
+        return await asyncio.to_thread(parse_specs_html, html)
+    
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+_provider: Optional[SpecProvider] = None
+
+def get_spec_provider() -> Optional[SpecProvider]:
+    """Источник характеристик из настроек (None, если SPEC_PROVIDER_URL не задан)"""
+    global _provider
+    if _provider is None and SPEC_PROVIDER_URL:
+        _provider = HttpCatalogProvider(
+            SPEC_PROVIDER_URL,
+            timeout=SPEC_PROVIDER_TIMEOUT,
+            limit_per_host=SPEC_PROVIDER_LIMIT_PER_HOST,
+            hedge_delay=SPEC_PROVIDER_HEDGE_DELAY,
+        )
+    return _provider
+
+def set_spec_provider(provider: Optional[SpecProvider]):
+    """Подключить другой источник характеристик"""
+    global _provider
+    _provider = provider
+
+async def close_spec_provider():
+    """Закрыть источник характеристик (при остановке бота)"""
+    if _provider is not None:
+        await _provider.close()
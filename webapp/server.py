@@ -6,18 +6,20 @@ from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+import hashlib
 import json
 import logging
 import os
 import sys
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, Optional
 from datetime import datetime
 
 # Добавляем корневую директорию в путь для импорта модулей
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from aiogram.utils.web_app import safe_parse_webapp_init_data
-from config import BOT_TOKEN
+from config import BOT_TOKEN, PREVIEW_CACHE_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -155,6 +157,32 @@ async def search_specs(request: Request):
             content={"success": False, "error": str(e)}
         )
 
+# Поля запроса, от которых зависит предпросмотр (остальное состояние Mini App, например фото, не учитывается)
+PREVIEW_FIELDS = (
+    "category", "productName", "specifications", "avitoLink",
+    "price", "productId", "shopAddress", "shopProfileLink",
+)
+
+# Отрисованные предпросмотры (тело ответа) по ETag
+_preview_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+def preview_etag(data: Dict[str, Any], signature: str) -> str:
+    """ETag предпросмотра: хэш полей поста и версии оформления категории"""
+    # Пустые значения (None, "") отрисовываются одинаково
+    normalized = [data.get(field) or "" for field in PREVIEW_FIELDS]
+    raw = json.dumps([signature, normalized], ensure_ascii=False, separators=(",", ":"))
+    return '"' + hashlib.blake2b(raw.encode(), digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадает ли ETag с одним из значений заголовка If-None-Match"""
+    if not if_none_match:
+        return False
+    for value in if_none_match.split(","):
+        value = value.strip()
+        if value == "*" or value.removeprefix("W/") == etag:
+            return True
+    return False
+
 @app.post("/api/preview-post")
 async def preview_post(request: Request):
     """Предпросмотр поста перед отправкой"""
@@ -192,14 +220,24 @@ async def preview_post(request: Request):
         # Импортируем функцию форматирования
         try:
             import globals as globals_module
-            from post_formatter import format_post
+            from post_formatter import get_render_context
         except ImportError:
             sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
             import globals as globals_module
-            from post_formatter import format_post
+            from post_formatter import get_render_context
+        
+        # Тот же пост с тем же оформлением: клиенту хватит своей копии или копии из кэша
+        context = await get_render_context(category)
+        etag = preview_etag(data, context.signature)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        body = _preview_cache.get(etag)
+        if body is not None:
+            _preview_cache.move_to_end(etag)
+            return Response(body, media_type="application/json", headers={"ETag": etag})
         
         # Формируем предпросмотр поста
-        preview_text = format_post(
+        preview_text = context.render(
             product_name,
             category,
             specifications,
@@ -224,11 +262,15 @@ async def preview_post(request: Request):
         
         buttons.append({"text": "🛒 Купить на Авито", "url": avito_link})
         
-        return JSONResponse({
+        body = json.dumps({
             "success": True,
             "preview": preview_text,
             "buttons": buttons
-        })
+        }, ensure_ascii=False).encode()
+        _preview_cache[etag] = body
+        while len(_preview_cache) > PREVIEW_CACHE_SIZE:
+            _preview_cache.popitem(last=False)
+        return Response(body, media_type="application/json", headers={"ETag": etag})
         
     except Exception as e:
         logger.error(f"Error in preview_post: {e}")
@@ -268,6 +310,7 @@ async def create_post(request: Request):
         price = data.get("price")
         product_id = data.get("productId")
         shop_address = data.get("shopAddress")
+        shop_address_id = data.get("shopAddressId")
         shop_profile_link = data.get("shopProfileLink")
         
         if not all([category, product_name, avito_link]):
@@ -280,15 +323,15 @@ async def create_post(request: Request):
         # Используем относительный импорт для работы на Railway
         try:
             import globals as globals_module
-            from post_formatter import format_post
+            from post_formatter import render_post, parse_price
         except ImportError:
             # Для Railway может потребоваться абсолютный импорт
             sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
             import globals as globals_module
-            from post_formatter import format_post
+            from post_formatter import render_post, parse_price
         
         # Формируем пост
-        post_text = format_post(
+        post_text = await render_post(
             product_name,
             category,
             specifications,
@@ -299,25 +342,20 @@ async def create_post(request: Request):
             shop_profile_link=shop_profile_link
         )
         
-        # Сохраняем в базу данных (расширяем для новых полей)
-        # Временно сохраняем дополнительные данные в specifications
-        extended_specs = specifications.copy()
-        if price:
-            extended_specs['_price'] = price
-        if product_id:
-            extended_specs['_product_id'] = product_id
-        if shop_address:
-            extended_specs['_shop_address'] = shop_address
-        if shop_profile_link:
-            extended_specs['_shop_profile_link'] = shop_profile_link
-        
+        # Сохраняем в базу данных
         post_id = await globals_module.db.create_post(
             user_id=user_id,
             category=category,
             product_name=product_name,
-            specifications=extended_specs,
+            specifications=specifications,
             photos=photos,  # В реальности нужно загрузить фото на сервер
-            avito_link=avito_link
+            avito_link=avito_link,
+            price=parse_price(price),
+            product_id=product_id or None,
+            shop_address=shop_address,
+            shop_address_id=int(shop_address_id) if str(shop_address_id or "").isdigit() else None,
+            shop_profile_link=shop_profile_link or None,
+            price_text=str(price).strip() if price not in (None, "") else None
         )
         
         await globals_module.db.update_post_text(post_id, post_text)
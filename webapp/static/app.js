@@ -18,6 +18,7 @@ let state = {
     price: null,
     productId: null,
     shopAddress: null,
+    shopAddressId: null,
     shopProfileLink: null,
     avitoLink: null
 };
@@ -231,6 +232,7 @@ async function loadShopAddresses() {
                 data.addresses.forEach(addr => {
                     const option = document.createElement('option');
                     option.value = addr.text;
+                    option.dataset.id = addr.id;
                     option.textContent = `${addr.name} - ${addr.text}`;
                     select.appendChild(option);
                 });
@@ -246,6 +248,7 @@ document.getElementById('shop-address-select').addEventListener('change', (e) =>
     if (e.target.value) {
         document.getElementById('shop-address-custom').value = '';
         state.shopAddress = e.target.value;
+        state.shopAddressId = e.target.selectedOptions[0].dataset.id || null;
     }
 });
 
@@ -253,9 +256,13 @@ document.getElementById('shop-address-custom').addEventListener('input', (e) =>
     if (e.target.value.trim()) {
         document.getElementById('shop-address-select').value = '';
         state.shopAddress = e.target.value.trim();
+        state.shopAddressId = null;
     }
 });
 
+// Последний предпросмотр и его ETag: если пост не изменился, сервер ответит 304
+let lastPreview = null;
+
 // Шаг 5: Дополнительная информация - Предпросмотр
 document.getElementById('preview-btn').addEventListener('click', async () => {
     const avitoLink = document.getElementById('avito-link').value.trim();
@@ -280,16 +287,30 @@ document.getElementById('preview-btn').addEventListener('click', async () => {
     
     // Получаем предпросмотр поста
     try {
+        const headers = { 'Content-Type': 'application/json' };
+        if (lastPreview) {
+            headers['If-None-Match'] = lastPreview.etag;
+        }
         const response = await fetch('/api/preview-post', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers,
             body: JSON.stringify({
                 ...state,
                 init_data: tg.initData
             })
         });
         
+        if (response.status === 304 && lastPreview) {
+            renderPreview(lastPreview.data);
+            showStep('preview');
+            return;
+        }
+        
         const data = await response.json();
+        const etag = response.headers.get('ETag');
+        if (data.success && etag) {
+            lastPreview = { etag, data };
+        }
         if (data.success) {
             renderPreview(data);
             showStep('preview');